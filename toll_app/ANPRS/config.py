@@ -20,6 +20,10 @@ os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 VEHICLE_DETECTOR_PATH =  str(ANPRS / "models" / "od" / "yolov8n.pt")
 PLATE_DETECTOR_PATH =  str(ANPRS / "models" / "od" / "best.pt")
 OD_THRESHOLD = 0.6
+COCO_THRESHOLD = 0.5
+
+# A plate belongs to the vehicle box that contains at least this share of it
+VEHICLE_CONTAINMENT_THRESHOLD = 0.6
 
 OCR_PATH = str(ANPRS / "models" / "ocr/")
 OCR_LANGUAGE = ["en", "ne"]
@@ -4,6 +4,7 @@ import datetime
 import collections
 import numpy as np
 from .sort import Sort
+from ..scheduling import FrameScheduler
 from PIL import Image
 from collections import deque
 from django.conf import settings
@@ -16,12 +17,7 @@ from .validator import validate_plate_text
 from ..models import UserDetails
 from ..enums import VEHICLE_TYPE_MAPPING
 
-# TollAppConfig = apps.get_app_config('toll_app')
-TollAppConfig = object()
-plate_model = TollAppConfig.get_plate_model()
-coco_model = TollAppConfig.get_coco_model()
-easyocr_reader = TollAppConfig.get_easyocr_reader()
-device = TollAppConfig.get_device()
+TollAppConfig = apps.get_app_config('toll_app')
 
 
 tracker = Sort(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS)
@@ -33,48 +29,68 @@ next_plate_id = 0
 realtime_recognized_plates = {}
 
 
-def detect_vehicle_type_from_image(vehicle_region):
-    if vehicle_region is None or vehicle_region.size == 0:
-        return None, 0.0
+def detect_vehicles(frame):
+    """
+    One COCO pass over the whole frame. Returns an (N, 5) array of
+    [x1, y1, x2, y2, confidence] and the N matching vehicle types.
+    """
+    if frame is None or frame.size == 0:
+        return np.empty((0, 5)), []
 
     try:
-        results = coco_model(vehicle_region)
+        results = TollAppConfig.get_coco_model()(frame)
 
+        boxes = []
         vehicle_types = []
-        confidences = []
 
         for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    if box.conf >= COCO_THRESHOLD:
-                        class_id = int(box.cls[0])
-                        class_name = VEHICLE_TYPE_MAPPING[class_id]
-                        confidence = float(box.conf)
-
-                        if class_name in VEHICLE_TYPE_MAPPING.keys():
-                            vehicle_types.append(class_name)
-                            confidences.append(confidence)
-
-        if vehicle_types:
-            max_idx = np.argmax(confidences)
-            return vehicle_types[max_idx], confidences[max_idx]
-        else:
-            return None, 0.0
+            if result.boxes is not None:
+                for box in result.boxes:
+                    class_id = int(box.cls[0])
+                    if box.conf >= COCO_THRESHOLD and class_id in VEHICLE_TYPE_MAPPING:
+                        boxes.append([*map(float, box.xyxy[0]), float(box.conf)])
+                        vehicle_types.append(VEHICLE_TYPE_MAPPING[class_id])
+
+        return (np.array(boxes) if boxes else np.empty((0, 5))), vehicle_types
 
     except Exception as e:
-        print(f"Error in vehicle type detection: {e}")
+        print(f"Error in vehicle detection: {e}")
+        return np.empty((0, 5)), []
+
+
+def assign_vehicle_type(plate_bbox, vehicles):
+    """
+    Picks the vehicle enclosing the plate: the box covering the largest share
+    of the plate, the most confident one on a tie. Returns (type, confidence).
+    """
+    boxes, vehicle_types = vehicles
+    if not vehicle_types:
+        return None, 0.0
+
+    x1, y1, x2, y2 = plate_bbox
+    plate_area = max((x2 - x1) * (y2 - y1), 1)
+    overlap_w = (np.minimum(boxes[:, 2], x2) - np.maximum(boxes[:, 0], x1)).clip(0)
+    overlap_h = (np.minimum(boxes[:, 3], y2) - np.maximum(boxes[:, 1], y1)).clip(0)
+    containment = overlap_w * overlap_h / plate_area
+
+    best = int(np.lexsort((boxes[:, 4], containment))[-1])
+    if containment[best] < VEHICLE_CONTAINMENT_THRESHOLD:
         return None, 0.0
+    return vehicle_types[best], float(boxes[best, 4])
 
 
-def process_plate(plate_img, full_frame=None, plate_bbox=None):
+def process_plate(plate_img, plate_bbox=None, vehicles=None):
+    """
+    Reads one plate. `vehicles` is the frame's detect_vehicles() result; the
+    vehicle type is None without it.
+    """
     if plate_img is None or plate_img.size == 0:
         return "", 0, None
 
     try:
         processed_img = preprocess_image(plate_img)
 
-        ocr_results = easyocr_reader.readtext(processed_img, **READ_TEXT_CONFIG)
+        ocr_results = TollAppConfig.get_easyocr_reader().readtext(processed_img, **READ_TEXT_CONFIG)
 
         if not ocr_results:
             return "", 0, None
@@ -85,23 +101,8 @@ def process_plate(plate_img, full_frame=None, plate_bbox=None):
         text, _ = validate_plate_text(text)
 
         vehicle_type = None
-
-        if full_frame is not None and plate_bbox is not None:
-            x1, y1, x2, y2 = plate_bbox
-            h, w = full_frame.shape[:2]
-
-            expand_x = int((x2 - x1) * 1.5)
-            expand_y = int((y2 - y1) * 2.0)
-
-            vx1 = max(0, x1 - expand_x // 2)
-            vy1 = max(0, y1 - expand_y // 2)
-            vx2 = min(w, x2 + expand_x // 2)
-            vy2 = min(h, y2 + expand_y // 2)
-
-            vehicle_region = full_frame[vy1:vy2, vx1:vx2]
-
-            if vehicle_region.size > 0:
-                vehicle_type, vehicle_confidence = detect_vehicle_type_from_image(vehicle_region)
+        if vehicles is not None and plate_bbox is not None:
+            vehicle_type, _ = assign_vehicle_type(plate_bbox, vehicles)
 
         return text, confidence, vehicle_type
 
@@ -119,7 +120,8 @@ def process_image(image_file):
     img = Image.open(filepath)
     img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
 
-    plate_results = plate_model(img_cv)
+    plate_results = TollAppConfig.get_plate_model()(img_cv)
+    vehicles = detect_vehicles(img_cv)
     recognized_plates = []
 
     for result in plate_results:
@@ -130,7 +132,7 @@ def process_image(image_file):
                     x1, y1, x2, y2 = map(int, box.xyxy[0])
                     plate_img = img_cv[y1:y2, x1:x2]
 
-                    text, confidence, vehicle_type = process_plate(plate_img, img_cv, (x1, y1, x2, y2))
+                    text, confidence, vehicle_type = process_plate(plate_img, (x1, y1, x2, y2), vehicles)
 
                     if text:
                         recognized_plates.append({
@@ -164,7 +166,9 @@ def generate_frames_sort():
         return
 
     tracker = Sort(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS)
+    scheduler = FrameScheduler()
     track_texts = {}
+    track_vehicle_types = {}
     frame_count = 0
 
     while True:
@@ -172,12 +176,13 @@ def generate_frames_sort():
         if not success:
             break
 
-        # Process every 4th frame for better performance
-        if frame_count % 4 == 0:
+        # Process only the frames the scheduler has budget for
+        if scheduler.should_detect(frame_count):
             if frame is None or frame.size == 0:
                 continue
 
-            plate_results = plate_model(frame)
+            with scheduler.timed('detect'):
+                plate_results = TollAppConfig.get_plate_model()(frame)
             detections = []
 
             for result in plate_results:
@@ -191,14 +196,27 @@ def generate_frames_sort():
 
             dets = np.array(detections) if detections else np.empty((0, 5))
             tracks = tracker.update(dets)
+            scheduler.update_tracks(int(track[4]) for track in tracks)
+
+            # at most one vehicle pass per frame, only while some track has no vehicle type yet
+            vehicles = None
 
             for track in tracks:
                 x1, y1, x2, y2, track_id = map(int, track)
                 plate_img = frame[y1:y2, x1:x2]
 
-                # Process plate every 10 frames or if not processed yet
-                if track_id not in track_texts or frame_count % 10 == 0:
-                    text, confidence, vehicle_type = process_plate(plate_img, frame, (x1, y1, x2, y2))
+                # Process plate when the scheduler says it is due or if not processed yet
+                if scheduler.ocr_due(track_id, frame_count, recognized=track_id in track_texts):
+                    vehicle_type = track_vehicle_types.get(track_id)
+                    if vehicle_type is None:
+                        if vehicles is None:
+                            vehicles = detect_vehicles(frame)
+                        vehicle_type, _ = assign_vehicle_type((x1, y1, x2, y2), vehicles)
+                        if vehicle_type is not None:
+                            track_vehicle_types[track_id] = vehicle_type
+
+                    with scheduler.timed('ocr'):
+                        text, confidence, _ = process_plate(plate_img)
                     if text:
                         track_texts[track_id] = {
                             'text': text,
@@ -223,6 +241,10 @@ def generate_frames_sort():
             for tid in tracks_to_remove:
                 del track_texts[tid]
 
+            live_ids = {int(track[4]) for track in tracks}
+            for tid in [tid for tid in track_vehicle_types if tid not in live_ids and tid not in track_texts]:
+                del track_vehicle_types[tid]
+
             realtime_recognized_plates.clear()
             for tid, info in track_texts.items():
                 realtime_recognized_plates[tid] = info
@@ -243,7 +265,8 @@ def process_frame(frame):
 
     recognized_plates = []
 
-    plate_results = plate_model(frame)
+    plate_results = TollAppConfig.get_plate_model()(frame)
+    vehicles = None
 
     for result in plate_results:
         boxes = result.boxes
@@ -253,7 +276,10 @@ def process_frame(frame):
                     x1, y1, x2, y2 = map(int, box.xyxy[0])
                     plate_img = frame[y1:y2, x1:x2]
 
-                    text, confidence, vehicle_type = process_plate(plate_img, frame, (x1, y1, x2, y2))
+                    # one vehicle pass for the whole frame, and none when there is no plate
+                    if vehicles is None:
+                        vehicles = detect_vehicles(frame)
+                    text, confidence, vehicle_type = process_plate(plate_img, (x1, y1, x2, y2), vehicles)
 
                     if text: 
                         recognized_plates.append({
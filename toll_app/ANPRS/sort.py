@@ -176,29 +176,19 @@ def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
     else:
         matched_indices = np.empty(shape=(0, 2))
 
-    unmatched_detections = []
-    for d, det in enumerate(detections):
-        if d not in matched_indices[:, 0]:
-            unmatched_detections.append(d)
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if t not in matched_indices[:, 1]:
-            unmatched_trackers.append(t)
-
-    # filter out matched with low IOU
-    matches = []
-    for m in matched_indices:
-        if iou_matrix[m[0], m[1]] < iou_threshold:
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-    if len(matches) == 0:
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(matches, axis=0)
-
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+    matched_indices = np.asarray(matched_indices, dtype=int).reshape(-1, 2)
+    detected = np.zeros(len(detections), dtype=bool)
+    detected[matched_indices[:, 0]] = True
+    tracked = np.zeros(len(trackers), dtype=bool)
+    tracked[matched_indices[:, 1]] = True
+
+    # filter out matched with low IOU; they go after the never matched ones, as before
+    low_iou = iou_matrix[matched_indices[:, 0], matched_indices[:, 1]] < iou_threshold
+    unmatched_detections = np.concatenate([np.flatnonzero(~detected), matched_indices[low_iou, 0]])
+    unmatched_trackers = np.concatenate([np.flatnonzero(~tracked), matched_indices[low_iou, 1]])
+    matches = matched_indices[~low_iou]
+
+    return matches, unmatched_detections, unmatched_trackers
 
 
 class Sort(object):
@@ -0,0 +1,213 @@
+"""
+CPU inference backends for the YOLO detectors.
+
+The .pt weights are exported once to ONNX or OpenVINO (optionally quantized to
+INT8 against the detector's own calibration set, DETECTOR_CALIBRATION_DATA) and
+loaded back through ultralytics, so callers keep getting the usual result.boxes
+objects whatever the backend is.
+
+Compare every backend on a labelled dataset with:
+
+    python -m toll_app.ANPRS_2.backend --weights models/od/best.pt --data models/od/data.yaml
+"""
+import os
+import glob
+import json
+import time
+import argparse
+
+from .config import *
+
+DETECTOR_BACKENDS = ('torch', 'onnx', 'openvino')
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'bmp')
+
+
+def exported_path(weights, backend, int8=False):
+    stem, _ = os.path.splitext(weights)
+    if backend == 'onnx':
+        return f"{stem}_int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == 'openvino':
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    return weights
+
+
+def calibration_data(weights):
+    return DETECTOR_CALIBRATION_DATA.get(os.path.basename(weights))
+
+
+def export_detector(weights, backend, int8=False, data=None, imgsz=DETECTOR_IMGSZ):
+    data = data or calibration_data(weights)
+    if int8 and not data:
+        raise ValueError(f"No INT8 calibration data for {weights}")
+    target = exported_path(weights, backend, int8)
+    if backend == 'torch':
+        return target
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(weights):
+        return target
+
+    from ultralytics import YOLO
+
+    print(f"Exporting {weights} to {target}...")
+    model = YOLO(weights)
+
+    if backend == 'openvino':
+        # ultralytics runs NNCF post-training quantization against `data`
+        return model.export(format='openvino', imgsz=imgsz, int8=int8, data=data, dynamic=True)
+
+    # Dynamic batch so frames from several lanes can share one call
+    onnx_path = model.export(format='onnx', imgsz=imgsz, simplify=True, dynamic=True)
+    if int8:
+        return quantize_onnx(onnx_path, target, data, imgsz)
+    return onnx_path
+
+
+def quantize_onnx(model_path, target, data, imgsz=DETECTOR_IMGSZ):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class PlateCalibrationReader(CalibrationDataReader):
+        def __init__(self, images):
+            self.images = iter(images)
+
+        def get_next(self):
+            image = next(self.images, None)
+            if image is None:
+                return None
+            return {'images': load_calibration_image(image, imgsz)}
+
+    images = dataset_images(data)[:DETECTOR_CALIBRATION_SIZE]
+    if not images:
+        raise ValueError(f"No calibration images found for {data}")
+
+    quantize_static(
+        model_path,
+        target,
+        PlateCalibrationReader(images),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+    # ultralytics reads class names, stride and imgsz from the model metadata
+    source, quantized = onnx.load(model_path), onnx.load(target)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, target)
+
+    return target
+
+
+def load_calibration_image(path, imgsz):
+    import cv2
+    import numpy as np
+
+    image = cv2.imread(path)
+    h, w = image.shape[:2]
+    scale = min(imgsz / w, imgsz / h)
+    resized = cv2.resize(image, (int(w * scale), int(h * scale)))
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - resized.shape[0]) // 2, (imgsz - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+
+    blob = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None]
+    return blob.astype(np.float32) / 255.0
+
+
+def dataset_images(data, split='val'):
+    from ultralytics.data.utils import check_det_dataset
+
+    paths = check_det_dataset(data)[split]
+    if not isinstance(paths, (list, tuple)):
+        paths = [paths]
+
+    images = []
+    for path in paths:
+        for ext in IMAGE_EXTENSIONS:
+            images.extend(glob.glob(os.path.join(str(path), '**', f'*.{ext}'), recursive=True))
+    return sorted(images)
+
+
+def load_detector(weights, device='cpu', backend=DETECTOR_BACKEND, int8=DETECTOR_INT8, data=None):
+    from ultralytics import YOLO
+
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend}")
+
+    if backend == 'torch':
+        model = YOLO(weights)
+        model.to(device)
+        return model
+
+    data = data or calibration_data(weights)
+    if int8 and not data:
+        print(f"No INT8 calibration data for {weights}, running it at full precision")
+        int8 = False
+    return YOLO(export_detector(weights, backend, int8, data), task='detect')
+
+
+def benchmark_backend(weights, backend, int8, data, imgsz, runs):
+    model = load_detector(weights, 'cpu', backend, int8, data)
+    images = dataset_images(data)[:runs]
+
+    # first call builds the runtime session, keep it out of the timings
+    model(images[0], imgsz=imgsz, verbose=False)
+
+    latencies = []
+    for image in images:
+        start = time.perf_counter()
+        model(image, imgsz=imgsz, verbose=False)
+        latencies.append(time.perf_counter() - start)
+
+    metrics = model.val(data=data, imgsz=imgsz, batch=1, device='cpu', verbose=False)
+
+    mean_latency = sum(latencies) / len(latencies)
+    return {
+        'backend': backend,
+        'int8': int8,
+        'model': exported_path(weights, backend, int8),
+        'map50': float(metrics.box.map50),
+        'map50_95': float(metrics.box.map),
+        'mean_latency_ms': mean_latency * 1000,
+        'p95_latency_ms': sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000,
+        'fps': 1 / mean_latency,
+    }
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='Detector backend comparison')
+    parser.add_argument("--weights", help="PyTorch weights to export.", type=str, default=OD_FILENAME)
+    parser.add_argument("--data", help="Dataset yaml used for calibration and accuracy.", type=str,
+                        default=calibration_data(OD_FILENAME))
+    parser.add_argument("--imgsz", help="Inference image size.", type=int, default=DETECTOR_IMGSZ)
+    parser.add_argument("--runs", help="Number of images timed per backend.", type=int, default=100)
+    parser.add_argument("--output", help="Where to write the JSON report.", type=str,
+                        default="detector_backends.json")
+    parser.add_argument("--no-int8", dest="int8", help="Skip the INT8 variants.", action='store_false')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    variants = [('torch', False), ('onnx', False), ('openvino', False)]
+    if args.int8:
+        variants += [('onnx', True), ('openvino', True)]
+
+    report = []
+    for backend, int8 in variants:
+        try:
+            report.append(benchmark_backend(args.weights, backend, int8, args.data, args.imgsz, args.runs))
+        except Exception as e:
+            print(f"Skipping {backend}{' int8' if int8 else ''}: {e}")
+
+    with open(args.output, 'w') as out_file:
+        json.dump(report, out_file, indent=2)
+
+    print(f"{'backend':<16}{'mAP50':>8}{'mAP50-95':>10}{'ms/img':>10}{'p95 ms':>10}{'fps':>8}")
+    for row in report:
+        name = f"{row['backend']}{' int8' if row['int8'] else ''}"
+        print(f"{name:<16}{row['map50']:>8.3f}{row['map50_95']:>10.3f}{row['mean_latency_ms']:>10.1f}"
+              f"{row['p95_latency_ms']:>10.1f}{row['fps']:>8.1f}")
@@ -0,0 +1,129 @@
+"""
+Cross-lane micro-batching for the plate detector.
+
+Every running lane hands its current frame to the shared BatchedDetector and
+waits. The service collects frames until every active lane has sent one, the
+batch window has passed or the batch is full, runs a single detector call for
+all of them and hands each lane its own boxes back. A lane is active while it
+keeps sending frames; an idle lane (empty road, camera down) holds nobody back,
+and with one active lane each frame goes through on its own.
+"""
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from .config import *
+
+
+class BatchedDetector(object):
+    def __init__(self, detect_batch, window=DETECTOR_BATCH_SETTINGS['window'],
+                 max_batch=DETECTOR_BATCH_SETTINGS['max_batch'],
+                 active_interval=DETECTOR_BATCH_SETTINGS['active_interval']):
+        self.detect_batch = detect_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.active_interval = active_interval
+        self.requests = queue.Queue()
+        # lane id -> when it last sent a frame
+        self.lanes = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+        self.batches = 0
+        self.frames = 0
+        self.batch_sizes = {}
+        self.queue_delay = None
+        self.max_queue_delay = 0.0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='batched_detector', daemon=True)
+                self.thread.start()
+
+    def register(self, lane_id):
+        with self.lock:
+            self.lanes.setdefault(lane_id, None)
+
+    def unregister(self, lane_id):
+        with self.lock:
+            self.lanes.pop(lane_id, None)
+
+    def detect(self, frame, lane_id=None):
+        """
+        Returns the frame's [[x1, y1, x2, y2, score], ...] once its batch has run.
+        """
+        if self.thread is None:
+            self.start()
+
+        future = Future()
+        queued_at = time.perf_counter()
+        with self.lock:
+            if lane_id in self.lanes:
+                self.lanes[lane_id] = queued_at
+        self.requests.put((frame, queued_at, future))
+        return future.result()
+
+    def active_lanes(self):
+        since = time.perf_counter() - self.active_interval
+        with self.lock:
+            return sum(1 for sent_at in self.lanes.values() if sent_at is not None and sent_at >= since)
+
+    def collect(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.window
+
+        # every active lane waits for at most one frame, so there is no point waiting past that
+        while len(batch) < min(self.max_batch, max(self.active_lanes(), 1)):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            started = time.perf_counter()
+
+            try:
+                results = self.detect_batch([frame for frame, _, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.record(batch, started)
+            for (_, _, future), detections in zip(batch, results):
+                future.set_result(detections)
+
+    def record(self, batch, started):
+        self.batches += 1
+        self.frames += len(batch)
+        self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+        for _, queued_at, _ in batch:
+            delay = started - queued_at
+            self.max_queue_delay = max(self.max_queue_delay, delay)
+            if self.queue_delay is None:
+                self.queue_delay = delay
+            else:
+                self.queue_delay += SCHEDULER_SMOOTHING * (delay - self.queue_delay)
+
+    def status(self):
+        return {
+            'lanes': len(self.lanes),
+            'active_lanes': self.active_lanes(),
+            'window_ms': self.window * 1000,
+            'max_batch': self.max_batch,
+            'batches': self.batches,
+            'frames': self.frames,
+            'mean_batch_size': self.frames / self.batches if self.batches else 0.0,
+            'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            'queue_delay_ms': (self.queue_delay or 0.0) * 1000,
+            'max_queue_delay_ms': self.max_queue_delay * 1000,
+        }
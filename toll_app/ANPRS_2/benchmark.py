@@ -0,0 +1,429 @@
+"""
+Microbenchmarks for the ANPR hot paths that run without models or Django.
+
+    python -m toll_app.ANPRS_2.benchmark preprocess
+    python -m toll_app.ANPRS_2.benchmark validator
+    python -m toll_app.ANPRS_2.benchmark matcher --count 50000
+    python -m toll_app.ANPRS_2.benchmark tracker --seq_path data --output trackers.json
+"""
+import os
+import glob
+import json
+import time
+import argparse
+import importlib
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from .config import *
+from .intermediate import preprocess_image, PlatePreprocessor
+from .plate_grammar import rank_plates
+from .validator import validate_english, validate_nepali
+from .fuzzy import PlateMatcher, plate_distance
+from .sort import Sort, VectorizedSort, KalmanBoxTracker, iou_batch, linear_assignment
+
+TRACKERS = {
+    'sort': Sort,
+    'vectorized': VectorizedSort,
+}
+
+# (max objects per frame, share of objects replaced per frame)
+TRACKER_SCENARIOS = {
+    'empty': (0, 0.0),
+    'light': (5, 0.02),
+    'busy': (20, 0.05),
+    'jam': (50, 0.02),
+    'churn': (50, 0.2),
+}
+
+
+def synthetic_plates(count=200, seed=0, speckle=0.0):
+    """
+    Plate-like crops of the sizes the detector produces: dark characters on a
+    light, noisy background, with `speckle` of the pixels turned into dirt.
+    """
+    rng = np.random.default_rng(seed)
+    plates = []
+    for _ in range(count):
+        width = int(rng.integers(80, 240))
+        height = max(20, int(width * rng.uniform(0.25, 0.5)))
+        plate = np.full((height, width, 3), int(rng.integers(170, 240)), dtype=np.uint8)
+        text = ''.join(rng.choice(list('ABCDEFGHJKLMNPRSTUVWXYZ0123456789'), 7))
+        cv2.putText(plate, text, (4, height * 2 // 3), cv2.FONT_HERSHEY_SIMPLEX,
+                    width / 220, (20, 20, 20), 2)
+        plate = np.clip(plate + rng.normal(0, 12, plate.shape), 0, 255).astype(np.uint8)
+        if speckle:
+            for y, x in zip(*np.nonzero(rng.random((height, width)) < speckle)):
+                cv2.circle(plate, (int(x), int(y)), int(rng.integers(1, 3)), (20, 20, 20), -1)
+        plates.append(plate)
+    return plates
+
+
+def time_per_crop(function, plates, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for plate in plates:
+            function(plate)
+        timings.append((time.perf_counter() - start) / len(plates))
+    return min(timings)
+
+
+def benchmark_preprocess(count=200, repeat=5, speckle=0.01):
+    """
+    preprocess_image against every PlatePreprocessor profile, on clean crops
+    and on dirty ones (where the old contour loop has specks to erase), and
+    how many pixels of 'full' agree with preprocess_image.
+    """
+    results = {}
+    for crops, plates in [('clean', synthetic_plates(count)), ('dirty', synthetic_plates(count, speckle=speckle))]:
+        timings = results[crops] = {'preprocess_image': time_per_crop(preprocess_image, plates, repeat)}
+        for profile in PREPROCESS_PROFILES:
+            timings[f'PlatePreprocessor({profile!r})'] = time_per_crop(PlatePreprocessor(profile), plates, repeat)
+
+        baseline = timings['preprocess_image']
+        print(f"{len(plates)} {crops} crops, best of {repeat}")
+        for name, seconds in timings.items():
+            print(f"  {name:<32} {seconds * 1e6:9.1f} us/crop  {baseline / seconds:8.2f}x")
+
+        full = PlatePreprocessor('full')
+        agreement = [np.mean(preprocess_image(plate) == full(plate)) for plate in plates]
+        print(f"  'full' pixels matching preprocess_image: {np.mean(agreement):.2%} (worst crop {min(agreement):.2%})")
+    return results
+
+
+def synthetic_readings(count=1000, seed=0):
+    """
+    OCR results as the readers return them: a plate split over a few boxes,
+    sometimes a state name box, a weak box, or a misread character.
+    """
+    rng = np.random.default_rng(seed)
+    nep_letters = [letter for letter in NEP_ALPHA_CHAR_LIST if len(letter) == 1 and letter != '-']
+    readings = {'en': [], 'ne': []}
+    for _ in range(count):
+        eng = ''.join(rng.choice(list('ABCDEFGHJKLMNPRSTUVWXYZ'), 3)) + ' ' + ''.join(rng.choice(list('0123456789'), 4))
+        nep = (f"{rng.choice(nep_letters)} {''.join(rng.choice(NEP_DIGIT_CHAR_LIST, 2))} "
+               f"{rng.choice(nep_letters)} {''.join(rng.choice(NEP_DIGIT_CHAR_LIST, 4))}")
+        for lang, text, state in (('en', eng, 'BAGMATI'), ('ne', nep, 'प्रदेश-३')):
+            if rng.random() < 0.2:
+                position = int(rng.integers(len(text)))
+                text = text[:position] + rng.choice(list('O08-?')) + text[position + 1:]
+            cut = int(rng.integers(1, len(text)))
+            results = [(None, text[:cut], 0.9), (None, text[cut:], 0.8)]
+            if rng.random() < 0.3:
+                results.insert(0, (None, state, 0.7))
+            if rng.random() < 0.3:
+                results.append((None, 'X1', 0.2))
+            readings[lang].append(results)
+    return readings
+
+
+def time_per_call(function, arguments, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for argument in arguments:
+            function(argument)
+        timings.append((time.perf_counter() - start) / len(arguments))
+    return min(timings)
+
+
+def benchmark_validator(count=1000, repeat=5):
+    """
+    The plate grammar against the list-based validators of toll_app.ANPRS.
+    """
+    from ..ANPRS import validator as legacy
+
+    readings = synthetic_readings(count)
+    pairs = list(zip(readings['ne'], readings['en']))
+    timings = {
+        'legacy validate_english': time_per_call(legacy.validate_english, readings['en'], repeat),
+        'validate_english': time_per_call(validate_english, readings['en'], repeat),
+        'legacy validate_nepali': time_per_call(legacy.validate_nepali, readings['ne'], repeat),
+        'validate_nepali': time_per_call(validate_nepali, readings['ne'], repeat),
+        'rank_plates (both readers)': time_per_call(
+            lambda pair: rank_plates([('en', pair[1]), ('ne', pair[0])]), pairs, repeat),
+    }
+    print(f"{count} readings per script, best of {repeat}")
+    for name, seconds in timings.items():
+        print(f"  {name:<32} {seconds * 1e6:9.1f} us/call")
+    return timings
+
+
+def synthetic_registry(count=50000, seed=0):
+    """
+    Distinct normalized plates, English and Nepali, as stored in plate_key.
+    """
+    rng = np.random.default_rng(seed)
+    nep_letters = [letter for letter in NEP_ALPHA_CHAR_LIST if len(letter) == 1 and letter != '-']
+    keys = set()
+    while len(keys) < count:
+        if rng.random() < 0.5:
+            keys.add(''.join(rng.choice(list('ABCDEFGHJKLMNPRSTUVWXYZ'), 3)) + ''.join(rng.choice(list('0123456789'), 4)))
+        else:
+            keys.add(f"{rng.choice(nep_letters)}{rng.integers(1, 100)}{rng.choice(nep_letters)}{rng.integers(1, 10000)}")
+    return sorted(keys)
+
+
+def misread(key, rng):
+    """
+    One OCR error: a confusion, another character, or a dropped character.
+    """
+    position = int(rng.integers(len(key)))
+    kind = rng.integers(3)
+    if kind == 0:
+        groups = [group for group in PLATE_MATCH_CONFUSIONS if key[position] in group]
+        if groups:
+            group = groups[int(rng.integers(len(groups)))]
+            return key[:position] + rng.choice([char for char in group if char != key[position]]) + key[position + 1:]
+    if kind == 1:
+        return key[:position] + rng.choice(list('ABCDEFGHJKLMNPRSTUVWXYZ0123456789')) + key[position + 1:]
+    return key[:position] + key[position + 1:]
+
+
+def benchmark_matcher(count=50000, queries=2000, seed=0):
+    """
+    PlateMatcher on misreads of registered plates and on unregistered plates,
+    against scoring every registered plate.
+    """
+    rng = np.random.default_rng(seed)
+    keys = synthetic_registry(count + queries, seed)
+    registered, unregistered = keys[:count], keys[count:]
+
+    start = time.perf_counter()
+    matcher = PlateMatcher()
+    for user_id, key in enumerate(registered):
+        matcher.add(key, user_id)
+    build = time.perf_counter() - start
+
+    picks = rng.choice(count, queries)
+    reads = [(misread(registered[i], rng), int(i)) for i in picks]
+    timings = {
+        'misread': time_per_call(lambda read: matcher.match(read[0]), reads, 3),
+        'unregistered': time_per_call(matcher.match, unregistered, 3),
+    }
+    scan = reads[:20]
+    timings['full scan'] = time_per_call(
+        lambda read: [plate_distance(read[0], key) for key in registered], scan, 1)
+
+    outcomes = {'matched': 0, 'wrong': 0, 'ambiguous': 0, 'missed': 0}
+    for read, user_id in reads:
+        matches = matcher.match(read)
+        if len(matches) > 1:
+            outcomes['ambiguous'] += 1
+        elif not matches:
+            outcomes['missed'] += 1
+        else:
+            outcomes['matched' if matches[0][2] == user_id else 'wrong'] += 1
+    false_matches = sum(len(matcher.match(key)) == 1 for key in unregistered)
+
+    print(f"{count} registered plates indexed in {build:.2f}s, {queries} reads")
+    for name, seconds in timings.items():
+        print(f"  {name:<16} {seconds * 1e6:12.1f} us/read")
+    print(f"  misreads: {outcomes}, unregistered matched: {false_matches}")
+    return timings, outcomes
+
+
+def synthetic_stream(max_objects, churn, frames=500, seed=0):
+    """
+    Plate detections of vehicles crossing the frame: up to `max_objects` at a
+    time, `churn` of them leaving (and as many new ones arriving) per frame,
+    with box jitter and missed detections. Returns per frame an (N, 5) array
+    of detections and the N ground truth ids.
+    """
+    rng = np.random.default_rng(seed)
+    next_id = 0
+    objects = {}
+
+    def spawn():
+        nonlocal next_id
+        width = rng.uniform(60, 160)
+        objects[next_id] = {
+            'box': np.array([rng.uniform(0, 1700), rng.uniform(0, 1000), 0., 0.]),
+            'size': np.array([width, width * rng.uniform(0.3, 0.5)]),
+            'velocity': rng.normal(0, 6, 2),
+        }
+        next_id += 1
+
+    stream = []
+    for _ in range(frames):
+        for object_id in [object_id for object_id in objects if rng.random() < churn]:
+            del objects[object_id]
+        while len(objects) < max_objects:
+            spawn()
+
+        dets, ids = [], []
+        for object_id, info in objects.items():
+            info['box'][:2] += info['velocity']
+            if rng.random() < 0.05:
+                continue  # missed by the detector
+            x, y = info['box'][:2] + rng.normal(0, 1.5, 2)
+            width, height = info['size'] * rng.normal(1, 0.02)
+            dets.append([x, y, x + width, y + height, rng.uniform(0.6, 1.0)])
+            ids.append(object_id)
+        stream.append((np.array(dets).reshape(-1, 5), np.array(ids, dtype=int)))
+    return stream
+
+
+def load_mot_stream(path):
+    """
+    Reads a MOT-format det.txt/gt.txt as sort.py's runner does. The id column
+    is used as ground truth where it is set (gt.txt); det.txt has -1 there.
+    """
+    rows = np.loadtxt(path, delimiter=',', ndmin=2)
+    stream = []
+    for frame in range(1, int(rows[:, 0].max()) + 1):
+        frame_rows = rows[rows[:, 0] == frame]
+        dets = frame_rows[:, 2:7].copy()
+        dets[:, 2:4] += dets[:, 0:2]
+        stream.append((dets, frame_rows[:, 1].astype(int)))
+    return stream
+
+
+def count_id_switches(stream, outputs, iou_threshold=0.5):
+    """
+    MOT ID switches: a ground truth object matched to a different track id
+    than the last time it was matched. None when the stream has no ground truth.
+    """
+    if all((ids < 0).all() for _, ids in stream):
+        return None
+
+    last_track = {}
+    switches = 0
+    for (dets, ids), tracks in zip(stream, outputs):
+        if len(dets) == 0 or len(tracks) == 0:
+            continue
+        iou = iou_batch(dets[:, :4], tracks[:, :4])
+        for d, t in linear_assignment(-iou).reshape(-1, 2):
+            if iou[d, t] < iou_threshold or ids[d] < 0:
+                continue
+            track_id = int(tracks[t, 4])
+            if last_track.get(ids[d], track_id) != track_id:
+                switches += 1
+            last_track[ids[d]] = track_id
+    return switches
+
+
+def benchmark_tracker(tracker_class, stream, max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS):
+    """
+    Replays a stream through tracker_class(...).update twice: once timed,
+    once under tracemalloc for the memory allocated per update.
+    """
+    # the first update may import the filter library, keep that out of the timings
+    tracker_class(max_age=max_age, min_hits=min_hits).update(np.array([[0., 0., 10., 10., 1.]]))
+
+    KalmanBoxTracker.count = 0
+    tracker = tracker_class(max_age=max_age, min_hits=min_hits)
+    latencies, outputs = [], []
+    for dets, _ in stream:
+        start = time.perf_counter()
+        outputs.append(tracker.update(dets))
+        latencies.append(time.perf_counter() - start)
+
+    KalmanBoxTracker.count = 0
+    tracker = tracker_class(max_age=max_age, min_hits=min_hits)
+    peaks = []
+    tracemalloc.start()
+    try:
+        for dets, _ in stream:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            tracker.update(dets)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    latencies_us = np.array(latencies) * 1e6
+    return {
+        'updates': len(stream),
+        'detections': int(sum(len(dets) for dets, _ in stream)),
+        'mean_us': float(latencies_us.mean()),
+        'p50_us': float(np.percentile(latencies_us, 50)),
+        'p90_us': float(np.percentile(latencies_us, 90)),
+        'p99_us': float(np.percentile(latencies_us, 99)),
+        'max_us': float(latencies_us.max()),
+        'peak_alloc_bytes_mean': float(np.mean(peaks)),
+        'peak_alloc_bytes_max': int(np.max(peaks)),
+        'tracks_reported': int(sum(len(tracks) for tracks in outputs)),
+        'id_switches': count_id_switches(stream, outputs),
+    }
+
+
+def tracker_class(name):
+    """
+    'sort', 'vectorized' or any 'package.module:Class' with Sort's interface.
+    """
+    if name in TRACKERS:
+        return TRACKERS[name]
+    module, _, attribute = name.partition(':')
+    return getattr(importlib.import_module(module), attribute)
+
+
+def benchmark_trackers(trackers, seq_path=None, phase='train', frames=500, output=None):
+    streams = {
+        f"synthetic/{scenario}": synthetic_stream(max_objects, churn, frames)
+        for scenario, (max_objects, churn) in TRACKER_SCENARIOS.items()
+    }
+    if seq_path:
+        pattern = os.path.join(seq_path, phase, '*', '*', '*.txt')
+        for path in sorted(glob.glob(pattern)):
+            if os.path.basename(path) in ('det.txt', 'gt.txt'):
+                sequence = os.path.relpath(path, os.path.join(seq_path, phase))
+                streams[f"recorded/{sequence}"] = load_mot_stream(path)
+
+    results = []
+    print(f"{'stream':<36}{'tracker':<14}{'p50 us':>9}{'p99 us':>9}{'max us':>9}{'peak KB':>9}{'IDSW':>6}")
+    for stream_name, stream in streams.items():
+        for name in trackers:
+            row = {'stream': stream_name, 'tracker': name, **benchmark_tracker(tracker_class(name), stream)}
+            results.append(row)
+            id_switches = '-' if row['id_switches'] is None else row['id_switches']
+            print(f"{stream_name:<36}{name:<14}{row['p50_us']:>9.0f}{row['p99_us']:>9.0f}{row['max_us']:>9.0f}"
+                  f"{row['peak_alloc_bytes_max'] / 1024:>9.1f}{id_switches:>6}")
+
+    if output:
+        with open(output, 'w') as out_file:
+            json.dump({'max_age': TRACK_MAX_AGE, 'min_hits': TRACK_MIN_HITS, 'results': results}, out_file, indent=2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    preprocess = subparsers.add_parser('preprocess', help='preprocess_image against PlatePreprocessor profiles')
+    preprocess.add_argument('--count', type=int, default=200)
+    preprocess.add_argument('--repeat', type=int, default=5)
+    preprocess.add_argument('--speckle', type=float, default=0.01)
+
+    validator = subparsers.add_parser('validator', help='plate grammar against the list-based validators')
+    validator.add_argument('--count', type=int, default=1000)
+    validator.add_argument('--repeat', type=int, default=5)
+
+    matcher = subparsers.add_parser('matcher', help='fuzzy plate matching against a full scan')
+    matcher.add_argument('--count', type=int, default=50000, help='registered plates')
+    matcher.add_argument('--queries', type=int, default=2000)
+
+    tracker = subparsers.add_parser('tracker', help='tracker latency, allocations and ID switches')
+    tracker.add_argument('--trackers', nargs='+', default=list(TRACKERS),
+                         help="names from TRACKERS or 'package.module:Class'")
+    tracker.add_argument('--seq_path', help='MOT-format recordings, laid out as for sort.py')
+    tracker.add_argument('--phase', default='train')
+    tracker.add_argument('--frames', type=int, default=500, help='frames per synthetic stream')
+    tracker.add_argument('--output', help='where to write the JSON results')
+
+    args = parser.parse_args()
+    if args.benchmark == 'preprocess':
+        benchmark_preprocess(args.count, args.repeat, args.speckle)
+    elif args.benchmark == 'validator':
+        benchmark_validator(args.count, args.repeat)
+    elif args.benchmark == 'matcher':
+        benchmark_matcher(args.count, args.queries)
+    elif args.benchmark == 'tracker':
+        benchmark_trackers(args.trackers, args.seq_path, args.phase, args.frames, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,19 @@
-from ultralytics import YOLO
-from easyocr import Reader
-import torch
+import os
 
 OD_FILENAME = "models/od/best.pt"
 
+# Detector runtime: 'torch' runs the .pt weights eagerly, 'onnx' and 'openvino'
+# export them once (see backend.py) and run the exported model on CPU.
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'torch')
+DETECTOR_INT8 = os.environ.get('DETECTOR_INT8') == '1'
+# INT8 calibration set per detector weights; a detector without one stays at full precision
+# (the COCO model is not calibrated on plates)
+DETECTOR_CALIBRATION_DATA = {
+    'best.pt': "models/od/data.yaml",
+}
+DETECTOR_CALIBRATION_SIZE = 300
+DETECTOR_IMGSZ = 640
+
 OCR_FOLDER = "models/ocr/"
 
 NEP_FONT_PATH = "fonts/Aakriti.ttf"
@@ -62,15 +72,243 @@ OCR_THRESHOLD = 0.5
 IOU_THRESHOLD = 0.3
 VIDEO_OCR_THRESHOLD = 0.3
 
+# Plate layouts OCR output is matched against (plate_grammar.py), per reader: groups of
+# (class, min length, max length), 'L' a letter and 'D' a digit, written space separated.
+PLATE_LAYOUTS = {
+    'ne': {
+        'nepali_old': [('L', 1, 1), ('D', 1, 2), ('L', 1, 1), ('D', 1, 4)],  # बा २ च १२३४
+        'nepali_new': [('D', 1, 3), ('L', 1, 1), ('D', 1, 4)],  # ३०१ च १२३४
+    },
+    'en': {
+        'english': [('L', 3, 3), ('D', 1, 4)],  # ABC 1234
+    },
+}
+
+# Characters OCR commonly reads instead of the expected class, with the substitute
+ENG_LETTER_CONFUSIONS = {'4': 'A', '8': 'B', '3': 'B', '0': 'D'}
+ENG_DIGIT_CONFUSIONS = {'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'Z': '2', 'S': '5', 'B': '8'}
+NEP_DIGIT_CONFUSIONS = {'0': '०', '8': '४', 'o': '०', 'O': '०', 'c': '८', 'C': '८'}
+
+# Cost of a substituted character and of an alphabet character left out of the plate;
+# a candidate's score is the reading confidence / (1 + cost). A reading that costs more
+# than `max_cost` to fit a layout (say one stray character and one confusion) is not a plate
+PLATE_GRAMMAR_COSTS = {
+    'substitution': 0.5,
+    'skip': 1.0,
+    'max_cost': 1.5,
+}
+PLATE_CANDIDATES = 3
+
 TRACK_MAX_SIZE = 10
 TRACK_MAX_AGE = 10
 TRACK_MIN_HITS = 3
 
+LIVE_CAMERA_SOURCE = 1
+
+# Lanes served by this process (lanes.py): lane id -> camera index, video file or stream URL
+LIVE_LANES = {
+    '1': LIVE_CAMERA_SOURCE,
+    # '2': 'rtsp://10.0.0.12:554/stream1',
+}
+DEFAULT_LANE = '1'
+
+# Bounded queues between the live pipeline stages; full frame queues drop their oldest frame
+PIPELINE_QUEUE_SIZES = {
+    'capture': 2,
+    'ocr': 16,
+    'transaction': 32,
+    'encode': 2,
+}
+# Lanes share one detector call per batch (batching.py): a batch closes once every
+# active lane has sent a frame, after `window` seconds or at `max_batch` frames. A
+# lane that has not sent a frame for `active_interval` seconds is not waited for
+DETECTOR_BATCH_SETTINGS = {
+    'enabled': True,
+    'window': 0.02,
+    'max_batch': 8,
+    'active_interval': 0.5,
+}
+PIPELINE_STATUS_COLORS = {
+    'success': (0, 255, 0),
+    'pending': (0, 255, 255),
+    'review': (0, 165, 255),
+    'error': (0, 0, 255),
+}
+
+# Adaptive frame scheduling, shared with the legacy pipeline (toll_app/scheduling.py)
+from ..scheduling import (SCHEDULER_TARGET_FPS, SCHEDULER_TARGET_LATENCY, SCHEDULER_MAX_DETECT_INTERVAL,
+                          SCHEDULER_MIN_OCR_INTERVAL, SCHEDULER_MAX_OCR_INTERVAL, SCHEDULER_OCR_BUDGET,
+                          SCHEDULER_SMOOTHING)
+
+# Motion gate in front of the detector (motion.py), overridable per camera source
+MOTION_GATE_SETTINGS = {
+    'enabled': True,
+    'width': 160,  # frames are compared at this width
+    'pixel_threshold': 25,  # grey-level change for a pixel to count as moving
+    'min_area': 0.002,  # share of moving pixels that opens the gate
+    'hold_frames': 15,  # keep detecting this many frames after motion stops
+    'learning_rate': 0.05,  # how fast the background absorbs slow changes
+}
+CAMERA_MOTION_GATE_SETTINGS = {
+    # LIVE_CAMERA_SOURCE: {'min_area': 0.005},
+}
+
+# Per-track OCR consensus (consensus.py): once this many reads agree on every
+# character (confidence-weighted share), the plate is locked and no longer read.
+CONSENSUS_MIN_READS = 3
+CONSENSUS_LOCK_AGREEMENT = 0.8
 
-HAS_CUDA = torch.cuda.is_available()
+# Perceptual-hash cache of plate OCR results (ocr_cache.py)
+OCR_CACHE_SETTINGS = {
+    'enabled': True,
+    'max_size': 512,  # entries kept, least recently used evicted first
+    'ttl': 5.0,  # seconds a read is reused before the plate is read again
+    # plates one digit apart can differ by a single hash bit, so only an identical hash
+    # of the same track counts as the same crop
+    'max_distance': 0,
+    'hash_size': 24,  # 24 -> 1152-bit dHash
+    'hash_margin': 16,  # grey levels a pixel pair must differ by to set a bit
+}
+
+# OCR worker processes (ocr_pool.py); 0 keeps OCR in the Django process
+OCR_POOL_SETTINGS = {
+    'workers': int(os.environ.get('OCR_POOL_WORKERS', 0)),
+    'queue_size': 8,  # batches waiting for a worker before submit() blocks
+}
 
-if HAS_CUDA:
-    read_text_config = {
+# Plate -> (user id, vehicle type) cache in front of UserDetails (registry.py). Entries
+# follow UserDetails saves and deletes in this process; `ttl` bounds how stale they get
+# when another process edits the registry. Unregistered plates are cached as misses.
+REGISTRY_CACHE_SETTINGS = {
+    'enabled': True,
+    'max_size': 100000,
+    'warm_size': 50000,  # vehicles loaded when the first lane starts
+    'ttl': 600.0,
+    'negative_ttl': 300.0,
+}
+
+# Second-chance matching of plates that are not registered as read (fuzzy.py), over
+# normalized plates (toll_app/plates.py). A substitution within a group costs
+# `confusion_cost`, any other edit 1; the search covers one edit plus any number of
+# confusions, so `max_distance` above 1 finds no more. Registries hand out plates in
+# sequence, so any single edit lands on some other vehicle: only a confusion matches.
+# A match is ambiguous when another plate is less than `margin` further away. Only a
+# locked consensus plate is charged on a match, other reads are held for review.
+FUZZY_MATCH_SETTINGS = {
+    'enabled': True,
+    'max_distance': 0.5,
+    'confusion_cost': 0.5,
+    'margin': 0.5,
+    'min_length': 5,  # shorter reads are too likely to be fragments
+}
+PLATE_MATCH_CONFUSIONS = ['0ODQ', '8B3', '48', '4A', '1I', '2Z', '5S', '6G', 'बव', 'मभ', 'घध']  # ४ is 4 here
+
+# Toll notifications (notifications.py): written with the toll, delivered by a dispatcher
+# thread in batches over one mail connection. Failed sends are retried after `retry_delay`
+# seconds, doubling up to `max_retry_delay`, until `max_attempts`. A batch still claimed
+# after `claim_timeout` seconds lost its dispatcher and is sent again
+NOTIFICATION_SETTINGS = {
+    'autostart': os.environ.get('NOTIFICATION_DISPATCHER_AUTOSTART') == '1',  # start the dispatcher with the app
+    'backend': os.environ.get('NOTIFICATION_EMAIL_BACKEND'),  # None uses settings.EMAIL_BACKEND
+    'timeout': 10,  # seconds per mail server operation
+    'batch_size': 50,
+    'poll_interval': 5.0,  # seconds between checks for due notifications when idle
+    'max_attempts': 5,
+    'retry_delay': 30.0,
+    'max_retry_delay': 3600.0,
+    'digest_interval': 3600.0,  # seconds a digest account's tolls are collected
+    'claim_timeout': 900.0,  # well above batch_size * timeout
+    'redirect_to': 'r9nbgso1rz@jxpomup.com',  # every notification goes here while set
+}
+
+# Background processing of uploaded videos (video_jobs.py). A running job reports in at
+# every progress update; one that has not for `stale_after` seconds lost its worker and
+# is claimed again
+VIDEO_JOB_SETTINGS = {
+    'autostart': os.environ.get('VIDEO_JOB_AUTOSTART') == '1',  # start the workers with the app
+    'workers': 1,  # worker threads per server process
+    'poll_interval': 5.0,  # seconds between checks for queued jobs when idle
+    'progress_interval': 50,  # frames between progress updates
+    'heartbeat_interval': 30.0,  # longest gap between progress updates of a segmented job
+    'stale_after': 600.0,
+}
+
+# Decoding of uploaded videos (frames.py): every `video_stride`-th frame is decoded and
+# analysed, `idle_steps` strides at a time while nothing moves; skips of at least
+# `seek_stride` frames seek instead of grabbing. The processed video holds the
+# analysed frames, each shown until the next one so it plays in real time.
+FRAME_SOURCE_SETTINGS = {
+    'video_stride': 2,
+    'idle_steps': 5,
+    'seek_stride': 60,
+}
+
+# Segment-parallel processing of uploaded videos (segments.py); fewer than 2 workers
+# processes videos frame by frame in the job worker instead
+VIDEO_SEGMENT_SETTINGS = {
+    'workers': int(os.environ.get('VIDEO_SEGMENT_WORKERS', 0)),
+    'min_segment_seconds': 60,
+    'overlap_seconds': 2.0,  # frames processed by both neighbours, used for stitching
+    'stitch_iou': 0.3,  # mean box IoU on the shared frames that joins two tracks
+}
+
+# Per-camera lane polygon (full-frame pixel coordinates) cut out before detection,
+# optionally rescaled; cameras without an entry are detected on the full frame.
+CAMERA_ROIS = {
+    # LIVE_CAMERA_SOURCE: {'polygon': [(420, 180), (1500, 180), (1800, 1080), (120, 1080)], 'scale': 0.75},
+}
+
+# Plate crops are letterboxed onto a common canvas so one reader call can
+# recognise every plate in a frame (or several frames) at once.
+OCR_BATCH_WIDTH = 400
+OCR_BATCH_HEIGHT = 200
+
+# Plate background colour (helper.get_plate_color) -> script, so only the
+# matching reader runs. Colours not listed here are read with both readers.
+PLATE_COLOR_SCRIPT = {
+    'Red': 'ne',
+    'Black': 'ne',
+    'Green': 'ne',
+    'Blue': 'ne',
+    'White': 'en',
+}
+
+# Plate crop preprocessing before OCR (intermediate.PlatePreprocessor). 'fast' only
+# normalises contrast; 'full' is the binarise-and-clean chain of preprocess_image.
+# Connected components smaller than min_area pixels (after scaling) are removed.
+PREPROCESS_PROFILES = {
+    'none': None,
+    'fast': {
+        'scale': 1,
+        'denoise': None,
+        'clahe': (2.0, (8, 8)),
+        'binarize': False,
+        'open_kernel': None,
+        'dilate_kernel': None,
+        'min_area': 0,
+    },
+    'full': {
+        'scale': 2,
+        'denoise': (5, 17, 8.5),  # bilateral filter diameter, sigma colour, sigma space, before scaling
+        'clahe': (2.0, (8, 8)),
+        'binarize': True,
+        'open_kernel': (3, 3),
+        'dilate_kernel': (2, 2),
+        'min_area': 50,
+    },
+}
+
+# Profile each reader's crops go through. The readers see a grey crop either way but were
+# not trained on binarised ones, so they get the contrast normalisation of 'fast'
+READER_PREPROCESS = {
+    'ne': 'fast',
+    'en': 'fast',
+}
+
+
+# Keyed by TollAppConfig.get_device(); models themselves are loaded lazily by TollAppConfig
+READ_TEXT_CONFIGS = {
+    'cuda': {
         'detail': 1,
         'paragraph': False,
         'low_text': 0.4,
@@ -79,9 +317,8 @@ if HAS_CUDA:
         'decoder': 'beamsearch',
         'beamWidth': 10,
         'workers': 0
-    }
-else:
-    read_text_config = {
+    },
+    'cpu': {
         'detail': 1,
         'paragraph': False,
         'low_text': 0.4,
@@ -89,8 +326,9 @@ else:
         'add_margin': 0.2,
         'decoder': 'greedy',
         'beamWidth': 5,
-        'workers': 0    
-    }
+        'workers': 0
+    },
+}
 
 reader_config = {
     'model_storage_directory': OCR_FOLDER,
@@ -100,17 +338,11 @@ reader_config = {
 }
 
 en_read_text_config = {
-    **read_text_config,
-    'allowlist':ALLOWED_ENG_CHAR
+    device: {**read_text_config, 'allowlist': ALLOWED_ENG_CHAR}
+    for device, read_text_config in READ_TEXT_CONFIGS.items()
 }
 
 ne_read_text_config = {
-    **read_text_config,
-    'allowlist':ALLOWED_NEP_CHAR
+    device: {**read_text_config, 'allowlist': ALLOWED_NEP_CHAR}
+    for device, read_text_config in READ_TEXT_CONFIGS.items()
 }
-
-model = YOLO(OD_FILENAME)
-
-# reader = Reader(['en', 'ne'], **reader_config)
-en_reader = Reader(['en'], **reader_config)
-ne_reader = Reader(['ne'], **reader_config)
@@ -0,0 +1,79 @@
+"""
+Per-track OCR consensus.
+
+Every OCR read of a track votes, weighted by its confidence, first on the plate
+length and then on the character at each position. The consensus text is the
+winning character per position; once enough reads agree on every character the
+track is locked and its plate is not read again for as long as it is tracked.
+"""
+from .config import *
+
+
+class PlateConsensus(object):
+    def __init__(self, min_reads=CONSENSUS_MIN_READS, lock_agreement=CONSENSUS_LOCK_AGREEMENT):
+        self.min_reads = min_reads
+        self.lock_agreement = lock_agreement
+        self.tracks = {}
+        self.locks = 0
+        self.calls_saved = 0
+
+    def vote(self, track_id, text, confidence, cached=False):
+        """
+        Adds one read and returns (consensus text, confidence, locked). A
+        `cached` read replays an earlier one and is not counted.
+        """
+        text = ' '.join(text.split())
+        state = self.tracks.setdefault(track_id, {
+            'reads': 0, 'weight': 0.0, 'lengths': {}, 'chars': {}, 'best': {}, 'text': None, 'locked': False,
+        })
+        if state['locked']:
+            return state['text'], state['best'].get(state['text'], confidence), True
+        if cached:
+            consensus = state['text'] or text
+            return consensus, state['best'].get(consensus, confidence), False
+
+        state['reads'] += 1
+        state['weight'] += confidence
+        state['lengths'][len(text)] = state['lengths'].get(len(text), 0.0) + confidence
+        state['best'][text] = max(confidence, state['best'].get(text, 0.0))
+
+        positions = state['chars'].setdefault(len(text), [{} for _ in text])
+        for votes, char in zip(positions, text):
+            votes[char] = votes.get(char, 0.0) + confidence
+
+        # reads of another length disagree with every character of the winner
+        length = max(state['lengths'], key=state['lengths'].get)
+        winners = [max(votes.items(), key=lambda item: item[1]) for votes in state['chars'][length]]
+        consensus = ''.join(char for char, _ in winners)
+        agreement = min((weight for _, weight in winners), default=0.0) / state['weight']
+
+        state['text'] = consensus
+        if state['reads'] >= self.min_reads and agreement >= self.lock_agreement:
+            state['locked'] = True
+            self.locks += 1
+
+        return consensus, state['best'].get(consensus, agreement), state['locked']
+
+    def is_locked(self, track_id):
+        state = self.tracks.get(track_id)
+        return state is not None and state['locked']
+
+    def wants_read(self, track_id, due):
+        """
+        Filters a scheduled OCR read, counting the ones a locked track no longer needs.
+        """
+        if due and self.is_locked(track_id):
+            self.calls_saved += 1
+            return False
+        return due
+
+    def forget(self, track_id):
+        self.tracks.pop(track_id, None)
+
+    def status(self):
+        return {
+            'tracks': len(self.tracks),
+            'locked': sum(1 for state in self.tracks.values() if state['locked']),
+            'locks': self.locks,
+            'calls_saved': self.calls_saved,
+        }
@@ -2,11 +2,22 @@ import os
 import cv2
 import uuid
 import datetime
+import threading
 import collections
 import numpy as np
-from django.core.mail import send_mail
+from concurrent.futures import Future
 from django.core.files.storage import default_storage
-from .sort import Sort
+from .sort import VectorizedSort
+from .roi import region_of_interest
+from .motion import MotionGate
+from .frames import FrameSource, StrideWriter
+from .consensus import PlateConsensus
+from .ocr_cache import PlateOCRCache
+from .ocr_pool import OCRWorkerPool
+from ..scheduling import FrameScheduler
+from .registry import plate_registry
+from .fuzzy import plate_distance
+from .notifications import notification_outbox
 from PIL import Image
 from decimal import Decimal
 from django.apps import apps
@@ -19,68 +30,157 @@ from .utlis import *
 from .helper import *
 from .config import *
 from .intermediate import *
-from .validator import validate_nepali, validate_english
+from .plate_grammar import rank_plates
 from ..models import Transactions, UserDetails
+from ..plates import normalize_plate
 from ..enums import VehicleType, VehicleRate
 
-# TollAppConfig = apps.get_app_config('toll_app')
-# plate_model = TollAppConfig.get_plate_model()
-# coco_model = TollAppConfig.get_coco_model()
-# easyocr_reader = TollAppConfig.get_easyocr_reader()
-# device = TollAppConfig.get_device()
+TollAppConfig = apps.get_app_config('toll_app')
 
-tracker = Sort(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS)
-track_texts = {}
-
-tracked_plates = {}
-next_plate_id = 0
-
-realtime_recognized_plates = {}
+# Debounce for uploads; every live lane keeps its own
 last_detection_times = {}
 DEBOUNCE_SECONDS = 30
 
-EXIT_LIVE = False
+ocr_cache = PlateOCRCache()
+ocr_pool = None
+ocr_pool_lock = threading.Lock()
 
 
 def detect_vehicle_type(plate_text):
-    user = UserDetails.objects.filter(vehicle_number=plate_text).first()
-    if user:
-        return user.vehicle_type
+    entries = plate_registry.lookup(plate_text)
+    if len(entries) == 1:
+        return entries[0][1]
     return 'unknown'
 
 
-def should_process_plate(plate_text):
-    global last_detection_times
+def should_process_plate(plate_text, detection_times=None, detected_at=None):
+    if detection_times is None:
+        detection_times = last_detection_times
 
-    current_time = timezone.now()
+    # videos pass the frame's time, which need not come in order
+    current_time = detected_at or timezone.now()
 
     clean_plate = plate_text.strip().upper()
 
-    if clean_plate in last_detection_times.keys():
-        last_time = last_detection_times[clean_plate]
-        time_diff = (current_time - last_time).total_seconds()
+    if clean_plate in detection_times.keys():
+        last_time = detection_times[clean_plate]
+        time_diff = abs((current_time - last_time).total_seconds())
         if time_diff < DEBOUNCE_SECONDS:
             return False
 
-    last_detection_times[clean_plate] = current_time
+    detection_times[clean_plate] = current_time
     return True
 
 
-@db_transaction.atomic
-def process_transaction(plate_text, vehicle_type, image_path):
-    if not should_process_plate(plate_text):
-        return None, "Plate processed recently (debounce active)"
+def video_charges(filename):
+    """
+    Returns the transactions already made from a video, oldest first per user,
+    for process_transaction's `charged`.
+    """
+    charged = {}
+    for transaction in Transactions.objects.filter(image_path__startswith=f"video_{filename}_frame_") \
+            .order_by('timestamp'):
+        charged.setdefault(transaction.user_id, []).append(transaction)
+    return charged
 
-    try:
-        user = UserDetails.objects.select_for_update().filter(vehicle_number=plate_text).first()
 
-        # For nepali text if full digits is read, match only digits
-        if not any(c in plate_text[-4:] for c in ALLOWED_ENG_CHAR):
-            user = UserDetails.objects.select_for_update().filter(vehicle_number__contains=plate_text[-4:]).first()
+REVIEW_MESSAGE = "Held for review"
+
+
+def transaction_status(transaction, message):
+    """
+    'success', 'review' when process_transaction held the plate back for an
+    operator, or 'error'.
+    """
+    if transaction:
+        return 'success'
+    return 'review' if message.startswith(REVIEW_MESSAGE) else 'error'
+
+
+def resolve_plate(plate_text):
+    """
+    Returns (entry, how, message): the (user id, ...) the read resolves to
+    through the registry, 'exact', 'suffix' or 'fuzzy', and a message when the
+    read is ambiguous.
+    """
+    entries = plate_registry.lookup(plate_text)
+    if len(entries) > 1:
+        return None, 'exact', f"{REVIEW_MESSAGE}: several vehicles are registered as {plate_text}"
+    if entries:
+        return entries[0], 'exact', None
+
+    # For nepali text if full digits is read, match only digits, and only if they are unique
+    if not any(c in plate_text[-4:] for c in ALLOWED_ENG_CHAR):
+        entries = plate_registry.lookup_suffix(plate_text[-4:])
+        if len(entries) > 1:
+            return None, 'suffix', f"Ambiguous plate: several vehicles end in {plate_text[-4:].strip()}"
+        if entries:
+            return entries[0], 'suffix', None
+
+    # Otherwise the registered plate closest to the read, if no other is as close
+    matches = plate_registry.match(plate_text)
+    if len(matches) > 1:
+        return None, 'fuzzy', f"Ambiguous plate: {plate_text} is close to several vehicles"
+    if matches:
+        print(f"Fuzzy matched {plate_text} at distance {matches[0][1]}")
+        return matches[0], 'fuzzy', None
+    return None, None, None
+
+
+def plate_still_matches(plate_key, plate_text, how):
+    """
+    Whether the locked row's plate still answers the read the way the
+    registry resolved it; the cache can be older than the row.
+    """
+    key = normalize_plate(plate_text)
+    if how == 'exact':
+        return plate_key == key
+    if how == 'suffix':
+        return plate_key.endswith(normalize_plate(plate_text[-4:]))
+    return plate_distance(key, plate_key) <= FUZZY_MATCH_SETTINGS['max_distance']
+
 
+@db_transaction.atomic
+def process_transaction(plate_text, vehicle_type, image_path, detection_times=None, charged=None, locked=False,
+                        detected_at=None):
+    """
+    Charges the vehicle read as `plate_text`. A read that only matches a
+    registered plate fuzzily is charged when it is a `locked` consensus plate
+    and held for review otherwise. `charged` maps user ids to transactions an
+    earlier run over the same video made; those vehicles get their earlier
+    transaction back instead of a second charge. `detected_at` debounces on
+    video time instead of the clock.
+    """
+    try:
+        # at most twice: a cached answer the locked row disagrees with is dropped and resolved again
+        for attempt in range(2):
+            entry, how, message = resolve_plate(plate_text)
+            if message:
+                return None, message
+            if not entry:
+                return None, "Vehicle not registered in system"
+
+            user = UserDetails.objects.select_for_update().filter(pk=entry[0]).first()
+            if user and plate_still_matches(user.plate_key, plate_text, how):
+                break
+            plate_registry.forget(plate_text, entry[0])
+            if user:
+                plate_registry.user_saved(user, committed=True)
+            user = None
         if not user:
             return None, "Vehicle not registered in system"
 
+        if how == 'fuzzy' and not locked:
+            return None, f"{REVIEW_MESSAGE}: {plate_text} may be {user.vehicle_number}"
+
+        # debounced on the vehicle, so exact reads and misreads of it are charged once
+        if not should_process_plate(user.plate_key, detection_times, detected_at):
+            return None, "Plate processed recently (debounce active)"
+
+        if charged and charged.get(user.pk):
+            transaction = charged[user.pk].pop(0)
+            return transaction, f"NRP {transaction.fee} already deducted from {user.first_name}'s account"
+
         vehicle_type = user.vehicle_type
         if vehicle_type == VehicleType.BIKE.value:
             fee = VehicleRate.BIKE.value
@@ -108,17 +208,14 @@ def process_transaction(plate_text, vehicle_type, image_path):
         user.save()
         transaction.save()
 
-        try:
-            send_mail(
-                subject="Toll Payment Notification",
-                message=f"Dear {user.first_name},\n\nA toll fee of NRP {fee} has been deducted from your account for vehicle number {plate_text}.\n\nRemaining Balance: NRP {user.balance}\n\nThank you for using our service.\n\nBest regards,\nToll Management System",
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=['r9nbgso1rz@jxpomup.com'],
-                fail_silently=True
-            )
-            print(f"Email sent to {user.email}")
-        except Exception as email_error:
-            print(f"Failed to send email: {email_error}")
+        # sent by the dispatcher once this transaction commits
+        notification_outbox.enqueue(
+            user,
+            subject="Toll Payment Notification",
+            message=f"Dear {user.first_name},\n\nA toll fee of NRP {fee} has been deducted from your account for vehicle number {plate_text}.\n\nRemaining Balance: NRP {user.balance}\n\nThank you for using our service.\n\nBest regards,\nToll Management System",
+            summary=f"NRP {fee} for vehicle number {plate_text} on {transaction.timestamp:%Y-%m-%d %H:%M}",
+            transaction=transaction,
+        )
 
         return transaction, f"NRP {fee} deducted from {user.first_name}'s account"
 
@@ -126,85 +223,111 @@ def process_transaction(plate_text, vehicle_type, image_path):
         return None, f"Error processing transaction: {str(e)}"
 
 
-def process_video_sort(video_file):
+def process_video_sort(video_file, progress=None):
     """
     Process uploaded video file for license plate detection and recognition
     with transaction handling and debounce mechanism.
     """
     # Save uploaded video file
     filename = default_storage.save(f"videos/{video_file.name}", video_file)
+    return process_video_file(filename, progress)
+
+
+def process_video_file(filename, progress=None, charged=None):
+    """
+    Process a video already in storage. `progress`, if given, is called every
+    VIDEO_JOB_SETTINGS['progress_interval'] frames with the counts so far;
+    returning False stops processing and marks the results as cancelled.
+    `charged` is passed on to process_transaction.
+    """
     filepath = default_storage.path(filename)
 
-    cap = cv2.VideoCapture(filepath)
-    if not cap.isOpened():
+    source = FrameSource(filepath)
+    if not source.isOpened():
         raise ValueError("Could not open video file")
 
     # Get video properties
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    frame_width = int(source.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(source.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = int(source.get(cv2.CAP_PROP_FPS))
+    total_frames = source.frame_count
+    stride = FRAME_SOURCE_SETTINGS['video_stride']
 
     # Create output video file
     processed_filename = f"processed_{os.path.basename(filename)}"
     processed_path = os.path.join(settings.MEDIA_ROOT, 'processed_videos', processed_filename)
     os.makedirs(os.path.dirname(processed_path), exist_ok=True)
 
-    # Use appropriate codec based on platform
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(processed_path, fourcc, fps, (frame_width, frame_height))
+    # one frame per stride, skipped stretches hold their last frame
+    out = StrideWriter(processed_path, fps, stride, (frame_width, frame_height))
 
     # Initialize tracker and tracking variables
-    tracker = Sort(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS)
+    tracker = VectorizedSort(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS)
+    scheduler = FrameScheduler(target_fps=fps or SCHEDULER_TARGET_FPS, realtime=False)
+    motion_gate = MotionGate('video')
+    roi = region_of_interest('video')
+    consensus = PlateConsensus()
+    tracks = []
     track_texts = {}
-    frame_count = 0
     processed_transactions = []
+    cancelled = False
+    next_report = 100
+    next_progress = VIDEO_JOB_SETTINGS['progress_interval']
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
+    while True:
+        frame_count, frame = source.read()
+        if frame is None:
             break
 
-        # Process every 4th frame for better performance
-        if frame_count % 4 == 0:
-            # Detect license plates using YOLO model
-            od_results = plate_model(frame)
-            detections = []
-
-            for result in od_results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        if box.conf >= OD_THRESHOLD:
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            conf = float(box.conf)
-                            detections.append([x1, y1, x2, y2, conf])
-
-            # Update tracker with detections
-            dets = np.array(detections) if detections else np.empty((0, 5))
-            tracks = tracker.update(dets)
+        # Skip static stretches, then let the scheduler decide which frames are worth the detector
+        region = roi.crop(frame)
+        moving = motion_gate.check(region, active=len(tracks) > 0)
+        if not moving:
+            tracks = []
+            # aged while nothing moves, so a vehicle gone during the gap does not lend its id
+            if len(tracker):
+                tracker.update(np.empty((0, 5)))
+        elif scheduler.should_detect(frame_count, motion_gate.just_opened):
+            # Detect license plates using YOLO model and update tracker with detections
+            with scheduler.timed('detect'):
+                tracks = tracker.update(roi.to_frame(detect_plates(region), frame.shape))
+            scheduler.update_tracks(int(track[4]) for track in tracks)
+
+            # Read plates until their consensus locks, at the scheduler's cadence
+            ocr_tracks = [
+                track for track in tracks
+                if consensus.wants_read(int(track[4]), scheduler.ocr_due(
+                    int(track[4]), frame_count, recognized=int(track[4]) in track_texts))
+            ]
+            with scheduler.timed('ocr', len(ocr_tracks)):
+                ocr_results = process_plates([
+                    frame[int(y1):int(y2), int(x1):int(x2)] for x1, y1, x2, y2, _ in ocr_tracks
+                ], [(filename, int(track[4])) for track in ocr_tracks])
+            plate_texts = {int(track[4]): result for track, result in zip(ocr_tracks, ocr_results)}
 
             # Process each tracked plate
             for track in tracks:
                 x1, y1, x2, y2, track_id = map(int, track)
-                plate_img = frame[y1:y2, x1:x2]
-
-                # Process plate if new or if confidence is low and it's time to recheck
-                should_process = (
-                        track_id not in track_texts or
-                        (track_texts[track_id]['confidence'] < VIDEO_OCR_THRESHOLD and
-                         frame_count % 10 == 0)
-                )
 
-                if should_process:
-                    text, text_conf = process_plate(plate_img)
-
-                    if text and text_conf > (track_texts.get(track_id, {}).get('confidence', 0) or 0):
+                if track_id in plate_texts:
+                    text, text_conf, cached = plate_texts[track_id]
+                    new_text = locking = False
+                    if text and text_conf >= VIDEO_OCR_THRESHOLD:
+                        text, text_conf, locked = consensus.vote(track_id, text, text_conf, cached)
+                        new_text = track_texts.get(track_id, {}).get('text') != text
+                        if not new_text:
+                            track_texts[track_id]['confidence'] = text_conf
+                            # a plate held for review goes to the toll again once its consensus locks
+                            locking = locked and track_texts[track_id]['transaction_status'] == 'review'
+
+                    # Only a new consensus text goes to the toll, repeated reads just update the score
+                    if new_text or locking:
                         # Determine vehicle type
                         vehicle_type = detect_vehicle_type(text)
 
                         # Process transaction with debounce
                         transaction, message = process_transaction(
-                            text, vehicle_type, f"video_{filename}_frame_{frame_count}"
+                            text, vehicle_type, f"video_{filename}_frame_{frame_count}", charged=charged, locked=locked
                         )
 
                         track_texts[track_id] = {
@@ -212,7 +335,7 @@ def process_video_sort(video_file):
                             'confidence': text_conf,
                             'vehicle_type': vehicle_type,
                             'last_updated': frame_count,
-                            'transaction_status': 'success' if transaction else 'error',
+                            'transaction_status': transaction_status(transaction, message),
                             'transaction_message': message
                         }
 
@@ -249,16 +372,32 @@ def process_video_sort(video_file):
                                 (x1, y2 + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
 
         # Write processed frame to output video
-        out.write(frame)
-        frame_count += 1
+        out.write(frame_count, frame)
 
         # Print progress every 100 frames
-        if frame_count % 100 == 0:
-            print(f"Processed {frame_count} frames...")
+        if source.position >= next_report:
+            print(f"Processed {source.position} frames...")
+            next_report = (source.position // 100 + 1) * 100
+
+        if progress and source.position >= next_progress:
+            next_progress = source.position + VIDEO_JOB_SETTINGS['progress_interval']
+            if progress({
+                'frames_done': source.position,
+                'frames_total': total_frames,
+                'plates_found': len(track_texts),
+                'transactions_made': len(processed_transactions),
+            }) is False:
+                cancelled = True
+                break
+
+        # Only every stride-th frame is decoded, a static lane is skipped further ahead
+        steps = 1 if moving else FRAME_SOURCE_SETTINGS['idle_steps']
+        if not source.skip_to((frame_count // stride + steps) * stride):
+            break
 
     # Release resources
-    cap.release()
-    out.release()
+    source.release()
+    out.release(None if cancelled else total_frames)
 
     # Prepare final results
     recognized_plates = []
@@ -279,7 +418,13 @@ def process_video_sort(video_file):
     video_results = {
         'original_video': filename,
         'processed_video': processed_filename,
-        'total_frames': frame_count,
+        'total_frames': source.position,
+        'cancelled': cancelled,
+        **source.status(),
+        'frames_skipped_static': motion_gate.frames_skipped,
+        'ocr_calls_saved': consensus.calls_saved,
+        'ocr_cache': ocr_cache.status(),
+        'ocr_pool': get_ocr_pool_status(),
         'plates_detected': len(recognized_plates),
         'transactions_processed': len(processed_transactions),
         'successful_transactions': len(successful_transactions),
@@ -298,44 +443,45 @@ def process_image(image_file):
     img = Image.open(filepath)
     img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
 
-    od_results = model(img_cv)
+    od_results = TollAppConfig.get_plate_model()(img_cv)
     recognized_plates = []
     transaction_results = []
 
+    plate_boxes = []
     for result in od_results:
         boxes = result.boxes
         if boxes is not None:
             for box in boxes:
                 if box.conf >= OD_THRESHOLD:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    plate_img = img_cv[y1:y2, x1:x2]
+                    plate_boxes.append((tuple(map(int, box.xyxy[0])), float(box.conf)))
 
-                    text, text_conf = process_plate(plate_img)
+    ocr_results = process_plates([img_cv[y1:y2, x1:x2] for (x1, y1, x2, y2), _ in plate_boxes])
 
-                    if text:
-                        vehicle_type = detect_vehicle_type(text)
+    for ((x1, y1, x2, y2), plate_conf), (text, text_conf, _) in zip(plate_boxes, ocr_results):
+        if text:
+            vehicle_type = detect_vehicle_type(text)
 
-                        transaction, message = process_transaction(
-                            text, vehicle_type, filename
-                        )
-
-                        plate_info = {
-                            'text': text,
-                            'confidence': float(text_conf),
-                            'bbox': (x1, y1, x2, y2),
-                            'plate_conf': float(box.conf),
-                            'vehicle_type': vehicle_type,
-                            'transaction_status': 'success' if transaction else 'error',
-                            'transaction_message': message
-                        }
+            transaction, message = process_transaction(
+                text, vehicle_type, filename
+            )
 
-                        recognized_plates.append(plate_info)
-                        transaction_results.append({
-                            'plate': text,
-                            'status': 'success' if transaction else 'error',
-                            'message': message,
-                            'transaction_id': str(transaction.id) if transaction else None
-                        })
+            plate_info = {
+                'text': text,
+                'confidence': float(text_conf),
+                'bbox': (x1, y1, x2, y2),
+                'plate_conf': plate_conf,
+                'vehicle_type': vehicle_type,
+                'transaction_status': transaction_status(transaction, message),
+                'transaction_message': message
+            }
+
+            recognized_plates.append(plate_info)
+            transaction_results.append({
+                'plate': text,
+                'status': plate_info['transaction_status'],
+                'message': message,
+                'transaction_id': str(transaction.id) if transaction else None
+            })
 
     processed_img = img_cv.copy()
     for plate in recognized_plates:
@@ -356,126 +502,174 @@ def process_image(image_file):
     return recognized_plates, processed_filename, transaction_results
 
 
-def generate_frames_sort():
-    global realtime_recognized_plates, EXIT_LIVE
+def generate_frames_sort(lane_id=DEFAULT_LANE):
+    from .lanes import lane_manager
+    yield from lane_manager.stream(lane_id)
 
-    EXIT_LIVE = False
 
-    cap = cv2.VideoCapture(1)
-    if not cap.isOpened():
-        yield None
-        return
+def detect_plates(frame):
+    return detect_plates_batch([frame])[0]
 
-    tracker = Sort(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS)
-    track_texts = {}
-    frame_count = 0
 
-    while not EXIT_LIVE:
-        success, frame = cap.read()
-        if not success:
-            break
+def detect_plates_batch(frames):
+    """
+    One detector call for several frames, e.g. one per lane. Returns an
+    [[x1, y1, x2, y2, score], ...] array per frame.
+    """
+    od_results = TollAppConfig.get_plate_model()(list(frames))
+    batch_detections = []
+
+    for result in od_results:
+        detections = []
+        boxes = result.boxes
+        if boxes is not None:
+            for box in boxes:
+                if box.conf >= OD_THRESHOLD:
+                    x1, y1, x2, y2 = map(int, box.xyxy[0])
+                    conf = float(box.conf)
+                    detections.append([x1, y1, x2, y2, conf])
+        batch_detections.append(np.array(detections) if detections else np.empty((0, 5)))
 
-        if frame_count % 1 == 0:
-            od_results = model(frame)
-            detections = []
+    return batch_detections
 
-            for result in od_results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        if box.conf >= OD_THRESHOLD:
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            conf = float(box.conf)
-                            detections.append([x1, y1, x2, y2, conf])
 
-            dets = np.array(detections) if detections else np.empty((0, 5))
-            tracks = tracker.update(dets)
+def process_plate(plate_img):
+    text, confidence, _ = process_plates([plate_img])[0]
+    return text, confidence
 
-            for track in tracks:
-                x1, y1, x2, y2, track_id = map(int, track)
-                plate_img = frame[y1:y2, x1:x2]
 
-                if track_id not in track_texts or frame_count % 10 == 0:
-                    text, confidence = process_plate(plate_img)
-                    if confidence < OD_THRESHOLD or (
-                            track_id in track_texts and confidence <= track_texts[track_id]['confidence']):
-                        continue
-                    if text:
-                        vehicle_type = detect_vehicle_type(text)
+def process_plates(plate_imgs, scopes=None):
+    """
+    Recognise several plate crops, from one frame or many, with a single call
+    per reader. Returns a list of (text, confidence, cached) in the order of
+    plate_imgs. `scopes` gives each crop's track, e.g. (lane, track id); a crop
+    that looks like a recent one of its track reuses that read from ocr_cache,
+    with cached set. Crops without a scope are always read.
+    """
+    return process_plates_async(plate_imgs, scopes).result()
 
-                        transaction, message = process_transaction(
-                            text, vehicle_type, f"live_frame_{frame_count}"
-                        )
 
-                        track_texts[track_id] = {
-                            'text': text,
-                            'confidence': confidence,
-                            'last_updated': frame_count,
-                            'vehicle_type': vehicle_type,
-                            'transaction_status': 'success' if transaction else 'error',
-                            'transaction_message': message
-                        }
+def process_plates_async(plate_imgs, scopes=None):
+    """
+    Same as process_plates, but returns a Future. With OCR workers configured
+    the crops are read in the pool and the caller is not blocked.
+    """
+    plate_imgs = [np.array(plate_img) for plate_img in plate_imgs]
+    scopes = scopes or [None] * len(plate_imgs)
+    results = [(None, 0, False)] * len(plate_imgs)
+
+    valid = [i for i, plate_img in enumerate(plate_imgs) if plate_img.size > 0]
+    keys = {i: ocr_cache.key(plate_imgs[i]) for i in valid if scopes[i] is not None}
+    for i in keys:
+        cached = ocr_cache.get(scopes[i], keys[i])
+        if cached is not None:
+            results[i] = (*cached, True)
+    misses = [i for i in valid if results[i][0] is None]
+
+    future = Future()
+
+    def finish(read):
+        if read.exception() is not None:
+            future.set_exception(read.exception())
+            return
+        for i, result in zip(misses, read.result()):
+            results[i] = (*result, False)
+            # failed reads are not cached, the next crop gets a fresh attempt
+            if result[0] and i in keys:
+                ocr_cache.put(scopes[i], keys[i], result)
+        future.set_result(results)
+
+    pool = get_ocr_pool()
+    if misses and pool is not None:
+        pool.submit([plate_imgs[i] for i in misses]).add_done_callback(finish)
+    else:
+        read = Future()
+        try:
+            read.set_result(recognise_plates([plate_imgs[i] for i in misses]))
+        except Exception as e:
+            read.set_exception(e)
+        finish(read)
 
-                if track_id in track_texts:
-                    info = track_texts[track_id]
-                    color = (0, 255, 0) if info['transaction_status'] == 'success' else (0, 0, 255)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    label = f"ID:{track_id} {info['text']}"
-                    cv2.putText(frame, label, (x1, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+    return future
 
-            current_frame = frame_count
-            tracks_to_remove = [tid for tid, info in track_texts.items()
-                                if current_frame - info['last_updated'] > 30]
-            for tid in tracks_to_remove:
-                del track_texts[tid]
 
-            realtime_recognized_plates.clear()
-            for tid, info in track_texts.items():
-                realtime_recognized_plates[tid] = info
+def get_ocr_pool():
+    global ocr_pool
+    if OCR_POOL_SETTINGS['workers'] <= 0:
+        return None
 
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if ret:
-            frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    with ocr_pool_lock:
+        if ocr_pool is None:
+            ocr_pool = OCRWorkerPool()
+            ocr_pool.start()
+    return ocr_pool
 
-        frame_count += 1
 
-    cap.release()
+def get_ocr_pool_status():
+    return ocr_pool.status() if ocr_pool is not None else {'size': 0}
 
 
-def process_plate(plate_img):
-    plate_img = np.array(plate_img)
+def recognise_plates(plate_imgs):
+    """
+    Runs the readers on non-empty crops, picking the reader by plate colour
+    and falling back to the other one on weak reads. Used in-process and by
+    the OCR pool workers.
+    """
+    results = [(None, 0)] * len(plate_imgs)
+    valid = range(len(plate_imgs))
+    scripts = {i: classify_plate_script(plate_imgs[i]) for i in valid}
 
-    if plate_img is None or plate_img.size == 0:
-        return None, 0
+    nep_results = read_plates('ne', plate_imgs, [i for i in valid if scripts[i] != 'en'])
+    eng_results = read_plates('en', plate_imgs, [i for i in valid if scripts[i] != 'ne'])
 
-    # processed_plate_img = preprocess_image(plate_img)
-    processed_plate_img = plate_img.copy()
+    for i in valid:
+        results[i] = select_plate_text(nep_results.get(i, []), eng_results.get(i, []))
 
-    nep_results = ne_reader.readtext(plate_img, **ne_read_text_config)
-    eng_results = en_reader.readtext(processed_plate_img, **en_read_text_config)
+    # The plate colour picked one reader; if its read is weak, try the other one too
+    fallback = [i for i in valid if scripts[i] and (not results[i][0] or results[i][1] < OCR_THRESHOLD)]
+    nep_results.update(read_plates('ne', plate_imgs, [i for i in fallback if scripts[i] == 'en']))
+    eng_results.update(read_plates('en', plate_imgs, [i for i in fallback if scripts[i] == 'ne']))
 
-    validated_nep_results = validate_nepali(nep_results)
-    validated_eng_results = validate_english(eng_results)
+    for i in fallback:
+        results[i] = select_plate_text(nep_results[i], eng_results[i])
 
-    eng_conf = max([res[2] for res in eng_results], default=0)
-    nep_conf = max([res[2] for res in nep_results], default=0)
+    return results
 
-    if eng_conf >= nep_conf and validated_eng_results:
-        text, confidence = validated_eng_results, eng_conf
-    else:
-        text, confidence = validated_nep_results, nep_conf
 
-    return text, confidence
+def read_plates(lang, plate_imgs, indices):
+    if not indices:
+        return {}
+
+    reader = TollAppConfig.get_ml_model(f'{lang}_reader')
+    read_text_configs = ne_read_text_config if lang == 'ne' else en_read_text_config
+    read_text_config = read_text_configs[TollAppConfig.get_device()]
+    preprocess = get_preprocessor(READER_PREPROCESS.get(lang, 'none'))
+
+    if len(indices) == 1:
+        return {indices[0]: reader.readtext(preprocess(plate_imgs[indices[0]]), **read_text_config)}
+
+    batch = letterbox_plates([preprocess(plate_imgs[i]) for i in indices])
+    return dict(zip(indices, reader.readtext_batched(batch, **read_text_config)))
+
+
+def select_plate_text(nep_results, eng_results):
+    """
+    Best plate over both readings and every layout; (None, 0) when neither
+    reading fits a layout.
+    """
+    # on equal scores the English reading wins, as it always has
+    ranked = rank_plates([('en', eng_results), ('ne', nep_results)], k=1)
+    if not ranked:
+        return None, 0
+    text, score, _ = ranked[0]
+    return text, score
 
 
 def process_frame(frame):
     if isinstance(frame, Image.Image):
         frame = cv2.cvtColor(np.array(frame), cv2.COLOR_RGB2BGR)
 
-    od_results = plate_model(frame)
+    od_results = TollAppConfig.get_plate_model()(frame)
     recognized_plates = []
 
     for result in od_results:
@@ -493,23 +687,9 @@ def process_frame(frame):
                     'plate_color': get_plate_color(plate_img),
                     'text': text,
                     'text_confidence': text_conf,
-                    'language': 'ne' if any(char in ALLOWED_NEP_CHAR for char in text) else 'en'
+                    'language': 'ne' if text and any(char in ALLOWED_NEP_CHAR for char in text) else 'en'
                 }
 
                 recognized_plates.append(plate)
 
     return frame, recognized_plates
-
-
-def get_realtime_plates():
-    return realtime_recognized_plates.copy()
-
-
-def clear_realtime_plates():
-    global realtime_recognized_plates
-    realtime_recognized_plates.clear()
-
-
-def stop_live_detection():
-    global EXIT_LIVE
-    EXIT_LIVE = True
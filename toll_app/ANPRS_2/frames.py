@@ -0,0 +1,124 @@
+"""
+Frame source that only decodes the frames that are used.
+
+cv2.VideoCapture.read() demuxes, decodes and colour-converts every frame.
+Frames that will be neither analysed nor shown are only grab()bed, and on a
+seekable file a long skip seeks (to the nearest keyframe, decoding forward
+from there) instead of grabbing its way through.
+"""
+import cv2
+
+from .config import *
+
+
+class StrideWriter(object):
+    """
+    Writes the analysed frames of a video at fps / stride. A stretch skipped
+    several strides at a time holds its last frame for the strides in
+    between, so the written video keeps the source's timing.
+    """
+    def __init__(self, path, fps, stride, size):
+        self.out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps / stride, size)
+        self.stride = stride
+        self.last = None
+        self.next_slot = 0
+        self.held = 0
+
+    def fill(self, slot):
+        while self.last is not None and self.next_slot < slot:
+            self.out.write(self.last)
+            self.next_slot += 1
+            self.held += 1
+
+    def write(self, index, frame):
+        """
+        Writes the frame read at source index `index`.
+        """
+        slot = index // self.stride
+        self.fill(slot)
+        self.out.write(frame)
+        self.last = frame
+        self.next_slot = slot + 1
+
+    def release(self, end=None):
+        """
+        Holds the last frame up to source index `end`, if given, and closes the file.
+        """
+        if end is not None:
+            self.fill(-(-end // self.stride))
+        self.out.release()
+
+
+class FrameSource(object):
+    def __init__(self, source, seek_stride=FRAME_SOURCE_SETTINGS['seek_stride']):
+        self.cap = cv2.VideoCapture(source)
+        self.seek_stride = seek_stride
+        self.position = 0  # index of the next frame
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # cameras and streams report no frame count and cannot seek
+        self.seekable = self.frame_count > 0
+        self.decoded = 0
+        self.grabbed = 0
+        self.seeks = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def grab(self):
+        """
+        Advances one frame without decoding it.
+        """
+        if not self.cap.grab():
+            return False
+        self.position += 1
+        self.grabbed += 1
+        return True
+
+    def read(self):
+        """
+        Decodes the next frame. Returns (index, frame), frame is None at the end.
+        """
+        index = self.position
+        if not self.cap.grab():
+            return index, None
+        self.position += 1
+
+        ret, frame = self.cap.retrieve()
+        if not ret:
+            return index, None
+        self.decoded += 1
+        return index, frame
+
+    def seek(self, index):
+        if not self.cap.set(cv2.CAP_PROP_POS_FRAMES, index):
+            return False
+        self.position = index
+        self.seeks += 1
+        return True
+
+    def skip_to(self, index):
+        """
+        Moves to frame `index` so the next read() returns it, decoding nothing
+        in between. Returns False when the source ends first.
+        """
+        count = index - self.position
+        if self.seekable and count >= self.seek_stride:
+            return index < self.frame_count and self.seek(index)
+
+        for _ in range(count):
+            if not self.grab():
+                return False
+        return True
+
+    def release(self):
+        self.cap.release()
+
+    def status(self):
+        return {
+            'frames_decoded': self.decoded,
+            'frames_grabbed': self.grabbed,
+            'seeks': self.seeks,
+        }
@@ -0,0 +1,144 @@
+"""
+Fuzzy plate matching.
+
+A plate misread by one character is not registered as read. PlateMatcher
+indexes the normalized registered plates for a symmetric-delete search: each
+plate is filed under its skeleton, the plate with every character of a
+confusion group (PLATE_MATCH_CONFUSIONS) replaced by the group's first, and
+under every skeleton with one character deleted. A read plate then collects,
+in len + 1 dict lookups, every registered plate within one edit plus any
+number of confusions of it, and only those few are scored by plate_distance.
+"""
+from .config import *
+
+
+def confusion_groups(confusions=PLATE_MATCH_CONFUSIONS):
+    """
+    Merges overlapping groups; returns char -> representative.
+    """
+    representative = {}
+    for group in confusions:
+        merged = {char for char in group}
+        for char in group:
+            root = representative.get(char)
+            if root is not None:
+                merged.update(other for other, other_root in representative.items() if other_root == root)
+        root = min(merged)
+        for char in merged:
+            representative[char] = root
+    return representative
+
+
+CONFUSION_ROOTS = confusion_groups()
+CONFUSABLE = {(a, b) for group in PLATE_MATCH_CONFUSIONS for a in group for b in group if a != b}
+
+
+def plate_distance(a, b, max_distance=FUZZY_MATCH_SETTINGS['max_distance'],
+                   confusion_cost=FUZZY_MATCH_SETTINGS['confusion_cost']):
+    """
+    Edit distance between normalized plates where substituting a listed
+    confusion costs `confusion_cost`. Anything above max_distance is inf.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return float('inf')
+
+    # a misread shares most of the plate, only the differing middle is scored
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [float(i)]
+        for j, char_b in enumerate(b, 1):
+            if char_a == char_b:
+                substitution = previous[j - 1]
+            elif (char_a, char_b) in CONFUSABLE:
+                substitution = previous[j - 1] + confusion_cost
+            else:
+                substitution = previous[j - 1] + 1.0
+            current.append(min(substitution, previous[j] + 1.0, current[j - 1] + 1.0))
+        if min(current) > max_distance:
+            return float('inf')
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else float('inf')
+
+
+def skeleton(key):
+    return ''.join(CONFUSION_ROOTS.get(char, char) for char in key)
+
+
+def variants(key):
+    """
+    The skeleton of a key and the skeleton with each character deleted.
+    """
+    shape = skeleton(key)
+    return {shape} | {shape[:i] + shape[i + 1:] for i in range(len(shape))}
+
+
+class PlateMatcher(object):
+    def __init__(self, max_distance=FUZZY_MATCH_SETTINGS['max_distance'],
+                 confusion_cost=FUZZY_MATCH_SETTINGS['confusion_cost'], margin=FUZZY_MATCH_SETTINGS['margin']):
+        self.max_distance = max_distance
+        self.confusion_cost = confusion_cost
+        self.margin = margin
+        # variant -> registered keys, key -> user id, user id -> key
+        self.index = {}
+        self.users = {}
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.users)
+
+    def add(self, key, user_id):
+        if self.keys.get(user_id) == key:
+            return
+        self.remove(user_id)
+        if not key:
+            return
+        self.users[key] = user_id
+        self.keys[user_id] = key
+        for variant in variants(key):
+            self.index.setdefault(variant, set()).add(key)
+
+    def remove(self, user_id):
+        key = self.keys.pop(user_id, None)
+        if key is None or self.users.get(key) != user_id:
+            return
+        del self.users[key]
+        for variant in variants(key):
+            keys = self.index.get(variant)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.index[variant]
+
+    def search(self, key):
+        """
+        Returns [(distance, key, user id)] of registered plates within
+        max_distance, closest first.
+        """
+        candidates = set()
+        for variant in variants(key):
+            candidates.update(self.index.get(variant, ()))
+
+        matches = []
+        for candidate in candidates:
+            distance = plate_distance(key, candidate, self.max_distance, self.confusion_cost)
+            if distance <= self.max_distance:
+                matches.append((distance, candidate, self.users[candidate]))
+        return sorted(matches)
+
+    def match(self, key):
+        """
+        Returns the closest match, or two when the second is less than
+        `margin` further away and the read cannot tell them apart.
+        """
+        matches = self.search(key)
+        if len(matches) > 1 and matches[1][0] - matches[0][0] < self.margin:
+            return matches[:2]
+        return matches[:1]
@@ -30,6 +30,10 @@ def get_plate_color(plate):
     else:
         return "Unknown"
 
+def classify_plate_script(plate):
+    # 'ne' for Devanagari, 'en' for Latin, None when both readers should run
+    return PLATE_COLOR_SCRIPT.get(get_plate_color(plate))
+
 def get_plate_lot_number(text):
     lot_number = ""
     for t in text:
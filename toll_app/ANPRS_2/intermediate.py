@@ -1,5 +1,6 @@
 from .config import *
 import cv2
+import threading
 import numpy as np
 
 
@@ -30,5 +31,132 @@ def preprocess_image(image):
     return cv2.bitwise_and(dilated, mask)
 
 
+class PlatePreprocessor(object):
+    """
+    preprocess_image as a reusable object: CLAHE and kernels are built once,
+    intermediate images are written into buffers kept for the last crop size,
+    the crop is denoised before it is upscaled, and small specks are removed
+    by connected-component area instead of a findContours/drawContours loop.
+    Not thread-safe, see get_preprocessor.
+    """
+
+    def __init__(self, profile='full'):
+        self.profile = profile
+        self.settings = PREPROCESS_PROFILES[profile]
+        self.buffers = {}
+        self.crops = 0
+
+        settings = self.settings or {}
+        self.clahe = None
+        if settings.get('clahe'):
+            clip_limit, tile_grid_size = settings['clahe']
+            self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+        self.open_kernel = None
+        if settings.get('open_kernel'):
+            self.open_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, settings['open_kernel'])
+        self.dilate_kernel = None
+        if settings.get('dilate_kernel'):
+            self.dilate_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, settings['dilate_kernel'])
+
+    def buffer(self, name, shape, dtype=np.uint8):
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self.buffers[name] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def __call__(self, image):
+        """
+        Returns the processed crop in a new array; only the intermediates are
+        reused, so results of several calls can be batched together.
+        """
+        if self.settings is None:
+            return image
+        if not isinstance(image, np.ndarray):
+            image = np.array(image)
+        self.crops += 1
+        settings = self.settings
+
+        # grey and denoised at crop size, where the bilateral filter costs a quarter of
+        # what it does after a 2x upscale, with its window scaled down to match
+        height, width = image.shape[:2]
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self.buffer('gray', (height, width)))
+        if settings['denoise']:
+            diameter, sigma_color, sigma_space = settings['denoise']
+            image = cv2.bilateralFilter(image, diameter, sigma_color, sigma_space,
+                                        dst=self.buffer('filtered', (height, width)))
+
+        scale = settings['scale']
+        if scale != 1:
+            height, width = height * scale, width * scale
+            image = cv2.resize(image, (width, height), dst=self.buffer('resized', (height, width)))
+        if self.clahe is not None:
+            image = self.clahe.apply(image, dst=self.buffer('enhanced', (height, width)))
+        if not settings['binarize']:
+            return image.copy()
+
+        _, image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU,
+                                 dst=self.buffer('thresh', (height, width)))
+        if self.open_kernel is not None:
+            image = cv2.morphologyEx(image, cv2.MORPH_OPEN, self.open_kernel, dst=self.buffer('cleaned', (height, width)))
+        if self.dilate_kernel is not None:
+            image = cv2.dilate(image, self.dilate_kernel, iterations=1, dst=self.buffer('dilated', (height, width)))
+        if not settings['min_area']:
+            return image.copy()
+
+        # 8-connected components are at least 2x2 pixels apart, so 16-bit labels do for plate crops
+        label_type, label_dtype = (cv2.CV_16U, np.uint16) if height * width < 4 * 65535 else (cv2.CV_32S, np.int32)
+        count, labels, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            image, 8, label_type, cv2.CCL_DEFAULT, labels=self.buffer('labels', (height, width), label_dtype)
+        )
+        keep = stats[:, cv2.CC_STAT_AREA] >= settings['min_area']
+        keep[0] = False  # background
+        if keep[1:].all():
+            return image.copy()
+
+        lookup = np.where(keep, 255, 0).astype(np.uint8)
+        mask = np.take(lookup, labels, out=self.buffer('mask', (height, width)), mode='clip')
+        return cv2.bitwise_and(image, mask)
+
+    def status(self):
+        return {
+            'profile': self.profile,
+            'crops': self.crops,
+            'buffers': {name: buffer.shape for name, buffer in self.buffers.items()},
+        }
+
+
+# a preprocessor reuses its buffers, so every thread keeps its own per profile
+preprocessors = threading.local()
+
+
+def get_preprocessor(profile):
+    cache = preprocessors.__dict__.setdefault('by_profile', {})
+    if profile not in cache:
+        cache[profile] = PlatePreprocessor(profile)
+    return cache[profile]
+
+
+def letterbox_plates(images, width=OCR_BATCH_WIDTH, height=OCR_BATCH_HEIGHT):
+    batch = np.zeros((len(images), height, width, 3), dtype=np.uint8)
+
+    for i, image in enumerate(images):
+        if not isinstance(image, np.ndarray):
+            image = np.array(image)
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+        h, w = image.shape[:2]
+        scale = min(width / w, height / h)
+        new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+        resized = cv2.resize(image, (new_w, new_h))
+
+        top = (height - new_h) // 2
+        left = (width - new_w) // 2
+        batch[i, top:top + new_h, left:left + new_w] = resized
+
+    return list(batch)
+
+
 def preprocess_video(video):
     pass
\ No newline at end of file
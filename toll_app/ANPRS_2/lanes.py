@@ -0,0 +1,94 @@
+"""
+Live lanes served by this process.
+
+The LaneManager owns one LivePipeline per running lane (LIVE_LANES maps lane
+ids to camera sources), so one server can run every lane of a plaza and any
+number of viewers can watch each of them.
+"""
+import threading
+
+from .config import *
+from .pipeline import LivePipeline
+from .registry import plate_registry
+
+
+class LaneManager(object):
+    def __init__(self, lanes=None):
+        self.lanes = dict(LIVE_LANES if lanes is None else lanes)
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def source(self, lane_id):
+        lane_id = str(lane_id)
+        if lane_id not in self.lanes:
+            raise ValueError(f"Unknown lane: {lane_id}")
+        return self.lanes[lane_id]
+
+    def session(self, lane_id):
+        return self.sessions.get(str(lane_id))
+
+    def start(self, lane_id):
+        """
+        Starts the lane unless it is already running and returns its session.
+        """
+        lane_id = str(lane_id)
+        source = self.source(lane_id)
+        plate_registry.warm()
+
+        with self.lock:
+            session = self.sessions.get(lane_id)
+            if session is None or not session.running:
+                session = LivePipeline(source, lane_id)
+                session.start()
+                self.sessions[lane_id] = session
+        return session
+
+    def stop(self, lane_id=None):
+        """
+        Stops one lane, or every lane when lane_id is None.
+        """
+        with self.lock:
+            if lane_id is None:
+                sessions, self.sessions = list(self.sessions.values()), {}
+            else:
+                self.source(lane_id)
+                session = self.sessions.pop(str(lane_id), None)
+                sessions = [session] if session else []
+
+        for session in sessions:
+            session.stop()
+
+    def stream(self, lane_id):
+        """
+        Returns a generator of multipart JPEG chunks of the lane, starting it if
+        needed, or a single None when its camera cannot be opened. An unknown
+        lane raises ValueError here, before any response has been sent.
+        """
+        self.source(lane_id)
+        return self.frames(lane_id)
+
+    def frames(self, lane_id):
+        session = self.start(lane_id)
+        if not session.wait_opened():
+            self.stop(lane_id)
+            yield None
+            return
+
+        yield from session.frames()
+
+    def plates(self, lane_id):
+        session = self.session(lane_id)
+        return session.plates() if session else {}
+
+    def status(self, lane_id=None):
+        if lane_id is None:
+            return {lane: self.status(lane) for lane in self.lanes}
+
+        self.source(lane_id)
+        session = self.session(lane_id)
+        if session is None:
+            return {'lane': str(lane_id), 'running': False}
+        return session.status()
+
+
+lane_manager = LaneManager()
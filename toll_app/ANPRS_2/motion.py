@@ -0,0 +1,76 @@
+"""
+Motion gate in front of the plate detector.
+
+A downscaled grey copy of each frame is compared against a slowly adapting
+background. While nothing moves and no track is alive the detector is skipped;
+the first frame with enough changed pixels re-opens the gate immediately.
+"""
+import cv2
+import numpy as np
+
+from .config import *
+
+
+def motion_gate_settings(source):
+    return {**MOTION_GATE_SETTINGS, **CAMERA_MOTION_GATE_SETTINGS.get(source, {})}
+
+
+class MotionGate(object):
+    def __init__(self, source=None, **settings):
+        self.settings = {**motion_gate_settings(source), **settings}
+        self.background = None
+        self.idle_frames = None
+        self.just_opened = False
+        self.frames_checked = 0
+        self.frames_skipped = 0
+        self.motion_events = 0
+
+    def check(self, frame, active=False):
+        """
+        Returns True when the detector should run on this frame. `active` keeps
+        the gate open while the tracker still follows a plate, e.g. a vehicle
+        standing still at the barrier.
+        """
+        self.frames_checked += 1
+        self.just_opened = False
+        if not self.settings['enabled']:
+            return True
+
+        height, width = frame.shape[:2]
+        scaled_height = max(1, int(height * self.settings['width'] / width))
+        small = cv2.resize(frame, (self.settings['width'], scaled_height), interpolation=cv2.INTER_AREA)
+        grey = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self.background is None or self.background.shape != grey.shape:
+            self.background = grey.astype(np.float32)
+            self.idle_frames = 0
+            return True
+
+        diff = cv2.absdiff(grey, cv2.convertScaleAbs(self.background))
+        _, moving = cv2.threshold(diff, self.settings['pixel_threshold'], 255, cv2.THRESH_BINARY)
+        moved = cv2.countNonZero(moving) >= self.settings['min_area'] * moving.size
+
+        cv2.accumulateWeighted(grey, self.background, self.settings['learning_rate'])
+
+        if moved or active:
+            if self.idle_frames > self.settings['hold_frames']:
+                self.just_opened = True
+                self.motion_events += 1
+            self.idle_frames = 0
+            return True
+
+        self.idle_frames += 1
+        if self.idle_frames <= self.settings['hold_frames']:
+            return True
+
+        self.frames_skipped += 1
+        return False
+
+    def status(self):
+        return {
+            'enabled': self.settings['enabled'],
+            'open': self.idle_frames is None or self.idle_frames <= self.settings['hold_frames'],
+            'frames_checked': self.frames_checked,
+            'frames_skipped': self.frames_skipped,
+            'motion_events': self.motion_events,
+        }
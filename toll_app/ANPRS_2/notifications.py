@@ -0,0 +1,194 @@
+"""
+Toll notifications through a transactional outbox.
+
+process_transaction records a Notification in the same database transaction
+as the toll, so no mail server is waited on while the account row is locked
+and nothing is sent for a toll that is rolled back. A dispatcher thread
+claims due notifications in batches, sends them over one reused mail
+connection and retries failures with exponential backoff. A batch whose
+dispatcher died (server restart, crash) is claimed again once its claim is
+older than NOTIFICATION_SETTINGS['claim_timeout']. Accounts with
+`notification_digest` set get one summary mail per digest interval instead
+of one per toll.
+"""
+import time
+import uuid
+import threading
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .config import *
+from ..enums import NotificationStatus
+from ..models import Notification
+
+
+class NotificationOutbox(object):
+    def __init__(self, backend=NOTIFICATION_SETTINGS['backend'], batch_size=NOTIFICATION_SETTINGS['batch_size']):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.connection = None
+        self.thread = None
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+
+    def enqueue(self, user, subject, message, summary='', transaction=None):
+        """
+        Records a notification in the current database transaction; the
+        dispatcher is woken once it commits.
+        """
+        recipient = NOTIFICATION_SETTINGS['redirect_to'] or user.email
+        if not recipient:
+            return None
+
+        delay = NOTIFICATION_SETTINGS['digest_interval'] if user.notification_digest else 0
+        notification = Notification.objects.create(
+            user=user, transaction=transaction, recipient=recipient, subject=subject, message=message,
+            summary=summary, next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        )
+        db_transaction.on_commit(self.notify)
+        return notification
+
+    def notify(self):
+        self.start()
+        self.wakeup.set()
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name='notification_dispatcher', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        # started from TollAppConfig.ready(), the first query waits for the app registry
+        while not apps.ready:
+            time.sleep(0.1)
+
+        while True:
+            try:
+                self.wakeup.clear()
+                if not self.dispatch():
+                    self.close()
+                    self.wakeup.wait(timeout=NOTIFICATION_SETTINGS['poll_interval'])
+            except Exception as e:
+                print(f"Error in notification dispatcher: {e}")
+                self.close()
+                self.wakeup.wait(timeout=NOTIFICATION_SETTINGS['poll_interval'])
+            finally:
+                close_old_connections()
+
+    def claim(self):
+        """
+        Claims up to batch_size due notifications, together with every
+        pending notification of the digest accounts among them.
+        """
+        self.reclaim()
+        due = list(Notification.objects.filter(status=NotificationStatus.PENDING.value,
+                                               next_attempt_at__lte=timezone.now())
+                   .order_by('next_attempt_at')
+                   .values_list('id', 'user_id', 'user__notification_digest')[:self.batch_size])
+        if not due:
+            return []
+
+        # one conditional update claims the batch, a notification claimed by another process is skipped
+        claim, claimed_at = uuid.uuid4().hex, timezone.now()
+        pending = Notification.objects.filter(status=NotificationStatus.PENDING.value)
+        pending.filter(id__in=[notification_id for notification_id, _, _ in due]).update(
+            status=NotificationStatus.SENDING.value, claim=claim, claimed_at=claimed_at
+        )
+        digest_users = {user_id for _, user_id, digest in due if digest}
+        if digest_users:
+            pending.filter(user_id__in=digest_users).update(
+                status=NotificationStatus.SENDING.value, claim=claim, claimed_at=claimed_at
+            )
+
+        return list(Notification.objects.filter(status=NotificationStatus.SENDING.value, claim=claim)
+                    .select_related('user').order_by('created_at'))
+
+    def reclaim(self):
+        """
+        Returns notifications whose claim timed out to the queue; a claim
+        without a time predates claimed_at.
+        """
+        stale = timezone.now() - timedelta(seconds=NOTIFICATION_SETTINGS['claim_timeout'])
+        return Notification.objects.filter(
+            Q(claimed_at__lt=stale) | Q(claimed_at__isnull=True), status=NotificationStatus.SENDING.value
+        ).update(status=NotificationStatus.PENDING.value, claim='', claimed_at=None)
+
+    def dispatch(self):
+        """
+        Sends one batch and returns the number of notifications claimed.
+        """
+        notifications = self.claim()
+        groups = {}
+        for notification in notifications:
+            key = notification.user_id if notification.user.notification_digest else notification.id
+            groups.setdefault(key, []).append(notification)
+
+        sent = []
+        for group in groups.values():
+            try:
+                self.open().send_messages([self.message(group)])
+            except Exception as e:
+                print(f"Failed to send notification to {group[0].recipient}: {e}")
+                # the connection may be broken, the next message opens a new one
+                self.close()
+                self.retry(group, str(e))
+            else:
+                sent.extend(notification.id for notification in group)
+
+        if sent:
+            Notification.objects.filter(id__in=sent).update(
+                status=NotificationStatus.SENT.value, sent_at=timezone.now(), error=''
+            )
+        return len(notifications)
+
+    def message(self, notifications):
+        first = notifications[0]
+        if len(notifications) == 1:
+            return EmailMessage(first.subject, first.message, settings.DEFAULT_FROM_EMAIL, [first.recipient])
+
+        user = first.user
+        lines = '\n'.join(f"- {notification.summary}" for notification in notifications)
+        body = (f"Dear {user.first_name},\n\nThe following toll fees have been deducted from your account:\n\n"
+                f"{lines}\n\nRemaining Balance: NRP {user.balance}\n\nThank you for using our service.\n\n"
+                f"Best regards,\nToll Management System")
+        return EmailMessage("Toll Payment Summary", body, settings.DEFAULT_FROM_EMAIL, [first.recipient])
+
+    def retry(self, notifications, error):
+        now = timezone.now()
+        for notification in notifications:
+            attempts = notification.attempts + 1
+            if attempts >= NOTIFICATION_SETTINGS['max_attempts']:
+                status, delay = NotificationStatus.FAILED.value, 0
+            else:
+                status = NotificationStatus.PENDING.value
+                delay = min(NOTIFICATION_SETTINGS['retry_delay'] * 2 ** (attempts - 1),
+                            NOTIFICATION_SETTINGS['max_retry_delay'])
+            Notification.objects.filter(id=notification.id).update(
+                status=status, attempts=attempts, next_attempt_at=now + timedelta(seconds=delay), error=error
+            )
+
+    def open(self):
+        if self.connection is None:
+            connection = get_connection(self.backend, fail_silently=False, timeout=NOTIFICATION_SETTINGS['timeout'])
+            connection.open()
+            self.connection = connection
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception as e:
+                print(f"Error closing mail connection: {e}")
+            self.connection = None
+
+
+notification_outbox = NotificationOutbox()
@@ -0,0 +1,122 @@
+"""
+Perceptual-hash cache for plate OCR results.
+
+Consecutive frames give near-identical plate crops. Each crop is reduced to a
+difference hash (dHash) of its grey, resized image; a crop whose hash matches
+(within `max_distance` bits) a recently read one of the same track reuses that
+read instead of running OCR again. Entries are scoped to one track of one lane
+or video: plates one digit apart hash alike, so a read is never handed to
+another track.
+Entries expire after a TTL and the least recently used ones are evicted once the
+cache is full.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .config import *
+
+
+def dhash(image, hash_size=8, margin=0):
+    """
+    Difference hash: two bits per horizontally adjacent pixel pair of the
+    normalised crop, set when the left one is brighter, or darker, by more than
+    `margin` grey levels. With a margin, flat background does not flip with
+    sensor noise, so a still crop keeps its hash exactly.
+    """
+    grey = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(grey, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    difference = small[:, :-1] - small[:, 1:]
+    bits = np.concatenate([(difference > margin).flatten(), (difference < -margin).flatten()])
+    return int(np.packbits(bits).tobytes().hex(), 16)
+
+
+class PlateOCRCache(object):
+    def __init__(self, max_size=OCR_CACHE_SETTINGS['max_size'], ttl=OCR_CACHE_SETTINGS['ttl'],
+                 max_distance=OCR_CACHE_SETTINGS['max_distance'], hash_size=OCR_CACHE_SETTINGS['hash_size'],
+                 hash_margin=OCR_CACHE_SETTINGS['hash_margin'], enabled=OCR_CACHE_SETTINGS['enabled']):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.hash_margin = hash_margin
+        self.enabled = enabled
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, image):
+        return dhash(image, self.hash_size, self.hash_margin)
+
+    def get(self, scope, key):
+        """
+        The read cached for a crop of the same scope, e.g. (lane, track id),
+        whose hash is within max_distance bits of `key`, or None.
+        """
+        if not self.enabled or scope is None:
+            return None
+
+        with self.lock:
+            self.expire()
+
+            match = (scope, key) if (scope, key) in self.entries else None
+            if match is None and self.max_distance:
+                # Hamming distance between hashes
+                candidates = [entry for entry in self.entries if entry[0] == scope]
+                nearest = min(candidates, key=lambda other: (key ^ other[1]).bit_count(), default=None)
+                if nearest is not None and (key ^ nearest[1]).bit_count() <= self.max_distance:
+                    match = nearest
+                    self.near_hits += 1
+
+            if match is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(match)
+            return self.entries[match][0]
+
+    def put(self, scope, key, result):
+        if not self.enabled or scope is None:
+            return
+
+        with self.lock:
+            self.entries[(scope, key)] = (result, time.monotonic())
+            self.entries.move_to_end((scope, key))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def expire(self):
+        # entries are kept in insertion/use order, so expired ones are not necessarily first;
+        # the cache is small enough to simply sweep it
+        now = time.monotonic()
+        expired = [key for key, (_, stored_at) in self.entries.items() if now - stored_at > self.ttl]
+        for key in expired:
+            del self.entries[key]
+        self.expirations += len(expired)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def status(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
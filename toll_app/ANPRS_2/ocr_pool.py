@@ -0,0 +1,196 @@
+"""
+Process-pool OCR.
+
+EasyOCR holds the GIL for most of a read, so in-process OCR for every lane
+shares one core. The pool runs OCR in separate worker processes, each loading
+en_reader/ne_reader once. A batch of plate crops is copied into a single
+shared-memory block and only its name and layout go through the job queue;
+results come back on a result queue and resolve the Future returned by submit().
+"""
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .config import *
+
+
+def ocr_worker(worker_id, jobs, results, busy_seconds, jobs_done):
+    # each worker is its own Django process, with only the readers loaded; the video
+    # job worker and the notification dispatcher belong to the server process
+    os.environ['DJANGO_WARM_UP_MODELS'] = '0'
+    os.environ.pop('VIDEO_JOB_AUTOSTART', None)
+    os.environ.pop('NOTIFICATION_DISPATCHER_AUTOSTART', None)
+    VIDEO_JOB_SETTINGS['autostart'] = False
+    NOTIFICATION_SETTINGS['autostart'] = False
+    import django
+    django.setup()
+
+    from django.apps import apps
+    from .detect import recognise_plates
+
+    apps.get_app_config('toll_app').warm_up(['en_reader', 'ne_reader'])
+    results.put(('ready', worker_id, None))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, name, layout = job
+
+        start = time.perf_counter()
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            reply = (job_id, read_block(block, layout, recognise_plates), None)
+        except Exception as e:
+            reply = (job_id, None, f"{type(e).__name__}: {e}")
+        finally:
+            block.close()
+            busy_seconds[worker_id] += time.perf_counter() - start
+            jobs_done[worker_id] += 1
+        results.put(reply)
+
+
+def read_block(block, layout, recognise_plates):
+    # views into the block must not outlive this call, the block is closed right after
+    plate_imgs = [np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+                  for shape, dtype, offset in layout]
+    return recognise_plates(plate_imgs)
+
+
+class OCRWorkerPool(object):
+    def __init__(self, workers=OCR_POOL_SETTINGS['workers'], queue_size=OCR_POOL_SETTINGS['queue_size']):
+        context = multiprocessing.get_context('spawn')
+        self.size = workers
+        self.queue_size = queue_size
+        self.jobs = context.Queue(queue_size)
+        self.results = context.Queue()
+        self.busy_seconds = context.Array('d', workers)
+        self.jobs_done = context.Array('i', workers)
+        self.processes = [
+            context.Process(target=ocr_worker, name=f"ocr_worker_{i}", daemon=True,
+                            args=(i, self.jobs, self.results, self.busy_seconds, self.jobs_done))
+            for i in range(workers)
+        ]
+
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.next_job_id = 0
+        self.ready = set()
+        self.stop_event = threading.Event()
+        self.collector = threading.Thread(target=self.collect, name='ocr_pool_collector', daemon=True)
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.time()
+        for process in self.processes:
+            process.start()
+        self.collector.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for _ in self.processes:
+            self.jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+        self.collector.join(timeout=2)
+
+        self.fail_pending("OCR pool stopped")
+
+    def fail_pending(self, message):
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        for future, block in pending.values():
+            self.release(block)
+            future.set_exception(RuntimeError(message))
+
+    def submit(self, plate_imgs):
+        """
+        Queues a batch of crops and returns a Future of their (text, confidence)
+        list. Blocks while the job queue is full.
+        """
+        if not self.alive():
+            raise RuntimeError("No OCR workers running")
+
+        plate_imgs = [np.ascontiguousarray(plate_img) for plate_img in plate_imgs]
+
+        layout, offset = [], 0
+        for plate_img in plate_imgs:
+            layout.append((plate_img.shape, plate_img.dtype.str, offset))
+            offset += plate_img.nbytes
+
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for plate_img, (shape, dtype, start) in zip(plate_imgs, layout):
+            np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)[...] = plate_img
+
+        future = Future()
+        with self.pending_lock:
+            job_id = self.next_job_id
+            self.next_job_id += 1
+            self.pending[job_id] = (future, block)
+
+        self.jobs.put((job_id, block.name, layout))
+        return future
+
+    def collect(self):
+        while not self.stop_event.is_set():
+            try:
+                job_id, results, error = self.results.get(timeout=0.1)
+            except queue.Empty:
+                # a worker that failed to load its readers exits; don't leave callers waiting
+                if self.pending and not self.alive():
+                    self.fail_pending("OCR workers exited")
+                continue
+
+            if job_id == 'ready':
+                self.ready.add(results)
+                continue
+
+            with self.pending_lock:
+                future, block = self.pending.pop(job_id, (None, None))
+            if future is None:
+                continue
+
+            self.release(block)
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(results)
+
+    def release(self, block):
+        block.close()
+        block.unlink()
+
+    def alive(self):
+        return sum(1 for process in self.processes if process.is_alive())
+
+    def queue_depth(self):
+        try:
+            return self.jobs.qsize()
+        except NotImplementedError:
+            # not available on macOS
+            return None
+
+    def status(self):
+        elapsed = max(time.time() - self.started_at, 1e-6) if self.started_at else None
+        return {
+            'size': self.size,
+            'alive': self.alive(),
+            'ready': len(self.ready),
+            'queue_depth': self.queue_depth(),
+            'queue_size': self.queue_size,
+            'in_flight': len(self.pending),
+            'workers': [
+                {
+                    'jobs': self.jobs_done[i],
+                    'busy_seconds': self.busy_seconds[i],
+                    'utilisation': self.busy_seconds[i] / elapsed if elapsed else 0.0,
+                }
+                for i in range(self.size)
+            ],
+        }
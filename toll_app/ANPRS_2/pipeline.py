@@ -0,0 +1,445 @@
+"""
+Staged live detection.
+
+capture -> detection + tracking -> OCR -> OCR results -> transactions, with
+JPEG encoding on its own thread. Stages hand work over through small bounded queues; when a
+stage falls behind, the oldest queued frame is dropped so a slow OCR call never
+freezes the stream or delays the next capture.
+
+One LivePipeline is one lane: it owns its camera, tracker, OCR state and
+debounce state. The encoded frame is broadcast, so any number of viewers can
+watch a lane without taking frames from each other.
+"""
+import time
+import queue
+import threading
+
+import cv2
+import numpy as np
+from django.db import close_old_connections
+
+from .sort import VectorizedSort
+from .config import *
+from .roi import region_of_interest
+from .motion import MotionGate
+from .consensus import PlateConsensus
+from ..scheduling import FrameScheduler
+from .batching import BatchedDetector
+from .registry import plate_registry
+from .detect import (detect_plates, detect_plates_batch, process_plates_async, detect_vehicle_type,
+                     process_transaction, transaction_status, ocr_cache, get_ocr_pool_status)
+
+# shared by every lane in the process
+batched_detector = BatchedDetector(detect_plates_batch)
+
+
+class DropQueue(queue.Queue):
+    """
+    Bounded queue whose producer never blocks: when it is full the oldest item
+    is discarded to make room for the newest one.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put_latest(self, item):
+        dropped = []
+        while True:
+            try:
+                self.put_nowait(item)
+                return dropped
+            except queue.Full:
+                try:
+                    dropped.append(self.get_nowait())
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class LivePipeline(object):
+    def __init__(self, source=LIVE_CAMERA_SOURCE, lane_id=None):
+        self.source = source
+        self.lane_id = lane_id
+
+        self.tracker = VectorizedSort(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS)
+        self.scheduler = FrameScheduler()
+        self.motion_gate = MotionGate(source)
+        self.roi = region_of_interest(source)
+        self.tracks = []
+        self.track_texts = {}
+        self.consensus = PlateConsensus()
+        self.pending_ocr = set()
+        self.detection_times = {}
+        self.lock = threading.Lock()
+
+        self.queues = {
+            'capture': DropQueue(PIPELINE_QUEUE_SIZES['capture']),
+            'ocr': DropQueue(PIPELINE_QUEUE_SIZES['ocr']),
+            # transactions are never dropped, a full queue holds back the OCR stage instead
+            'transaction': queue.Queue(PIPELINE_QUEUE_SIZES['transaction']),
+            # finished OCR batches; bounded by the batches in flight, so never full
+            'ocr_result': queue.Queue(),
+            'encode': DropQueue(PIPELINE_QUEUE_SIZES['encode']),
+        }
+        self.frame_ready = threading.Condition()
+        self.latest_jpeg = None
+        self.jpeg_seq = 0
+        self.viewers = 0
+
+        self.stop_event = threading.Event()
+        self.opened = threading.Event()
+        self.threads = []
+        self.frames_captured = 0
+        self.frames_grabbed = 0
+        self.frames_processed = 0
+        # frames, OCR batches and tolls that failed without stopping the lane
+        self.errors = 0
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.time()
+        stages = [self.capture_stage, self.detect_stage, self.ocr_stage, self.ocr_result_stage,
+                  self.transaction_stage, self.encode_stage]
+        for stage in stages:
+            thread = threading.Thread(target=self.run_stage, args=(stage,), name=stage.__name__, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
+
+    @property
+    def running(self):
+        return bool(self.threads) and not self.stop_event.is_set()
+
+    def wait_opened(self, timeout=5):
+        self.opened.wait(timeout=timeout)
+        return self.opened.is_set() and not self.stop_event.is_set()
+
+    def frames(self):
+        """
+        Yields multipart JPEG chunks for one viewer until the lane stops. A
+        viewer leaving does not stop the lane.
+        """
+        seen = self.jpeg_seq
+        with self.lock:
+            self.viewers += 1
+        try:
+            while not self.stop_event.is_set():
+                with self.frame_ready:
+                    if not self.frame_ready.wait_for(lambda: self.jpeg_seq != seen, timeout=0.1):
+                        continue
+                    seen, frame_bytes = self.jpeg_seq, self.latest_jpeg
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        finally:
+            with self.lock:
+                self.viewers -= 1
+
+    def run_stage(self, stage):
+        # stages handle errors per frame or batch; anything reaching here is fatal
+        try:
+            stage()
+        except Exception as e:
+            print(f"Error in live pipeline {stage.__name__}: {e}")
+            self.stop_event.set()
+
+    def failed(self, what, error):
+        print(f"Error in live pipeline {what}: {error}")
+        with self.lock:
+            self.errors += 1
+
+    def next_item(self, name):
+        while not self.stop_event.is_set():
+            try:
+                return self.queues[name].get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def capture_stage(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            self.stop_event.set()
+            return
+        self.opened.set()
+
+        try:
+            while not self.stop_event.is_set():
+                # a frame that would only push an older one out of a full queue is not decoded
+                if self.queues['capture'].full():
+                    if not cap.grab():
+                        break
+                    self.frames_captured += 1
+                    self.frames_grabbed += 1
+                    continue
+
+                success, frame = cap.read()
+                if not success:
+                    break
+                self.queues['capture'].put_latest((self.frames_captured, frame, time.time()))
+                self.frames_captured += 1
+        finally:
+            cap.release()
+            self.stop_event.set()
+
+    def detect_stage(self):
+        # the lane counts towards the shared detector's batches for as long as it detects
+        batched_detector.register(self.lane_id)
+        try:
+            self.detect_loop()
+        finally:
+            batched_detector.unregister(self.lane_id)
+
+    def detect_loop(self):
+        while True:
+            item = self.next_item('capture')
+            if item is None:
+                return
+            frame_count, frame, captured_at = item
+
+            # only the lane itself is looked at; boxes are mapped back to the full frame
+            region = self.roi.crop(frame)
+
+            # nothing moving on an empty lane: skip the detector, re-open on the first motion
+            moving = self.motion_gate.check(region, active=len(self.tracks) > 0)
+
+            # on tracking-only frames the previous tracks are reused and nothing is read
+            detected = moving and self.scheduler.should_detect(frame_count, self.motion_gate.just_opened)
+            if not moving:
+                self.tracks = []
+                # aged while the lane is idle, so a vehicle gone during the gap does not lend its id
+                if len(self.tracker):
+                    self.tracker.update(np.empty((0, 5)))
+            elif detected:
+                try:
+                    with self.scheduler.timed('detect'):
+                        dets = self.roi.to_frame(self.detect(region), frame.shape)
+                        self.tracks = self.tracker.update(dets)
+                except Exception as e:
+                    # a failed frame or batch keeps the previous tracks and reads nothing
+                    self.failed(f"detection on frame {frame_count}", e)
+                    detected = False
+                else:
+                    self.scheduler.update_tracks(int(track[4]) for track in self.tracks)
+
+            for track in self.tracks:
+                x1, y1, x2, y2, track_id = map(int, track)
+
+                with self.lock:
+                    info = self.track_texts.get(track_id)
+                    # a locked plate is never read again, just kept alive while it is tracked
+                    if info is not None and info['locked']:
+                        info['last_updated'] = frame_count
+                    needs_ocr = (detected and track_id not in self.pending_ocr and self.consensus.wants_read(
+                        track_id, self.scheduler.ocr_due(track_id, frame_count, recognized=info is not None)))
+                    if needs_ocr:
+                        self.pending_ocr.add(track_id)
+
+                if needs_ocr:
+                    dropped = self.queues['ocr'].put_latest(
+                        (frame_count, track_id, frame[y1:y2, x1:x2].copy(), captured_at)
+                    )
+                    with self.lock:
+                        self.pending_ocr.difference_update(job[1] for job in dropped)
+
+                if info is not None:
+                    color = PIPELINE_STATUS_COLORS.get(info['transaction_status'], (0, 0, 255))
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                    label = f"ID:{track_id} {info['text']}"
+                    cv2.putText(frame, label, (x1, y1 - 10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+            if self.roi.polygon is not None:
+                cv2.polylines(frame, [self.roi.polygon], True, (255, 0, 0), 1)
+
+            with self.lock:
+                tracks_to_remove = [tid for tid, info in self.track_texts.items()
+                                    if frame_count - info['last_updated'] > 30]
+                for tid in tracks_to_remove:
+                    del self.track_texts[tid]
+                    self.consensus.forget(tid)
+
+            self.frames_processed += 1
+            self.queues['encode'].put_latest(frame)
+
+    def detect(self, frame):
+        if DETECTOR_BATCH_SETTINGS['enabled']:
+            return batched_detector.detect(frame, self.lane_id)
+        return detect_plates(frame)
+
+    def ocr_stage(self):
+        while True:
+            job = self.next_item('ocr')
+            if job is None:
+                return
+
+            # recognise everything that queued up while the previous batch ran in one call
+            jobs = [job]
+            while True:
+                try:
+                    jobs.append(self.queues['ocr'].get_nowait())
+                except queue.Empty:
+                    break
+
+            # with OCR workers the batch is read in the pool while the next one is collected
+            # the callback runs on the pool's collector thread, shared by every lane, so it
+            # only hands the result over; voting and the toll happen on this lane's threads
+            started = time.perf_counter()
+            try:
+                process_plates_async([plate_img for _, _, plate_img, _ in jobs],
+                                     [(self.lane_id, track_id) for _, track_id, _, _ in jobs]).add_done_callback(
+                    lambda read, jobs=jobs, started=started: self.queues['ocr_result'].put((jobs, read, started))
+                )
+            except Exception as e:
+                self.failed("OCR", e)
+                with self.lock:
+                    self.pending_ocr.difference_update(job[1] for job in jobs)
+
+    def ocr_result_stage(self):
+        while True:
+            item = self.next_item('ocr_result')
+            if item is None:
+                return
+            try:
+                self.ocr_done(*item)
+            except Exception as e:
+                self.failed("OCR result", e)
+                with self.lock:
+                    self.pending_ocr.difference_update(job[1] for job in item[0])
+
+    def ocr_done(self, jobs, read, started):
+        if read.exception() is not None:
+            self.failed("OCR", read.exception())
+            with self.lock:
+                self.pending_ocr.difference_update(job[1] for job in jobs)
+            return
+
+        self.scheduler.record('ocr', (time.perf_counter() - started) / len(jobs))
+
+        for (frame_count, track_id, _, captured_at), (text, confidence, cached) in zip(jobs, read.result()):
+            with self.lock:
+                self.pending_ocr.discard(track_id)
+                if not text or confidence < OD_THRESHOLD:
+                    continue
+
+                info = self.track_texts.get(track_id)
+                text, confidence, locked = self.consensus.vote(track_id, text, confidence, cached)
+                changed = info is None or info['text'] != text
+                # a plate held for review goes to the toll again once its consensus locks
+                locking = not changed and locked and not info['locked'] and info['transaction_status'] == 'review'
+
+                self.track_texts[track_id] = {
+                    'text': text,
+                    'confidence': confidence,
+                    'locked': locked,
+                    'last_updated': frame_count,
+                    'vehicle_type': info['vehicle_type'] if info else None,
+                    'transaction_status': 'pending' if changed or locking else info['transaction_status'],
+                    'transaction_message': 'Processing transaction' if changed or locking else info['transaction_message']
+                }
+
+            # only a new consensus text goes to the toll, repeated reads of the same plate do not
+            if changed or locking:
+                self.put_transaction((frame_count, track_id, text, captured_at))
+
+    def put_transaction(self, item):
+        # never dropped, but give up once the pipeline stops so a pool callback cannot hang
+        while not self.stop_event.is_set():
+            try:
+                self.queues['transaction'].put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def transaction_stage(self):
+        while True:
+            item = self.next_item('transaction')
+            if item is None:
+                return
+            try:
+                self.charge(*item)
+            except Exception as e:
+                self.failed(f"transaction for {item[2]}", e)
+                with self.lock:
+                    info = self.track_texts.get(item[1])
+                    if info is not None and info['text'] == item[2]:
+                        info['transaction_status'] = 'error'
+                        info['transaction_message'] = str(e)
+
+    def charge(self, frame_count, track_id, text, captured_at):
+        locked = self.is_locked(track_id, text)
+        while True:
+            try:
+                vehicle_type = detect_vehicle_type(text)
+                transaction, message = process_transaction(
+                    text, vehicle_type, f"live_lane_{self.lane_id}_frame_{frame_count}", self.detection_times,
+                    locked=locked
+                )
+            finally:
+                close_old_connections()
+
+            with self.lock:
+                info = self.track_texts.get(track_id)
+                if info is None or info['text'] != text:
+                    break
+                status = transaction_status(transaction, message)
+                # the consensus locked while the plate was being held back, so it is not re-sent
+                if status == 'review' and info['locked'] and not locked:
+                    locked = True
+                    continue
+                info['vehicle_type'] = vehicle_type
+                info['transaction_status'] = status
+                info['transaction_message'] = message
+                break
+        self.scheduler.record('decision', time.time() - captured_at)
+
+    def is_locked(self, track_id, text):
+        with self.lock:
+            info = self.track_texts.get(track_id)
+            return info is not None and info['text'] == text and info['locked']
+
+    def encode_stage(self):
+        while True:
+            frame = self.next_item('encode')
+            if frame is None:
+                return
+
+            ret, buffer = cv2.imencode('.jpg', frame)
+            if ret:
+                with self.frame_ready:
+                    self.latest_jpeg = buffer.tobytes()
+                    self.jpeg_seq += 1
+                    self.frame_ready.notify_all()
+
+    def plates(self):
+        with self.lock:
+            return {tid: dict(info) for tid, info in self.track_texts.items()}
+
+    def status(self):
+        elapsed = max(time.time() - self.started_at, 1e-6) if self.started_at else None
+        return {
+            'lane': self.lane_id,
+            'source': str(self.source),
+            'running': self.running,
+            'viewers': self.viewers,
+            'frames_captured': self.frames_captured,
+            'frames_grabbed': self.frames_grabbed,
+            'frames_processed': self.frames_processed,
+            'errors': self.errors,
+            'fps': self.frames_processed / elapsed if elapsed else 0.0,
+            'queue_depths': {name: q.qsize() for name, q in self.queues.items()},
+            'dropped': {name: q.dropped for name, q in self.queues.items() if isinstance(q, DropQueue)},
+            'scheduler': self.scheduler.status(),
+            'motion_gate': self.motion_gate.status(),
+            'consensus': self.consensus.status(),
+            'ocr_cache': ocr_cache.status(),
+            'ocr_pool': get_ocr_pool_status(),
+            'plate_registry': plate_registry.status(),
+            'detector_batching': batched_detector.status(),
+            'roi': self.roi.status(),
+        }
@@ -0,0 +1,209 @@
+"""
+Compiled plate grammar.
+
+Every layout in PLATE_LAYOUTS is a sequence of letter/digit groups. All
+layouts of a script are compiled into one state table, and a reading is
+matched against all of them in a single pass over its characters. Each
+character maps, by dict lookup, to the classes it can stand for: itself, or a
+common OCR confusion at a cost. Alphabet characters may be left out of the
+plate at a cost; anything else (hyphens, spaces) is skipped for free. Matras
+belong to the letter before them and are kept with it, and a letter after a
+virama joins the same conjunct, so 'बा' and 'क्ष' are one letter of a group.
+A reading yields at most one candidate per layout, its cheapest complete
+match, and none above the maximum cost. Nothing is ever padded, so a reading
+that fits no layout gives none.
+"""
+import unicodedata
+
+from .config import *
+
+LETTER = 'L'
+DIGIT = 'D'
+MARK = 'M'
+VIRAMA = '\u094d'
+INFINITY = float('inf')
+
+
+class PlateGrammar(object):
+    def __init__(self, layouts, alphabet, costs=PLATE_GRAMMAR_COSTS):
+        """
+        `alphabet` maps a character to its [(class, canonical character, cost)]
+        readings; a MARK is kept with the letter before it.
+        """
+        self.layouts = layouts
+        self.alphabet = alphabet
+        self.skip_cost = costs['skip']
+        self.max_cost = costs['max_cost']
+
+        # states are (layout, group, characters in group); group -1 is before the plate
+        self.states = []
+        self.accepting = {}
+        self.start = []
+        index = {}
+        for name, groups in layouts.items():
+            keys = [(name, -1, 0)] + [(name, group, count) for group, (_, _, maximum) in enumerate(groups)
+                                      for count in range(1, maximum + 1)]
+            for key in keys:
+                index[key] = len(self.states)
+                self.states.append(key)
+
+            self.start.append(index[(name, -1, 0)])
+            last = len(groups) - 1
+            for count in range(groups[last][1], groups[last][2] + 1):
+                self.accepting[index[(name, last, count)]] = name
+
+        transitions = {}
+        for state, (name, group, count) in enumerate(self.states):
+            groups = layouts[name]
+            for cls in (LETTER, DIGIT):
+                targets = transitions.setdefault((state, cls), [])
+                if group >= 0 and groups[group][0] == cls and count < groups[group][2]:
+                    targets.append((index[(name, group, count + 1)], False))
+                if (group < 0 or count >= groups[group][1]) and group + 1 < len(groups) \
+                        and groups[group + 1][0] == cls:
+                    targets.append((index[(name, group + 1, 1)], True))
+
+        # char -> every (source, target, cost, canonical, starts a group) edge it can take
+        self.edges = {}
+        for char, readings in alphabet.items():
+            self.edges[char] = [
+                (state, target, cost, canonical, new_group)
+                for state in range(len(self.states))
+                for cls, canonical, cost in readings
+                for target, new_group in transitions.get((state, cls), ())
+            ]
+        self.marks = {char for char, readings in alphabet.items() if any(cls == MARK for cls, _, _ in readings)}
+        self.letters = {char for char, readings in alphabet.items() if (LETTER, char, 0.0) in readings}
+        # states right after a letter, where a mark or a conjunct's second letter attaches
+        self.letter_states = [state for state, (name, group, count) in enumerate(self.states)
+                              if group >= 0 and layouts[name][group][0] == LETTER]
+        self.initial_costs = [0.0 if state in self.start else INFINITY for state in range(len(self.states))]
+
+    def match(self, text):
+        """
+        Returns [(cost, layout, plate)] for every layout the text can be read
+        as within the maximum cost, cheapest first.
+        """
+        costs = self.initial_costs
+        # per state, the last character taken as (previous path, character, starts a group)
+        paths = [None] * len(costs)
+        skip_cost = self.skip_cost
+
+        for char in text:
+            edges = self.edges.get(char)
+            if edges is None:
+                continue
+
+            if char in self.marks:
+                # kept with the letter before it, skipped for free anywhere else
+                following_paths = paths[:]
+                for state in self.letter_states:
+                    if paths[state] is not None:
+                        following_paths[state] = (paths[state], char, False)
+                paths = following_paths
+                continue
+
+            following_costs = [cost + skip_cost for cost in costs]
+            following_paths = paths[:]
+            for state in self.letter_states:
+                # the second letter of a conjunct
+                if char in self.letters and paths[state] is not None and paths[state][1] == VIRAMA \
+                        and costs[state] < following_costs[state]:
+                    following_costs[state] = costs[state]
+                    following_paths[state] = (paths[state], char, False)
+            for source, target, cost, canonical, new_group in edges:
+                cost += costs[source]
+                if cost < following_costs[target]:
+                    following_costs[target] = cost
+                    following_paths[target] = (paths[source], canonical, new_group)
+            costs, paths = following_costs, following_paths
+
+        matches = {}
+        for state, name in self.accepting.items():
+            cost = costs[state]
+            if cost <= self.max_cost and (name not in matches or cost < matches[name][0]):
+                matches[name] = (cost, name, plate_text(paths[state]))
+        return sorted(matches.values(), key=lambda match: match[0])
+
+
+def plate_text(path):
+    chars = []
+    while path is not None:
+        path, canonical, new_group = path
+        chars.append(canonical)
+        if new_group and path is not None:
+            chars.append(' ')
+    return ''.join(reversed(chars))
+
+
+def english_alphabet():
+    substitution = PLATE_GRAMMAR_COSTS['substitution']
+    alphabet = {}
+    for letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+        readings = [(LETTER, letter, 0.0)]
+        if letter in ENG_DIGIT_CONFUSIONS:
+            readings.append((DIGIT, ENG_DIGIT_CONFUSIONS[letter], substitution))
+        alphabet[letter] = alphabet[letter.lower()] = readings
+    for digit in '0123456789':
+        readings = [(DIGIT, digit, 0.0)]
+        if digit in ENG_LETTER_CONFUSIONS:
+            readings.append((LETTER, ENG_LETTER_CONFUSIONS[digit], substitution))
+        alphabet[digit] = readings
+    return alphabet
+
+
+def nepali_alphabet():
+    # combined characters in NEP_ALPHA_CHAR_LIST are read one code point at a time: the
+    # bare letters, then the matras and viramas that follow them; the '-' of state names is skipped
+    alphabet = {char: [(MARK if unicodedata.category(char).startswith('M') else LETTER, char, 0.0)]
+                for letter in NEP_ALPHA_CHAR_LIST for char in letter if char != '-'}
+    alphabet.update({digit: [(DIGIT, digit, 0.0)] for digit in NEP_DIGIT_CHAR_LIST})
+    # these were always translated before validation, so they cost nothing
+    alphabet.update({char: [(DIGIT, digit, 0.0)] for char, digit in NEP_DIGIT_CONFUSIONS.items()})
+    return alphabet
+
+
+GRAMMARS = {
+    'en': PlateGrammar(PLATE_LAYOUTS['en'], english_alphabet()),
+    'ne': PlateGrammar(PLATE_LAYOUTS['ne'], nepali_alphabet()),
+}
+
+
+def is_state_name(text, lang):
+    # the province/state line is not part of the plate number
+    if lang == 'en':
+        return len(text) > 4 and text.isalpha()
+    return len(text) > 4 and '-' in text
+
+
+def reading_text(results, lang):
+    """
+    Joins the confident OCR boxes of one reading into the text to match.
+    Returns (text, confidence).
+    """
+    confident = [item for item in results if item[2] >= OCR_THRESHOLD]
+    parts = [item[1] for item in confident if not is_state_name(item[1], lang)]
+    return ''.join(parts), max((item[2] for item in confident), default=0.0)
+
+
+def rank_plates(readings, k=PLATE_CANDIDATES):
+    """
+    Scores every reading, a list of (lang, OCR results) from one or several
+    readers, against its script's layouts. Returns up to k
+    (plate, score, layout), best first; equal scores keep reading order.
+    """
+    candidates = []
+    for lang, results in readings:
+        if not results:
+            continue
+        text, confidence = reading_text(results, lang)
+        for cost, layout, plate in GRAMMARS[lang].match(text):
+            candidates.append((plate, confidence / (1.0 + cost), layout))
+
+    ranked = []
+    seen = set()
+    for plate, score, layout in sorted(candidates, key=lambda candidate: -candidate[1]):
+        if plate not in seen:
+            seen.add(plate)
+            ranked.append((plate, score, layout))
+    return ranked[:k]
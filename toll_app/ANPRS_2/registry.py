@@ -0,0 +1,274 @@
+"""
+In-process plate registry cache.
+
+Every recognised plate needs its account and vehicle type. Lookups go through
+this cache, keyed by the normalized plate (see toll_app/plates.py): a hit
+costs no query, a miss reads UserDetails once and remembers the answer, and
+unregistered plates are remembered as misses so repeat sightings of foreign
+or unregistered vehicles never reach the database. Nepali suffix lookups are
+cached the same way, and plates not registered as read get a second chance
+through the fuzzy matcher (fuzzy.py) over every registered plate. Saves and
+deletes of UserDetails invalidate the affected plates and suffixes through
+signals, unless neither the plate nor the vehicle type changed (a toll or a
+top-up), and the least recently used plates are evicted once the cache is
+full.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .config import *
+from .fuzzy import PlateMatcher
+from ..models import UserDetails
+from ..plates import normalize_plate, suffix_filter
+
+
+class PlateRegistry(object):
+    def __init__(self, max_size=REGISTRY_CACHE_SETTINGS['max_size'], ttl=REGISTRY_CACHE_SETTINGS['ttl'],
+                 negative_ttl=REGISTRY_CACHE_SETTINGS['negative_ttl'], enabled=REGISTRY_CACHE_SETTINGS['enabled']):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.enabled = enabled
+        # plate key -> ([(user id, vehicle type)], stored at), at most two per key
+        self.entries = OrderedDict()
+        # suffix -> ([(user id, vehicle type)], stored at), at most two per suffix
+        self.suffixes = {}
+        # user id -> (plate key, vehicle type) of every user a cached answer names; nothing
+        # cached about the user disagrees with it. Evicted with the answers
+        self.users = {}
+        self.matcher = None
+        self.lock = threading.Lock()
+        self.warmed = False
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fuzzy_matches = 0
+
+    def fresh(self, value, stored_at):
+        return time.monotonic() - stored_at <= (self.ttl if value else self.negative_ttl)
+
+    def lookup(self, plate_text):
+        """
+        Returns up to two (user id, vehicle type) registered under the read
+        plate's key; two means plates that differ only in separators or case
+        share it, and the read is ambiguous.
+        """
+        key = normalize_plate(plate_text)
+        if self.enabled:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and self.fresh(*entry):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    if not entry[0]:
+                        self.negative_hits += 1
+                    return entry[0]
+                self.misses += 1
+
+        value = list(UserDetails.objects.filter(plate_key=key).values_list('pk', 'vehicle_type')[:2])
+        if self.enabled:
+            with self.lock:
+                self.store(key, value)
+        return value
+
+    def lookup_suffix(self, suffix):
+        """
+        Returns up to two (user id, vehicle type) whose plates end with
+        `suffix`; two means the suffix is ambiguous.
+        """
+        if self.enabled:
+            with self.lock:
+                entry = self.suffixes.get(suffix)
+                if entry is not None and self.fresh(bool(entry[0]), entry[1]):
+                    self.hits += 1
+                    if not entry[0]:
+                        self.negative_hits += 1
+                    return entry[0]
+                self.misses += 1
+
+        rows = list(UserDetails.objects.filter(**suffix_filter(suffix)).values_list('pk', 'vehicle_type', 'plate_key')[:2])
+        value = [(user_id, vehicle_type) for user_id, vehicle_type, _ in rows]
+        if self.enabled:
+            with self.lock:
+                if len(self.suffixes) >= self.max_size:
+                    self.suffixes.clear()
+                    self.prune_users()
+                self.suffixes[suffix] = (value, time.monotonic())
+                for user_id, vehicle_type, key in rows:
+                    self.users[user_id] = (key, vehicle_type)
+        return value
+
+    def match(self, plate_text):
+        """
+        Second chance for a plate that is not registered as read. Returns
+        [(user id, distance)] of the closest registered plate, or of two when
+        the read cannot tell them apart.
+        """
+        key = normalize_plate(plate_text)
+        if not FUZZY_MATCH_SETTINGS['enabled'] or len(key) < FUZZY_MATCH_SETTINGS['min_length']:
+            return []
+
+        matcher = self.matcher or self.build_matcher()
+        with self.lock:
+            matches = matcher.match(key)
+            if len(matches) == 1:
+                self.fuzzy_matches += 1
+        return [(user_id, distance) for distance, _, user_id in matches]
+
+    def build_matcher(self):
+        matcher = PlateMatcher()
+        for key, user_id in UserDetails.objects.values_list('plate_key', 'pk').iterator():
+            matcher.add(key, user_id)
+        with self.lock:
+            if self.matcher is None:
+                self.matcher = matcher
+            return self.matcher
+
+    def store(self, key, value):
+        for user_id, vehicle_type in value:
+            previous = self.users.get(user_id)
+            if previous is not None and previous[0] != key:
+                self.entries.pop(previous[0], None)
+            self.users[user_id] = (key, vehicle_type)
+
+        self.entries[key] = (value, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            evicted_key, (evicted, _) = self.entries.popitem(last=False)
+            for user_id, _ in evicted:
+                if self.users.get(user_id, (None,))[0] == evicted_key:
+                    del self.users[user_id]
+            self.evictions += 1
+
+    def prune_users(self):
+        # users only the cleared suffix answers named
+        for user_id, (key, _) in list(self.users.items()):
+            entry = self.entries.get(key)
+            if entry is None or all(cached_id != user_id for cached_id, _ in entry[0]):
+                del self.users[user_id]
+
+    def warm(self, limit=REGISTRY_CACHE_SETTINGS['warm_size']):
+        """
+        Loads up to `limit` registered plates, once per process.
+        """
+        if not self.enabled or self.warmed:
+            return
+        limit = min(limit, self.max_size)
+        rows = list(UserDetails.objects.order_by('plate_key').values_list('plate_key', 'pk', 'vehicle_type')[:limit])
+        grouped = OrderedDict()
+        for key, user_id, vehicle_type in rows:
+            grouped.setdefault(key, []).append((user_id, vehicle_type))
+        if len(rows) == limit and grouped:
+            # the last key may share its plate with rows past the limit
+            grouped.popitem()
+        with self.lock:
+            for key, value in grouped.items():
+                self.store(key, value[:2])
+            self.warmed = True
+        if FUZZY_MATCH_SETTINGS['enabled']:
+            self.build_matcher()
+        print(f"Plate registry warmed with {len(rows)} vehicles")
+
+    def user_saved(self, user, committed=False):
+        with self.lock:
+            # only committed plates are matched fuzzily
+            if committed and self.matcher is not None:
+                self.matcher.add(user.plate_key, user.pk)
+            cached = self.users.get(user.pk)
+            # a toll or a top-up changes nothing cached
+            if cached == (user.plate_key, user.vehicle_type):
+                return
+            self.drop(cached[0] if cached else None, user.plate_key)
+            self.drop_user(user.pk)
+            # nothing is cached about the user any more
+            self.users.pop(user.pk, None)
+
+    def user_deleted(self, user, committed=False):
+        with self.lock:
+            if committed and self.matcher is not None:
+                self.matcher.remove(user.pk)
+            cached = self.users.pop(user.pk, None)
+            self.drop(cached[0] if cached else None, user.plate_key)
+            self.drop_user(user.pk)
+
+    def drop(self, *keys):
+        """
+        Drops the cached answers for plate keys and for the suffixes they end with.
+        """
+        # dropped rather than rewritten, so a rolled back save is simply read again
+        keys = [key for key in keys if key]
+        for key in keys:
+            self.entries.pop(key, None)
+        for suffix in list(self.suffixes):
+            ending = normalize_plate(suffix)
+            if ending and any(key.endswith(ending) for key in keys):
+                del self.suffixes[suffix]
+
+    def drop_user(self, user_id):
+        # suffix answers naming the user under a plate it no longer has
+        for suffix, (value, _) in list(self.suffixes.items()):
+            if any(cached_id == user_id for cached_id, _ in value):
+                del self.suffixes[suffix]
+
+    def forget(self, plate_text, user_id=None):
+        """
+        Drops the cached answer for a read and, given `user_id`, everything
+        cached about that user, when the database no longer agrees with them.
+        """
+        with self.lock:
+            self.drop(normalize_plate(plate_text))
+            if user_id is not None:
+                cached = self.users.pop(user_id, None)
+                self.drop(cached[0] if cached else None)
+                self.drop_user(user_id)
+                if self.matcher is not None:
+                    self.matcher.remove(user_id)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.suffixes.clear()
+            self.users.clear()
+            self.matcher = None
+            self.warmed = False
+
+    def status(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self.entries),
+            'users': len(self.users),
+            'max_size': self.max_size,
+            'suffixes': len(self.suffixes),
+            'warmed': self.warmed,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'fuzzy_plates': len(self.matcher) if self.matcher is not None else 0,
+            'fuzzy_matches': self.fuzzy_matches,
+        }
+
+
+plate_registry = PlateRegistry()
+
+
+def user_saved(sender, instance, **kwargs):
+    plate_registry.user_saved(instance)
+    # again once committed, in case another thread read the old row in between
+    transaction.on_commit(lambda: plate_registry.user_saved(instance, committed=True))
+
+
+def user_deleted(sender, instance, **kwargs):
+    plate_registry.user_deleted(instance)
+    transaction.on_commit(lambda: plate_registry.user_deleted(instance, committed=True))
+
+
+post_save.connect(user_saved, sender=UserDetails, dispatch_uid='plate_registry_user_saved')
+post_delete.connect(user_deleted, sender=UserDetails, dispatch_uid='plate_registry_user_deleted')
@@ -0,0 +1,77 @@
+"""
+Per-camera region of interest.
+
+The detector only needs to see the lane itself. A camera's ROI polygon is cut
+out of the frame (everything outside the polygon blanked, optionally rescaled)
+before detection, and the resulting boxes are mapped back to full-frame
+coordinates for the tracker, OCR crops and annotations.
+"""
+import cv2
+import numpy as np
+
+from .config import *
+
+
+def region_of_interest(source):
+    settings = CAMERA_ROIS.get(source, {})
+    return RegionOfInterest(settings.get('polygon'), settings.get('scale', 1.0))
+
+
+class RegionOfInterest(object):
+    def __init__(self, polygon=None, scale=1.0):
+        self.polygon = np.array(polygon, dtype=np.int32) if polygon is not None else None
+        self.scale = scale
+        self.mask = None
+
+        if self.polygon is not None:
+            x, y, w, h = cv2.boundingRect(self.polygon)
+            self.x, self.y, self.w, self.h = x, y, w, h
+
+            self.mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(self.mask, [self.polygon - [x, y]], 255)
+
+    @property
+    def is_full_frame(self):
+        return self.polygon is None and self.scale == 1.0
+
+    def crop(self, frame):
+        if self.is_full_frame:
+            return frame
+
+        region = frame
+        if self.polygon is not None:
+            region = frame[self.y:self.y + self.h, self.x:self.x + self.w]
+            mask = self.mask[:region.shape[0], :region.shape[1]]
+            region = cv2.bitwise_and(region, region, mask=mask)
+
+        if self.scale != 1.0:
+            height, width = region.shape[:2]
+            region = cv2.resize(region, (max(1, int(width * self.scale)), max(1, int(height * self.scale))))
+
+        return region
+
+    def to_frame(self, dets, frame_shape=None):
+        """
+        Maps [[x1, y1, x2, y2, score], ...] from crop to full-frame coordinates.
+        """
+        if self.is_full_frame or len(dets) == 0:
+            return dets
+
+        dets = np.array(dets, dtype=float)
+        dets[:, :4] /= self.scale
+        if self.polygon is not None:
+            dets[:, [0, 2]] += self.x
+            dets[:, [1, 3]] += self.y
+
+        if frame_shape is not None:
+            height, width = frame_shape[:2]
+            dets[:, [0, 2]] = dets[:, [0, 2]].clip(0, width)
+            dets[:, [1, 3]] = dets[:, [1, 3]].clip(0, height)
+
+        return dets
+
+    def status(self):
+        return {
+            'polygon': self.polygon.tolist() if self.polygon is not None else None,
+            'scale': self.scale,
+        }
@@ -0,0 +1,410 @@
+"""
+Segment-parallel video processing.
+
+The video is cut into time segments, each processed in its own process with
+its own tracker. A segment starts `overlap` frames early so its tracker is
+warmed up by the time it reaches its own frames; those shared frames are how
+tracks are stitched across the border, by box IoU or, failing that, by plate
+text. Transactions are only made once every segment is stitched, one per
+vehicle, deduplicated by plate text within DEBOUNCE_SECONDS of video time.
+
+Workers are spawned processes that set up Django themselves, so nothing that
+needs the app registry is imported at module level. Cancelling sets an event
+the workers share; running segments stop at their next frame and the pool is
+joined before their part files are removed.
+"""
+import os
+import shutil
+import tempfile
+import multiprocessing
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+import numpy as np
+
+from .config import *
+from .sort import VectorizedSort, iou_batch
+from .roi import region_of_interest
+from .frames import FrameSource, StrideWriter
+from .motion import MotionGate
+from .consensus import PlateConsensus
+from ..scheduling import FrameScheduler
+
+
+# set in segment workers by init_worker, checked every frame
+cancel_event = None
+
+
+def init_worker(event):
+    global cancel_event
+    cancel_event = event
+
+    os.environ['DJANGO_WARM_UP_MODELS'] = '0'
+    # a segment worker reads its own plates, it does not start an OCR pool, a video
+    # job worker or a notification dispatcher of its own
+    OCR_POOL_SETTINGS['workers'] = 0
+    os.environ.pop('VIDEO_JOB_AUTOSTART', None)
+    os.environ.pop('NOTIFICATION_DISPATCHER_AUTOSTART', None)
+    VIDEO_JOB_SETTINGS['autostart'] = False
+    NOTIFICATION_SETTINGS['autostart'] = False
+
+    import django
+    django.setup()
+
+
+def plan_segments(total_frames, fps, workers):
+    """
+    Returns (start, end) frame ranges: a couple of segments per worker for
+    progress and load balancing, none shorter than min_segment_seconds.
+    """
+    min_frames = max(1, int(VIDEO_SEGMENT_SETTINGS['min_segment_seconds'] * fps))
+    count = max(1, min(workers * 2, total_frames // min_frames))
+    bounds = np.linspace(0, total_frames, count + 1).astype(int)
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def process_segment(filepath, start, end, overlap, part_path):
+    from .detect import detect_plates, process_plates
+
+    source = FrameSource(filepath)
+    if not source.isOpened():
+        raise ValueError("Could not open video file")
+
+    fps = source.get(cv2.CAP_PROP_FPS) or SCHEDULER_TARGET_FPS
+    frame_width = int(source.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(source.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    stride = FRAME_SOURCE_SETTINGS['video_stride']
+    out = StrideWriter(part_path, fps, stride, (frame_width, frame_height))
+
+    # analysed frames are multiples of the stride in every segment, so neighbours share them
+    first = max(0, start - overlap) // stride * stride
+    if first:
+        source.seek(first)
+
+    tracker = VectorizedSort(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS)
+    scheduler = FrameScheduler(target_fps=int(fps), realtime=False)
+    motion_gate = MotionGate('video')
+    roi = region_of_interest('video')
+    consensus = PlateConsensus()
+    tracks = []
+    observed = {}
+
+    while source.position < end:
+        if cancel_event is not None and cancel_event.is_set():
+            break
+
+        frame_count, frame = source.read()
+        if frame is None:
+            break
+
+        region = roi.crop(frame)
+        moving = motion_gate.check(region, active=len(tracks) > 0)
+        detected = moving and scheduler.should_detect(frame_count, motion_gate.just_opened)
+        if not moving:
+            tracks = []
+            # aged while nothing moves, so a vehicle gone during the gap does not lend its id
+            if len(tracker):
+                tracker.update(np.empty((0, 5)))
+        elif detected:
+            with scheduler.timed('detect'):
+                tracks = tracker.update(roi.to_frame(detect_plates(region), frame.shape))
+            scheduler.update_tracks(int(track[4]) for track in tracks)
+
+        for x1, y1, x2, y2, track_id in tracks:
+            info = observed.setdefault(int(track_id), {
+                'first_frame': frame_count, 'boxes': {}, 'text': None, 'confidence': 0.0, 'text_frame': None,
+                'locked': False,
+            })
+            info['last_frame'] = frame_count
+            # boxes are only needed where this segment overlaps its neighbours
+            if frame_count < start or frame_count >= end - overlap:
+                info['boxes'][frame_count] = [float(x1), float(y1), float(x2), float(y2)]
+
+        if detected:
+            ocr_tracks = [
+                track for track in tracks
+                if consensus.wants_read(int(track[4]), scheduler.ocr_due(
+                    int(track[4]), frame_count, recognized=observed[int(track[4])]['text'] is not None))
+            ]
+            with scheduler.timed('ocr', len(ocr_tracks)):
+                ocr_results = process_plates([
+                    frame[int(y1):int(y2), int(x1):int(x2)] for x1, y1, x2, y2, _ in ocr_tracks
+                ], [(part_path, int(track[4])) for track in ocr_tracks])
+
+            for track, (text, text_conf, cached) in zip(ocr_tracks, ocr_results):
+                if text and text_conf >= VIDEO_OCR_THRESHOLD:
+                    info = observed[int(track[4])]
+                    text, text_conf, locked = consensus.vote(int(track[4]), text, text_conf, cached)
+                    if text != info['text']:
+                        info['text_frame'] = frame_count
+                    info['text'], info['confidence'], info['locked'] = text, text_conf, locked
+
+        if frame_count < start:
+            if not source.skip_to((frame_count // stride + 1) * stride):
+                break
+            continue
+
+        for x1, y1, x2, y2, track_id in tracks:
+            info = observed[int(track_id)]
+            if info['text']:
+                color = PIPELINE_STATUS_COLORS['pending']
+                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
+                cv2.putText(frame, info['text'], (int(x1), int(y1) - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+        out.write(frame_count, frame)
+
+        steps = 1 if moving else FRAME_SOURCE_SETTINGS['idle_steps']
+        if not source.skip_to(min((frame_count // stride + steps) * stride, end)):
+            break
+
+    frames = max(0, min(source.position, end) - start)
+    source.release()
+    # the part runs up to where the next one starts
+    out.release(end)
+
+    return {
+        'start': start,
+        'end': end,
+        'frames': frames,
+        **source.status(),
+        'frames_skipped_static': motion_gate.frames_skipped,
+        'ocr_calls_saved': consensus.calls_saved,
+        'tracks': observed,
+    }
+
+
+def overlap_iou(a, b):
+    common = sorted(set(a['boxes']) & set(b['boxes']))
+    if not common:
+        return 0.0
+    boxes_a = np.array([a['boxes'][frame] for frame in common])
+    boxes_b = np.array([b['boxes'][frame] for frame in common])
+    return float(np.diag(iou_batch(boxes_a, boxes_b)).mean())
+
+
+def stitch_segments(segments, overlap):
+    """
+    Joins tracks that continue across segment borders. Returns one dict per
+    vehicle with its frame range and its best plate text.
+    """
+    parent = {}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for index, segment in enumerate(segments):
+        for track_id in segment['tracks']:
+            parent[(index, track_id)] = (index, track_id)
+
+    for index in range(len(segments) - 1):
+        previous, following = segments[index]['tracks'], segments[index + 1]['tracks']
+
+        # boxes seen by both trackers on the shared frames, best overlap first
+        pairs = sorted(
+            ((overlap_iou(a, b), a_id, b_id) for a_id, a in previous.items() for b_id, b in following.items()),
+            reverse=True,
+        )
+        matched_previous, matched_following = set(), set()
+        for iou, a_id, b_id in pairs:
+            if iou < VIDEO_SEGMENT_SETTINGS['stitch_iou']:
+                break
+            if a_id in matched_previous or b_id in matched_following:
+                continue
+            matched_previous.add(a_id)
+            matched_following.add(b_id)
+            parent[find((index + 1, b_id))] = find((index, a_id))
+
+        # the same plate picked up again just after the border
+        for b_id, b in following.items():
+            if b_id in matched_following or not b['text']:
+                continue
+            for a_id, a in previous.items():
+                if a_id not in matched_previous and a['text'] == b['text'] and \
+                        b['first_frame'] - a['last_frame'] <= overlap + TRACK_MAX_AGE:
+                    matched_previous.add(a_id)
+                    parent[find((index + 1, b_id))] = find((index, a_id))
+                    break
+
+    groups = {}
+    for (index, track_id) in parent:
+        groups.setdefault(find((index, track_id)), []).append((index, track_id))
+
+    vehicles = []
+    for members in groups.values():
+        infos = [(index, segments[index]['tracks'][track_id]) for index, track_id in members]
+
+        # a track that only lived in a segment's warm-up frames belongs to the previous segment
+        if all(info['last_frame'] < segments[index]['start'] for index, info in infos):
+            continue
+
+        read = [info for _, info in infos if info['text']]
+        best = max(read, key=lambda info: info['confidence']) if read else None
+        vehicles.append({
+            'first_frame': min(info['first_frame'] for _, info in infos),
+            'last_frame': max(info['last_frame'] for _, info in infos),
+            'text': best['text'] if best else None,
+            'confidence': best['confidence'] if best else 0.0,
+            'text_frame': min(info['text_frame'] for info in read if info['text'] == best['text']) if best else None,
+            'locked': any(info['locked'] for info in read if info['text'] == best['text']) if best else False,
+        })
+
+    return sorted(vehicles, key=lambda vehicle: vehicle['first_frame'])
+
+
+def leading(segments):
+    """
+    Returns the segments finished so far without a gap from the start.
+    """
+    finished = []
+    for segment in segments:
+        if segment is None:
+            break
+        finished.append(segment)
+    return finished
+
+
+def concatenate_parts(part_paths, output_path, fps, size):
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for part_path in part_paths:
+        cap = cv2.VideoCapture(part_path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(frame)
+        cap.release()
+    out.release()
+
+
+def process_video_parallel(filename, progress=None, workers=VIDEO_SEGMENT_SETTINGS['workers'], charged=None):
+    """
+    Same results as process_video_file, with segments processed in `workers`
+    processes.
+    """
+    from django.conf import settings
+    from django.core.files.storage import default_storage
+    from django.utils import timezone
+    from .detect import detect_vehicle_type, process_transaction, transaction_status
+
+    filepath = default_storage.path(filename)
+    cap = cv2.VideoCapture(filepath)
+    if not cap.isOpened():
+        raise ValueError("Could not open video file")
+    fps = cap.get(cv2.CAP_PROP_FPS) or SCHEDULER_TARGET_FPS
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    overlap = int(VIDEO_SEGMENT_SETTINGS['overlap_seconds'] * fps)
+    plan = plan_segments(total_frames, fps, workers)
+    parts_dir = tempfile.mkdtemp(prefix='segments_')
+    part_paths = [os.path.join(parts_dir, f"{index:04d}.mp4") for index in range(len(plan))]
+
+    try:
+        segments = [None] * len(plan)
+        cancelled = False
+        context = multiprocessing.get_context('spawn')
+        cancel = context.Event()
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                       initializer=init_worker, initargs=(cancel,))
+        try:
+            futures = {
+                executor.submit(process_segment, filepath, start, end, overlap, part_path): index
+                for index, ((start, end), part_path) in enumerate(zip(plan, part_paths))
+            }
+            pending = set(futures)
+            while pending:
+                # progress is reported at least every heartbeat_interval, even while no segment finishes
+                done, pending = wait(pending, timeout=VIDEO_JOB_SETTINGS['heartbeat_interval'],
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    segments[futures[future]] = future.result()
+
+                # a vehicle seen by two segments is one plate, so plates are only counted once stitched
+                if progress and progress({
+                    'frames_done': sum(segment['frames'] for segment in segments if segment),
+                    'frames_total': total_frames,
+                    'plates_found': sum(1 for vehicle in stitch_segments(leading(segments), overlap) if vehicle['text']),
+                    'transactions_made': 0,
+                }) is False:
+                    cancelled = True
+                    break
+        finally:
+            # running segments stop at their next frame, so nothing writes to parts_dir once this returns
+            cancel.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        processed_filename = f"processed_{os.path.basename(filename)}"
+        processed_path = os.path.join(settings.MEDIA_ROOT, 'processed_videos', processed_filename)
+        os.makedirs(os.path.dirname(processed_path), exist_ok=True)
+
+        # a cancelled run keeps the leading segments that did finish
+        completed = list(zip(leading(segments), part_paths))
+        concatenate_parts([part_path for _, part_path in completed], processed_path,
+                          fps / FRAME_SOURCE_SETTINGS['video_stride'], size)
+    finally:
+        # a failed or cancelled run leaves no parts behind either
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    vehicles = stitch_segments([segment for segment, _ in completed], overlap)
+
+    recognized_plates = []
+    processed_transactions = []
+    # debounced per vehicle on video time, so an exact read and a misread of one vehicle are charged once
+    detection_times = {}
+    started_at = timezone.now()
+    for track_id, vehicle in enumerate(vehicles):
+        if not vehicle['text']:
+            continue
+
+        text = vehicle['text']
+        vehicle_type = detect_vehicle_type(text)
+        transaction, message = process_transaction(
+            text, vehicle_type, f"video_{filename}_frame_{vehicle['text_frame']}", detection_times, charged,
+            vehicle['locked'], started_at + timedelta(seconds=vehicle['text_frame'] / fps)
+        )
+
+        recognized_plates.append({
+            'track_id': track_id,
+            'text': text,
+            'confidence': vehicle['confidence'],
+            'vehicle_type': vehicle_type,
+            'transaction_status': transaction_status(transaction, message),
+            'message': message,
+            'first_frame': vehicle['first_frame'],
+            'last_frame': vehicle['last_frame'],
+        })
+
+        if transaction:
+            processed_transactions.append({
+                'track_id': track_id,
+                'plate_text': text,
+                'vehicle_type': vehicle_type,
+                'fee': float(transaction.fee),
+                'status': 'success',
+                'message': message,
+                'timestamp': timezone.now().isoformat()
+            })
+
+    successful_transactions = [t for t in processed_transactions if t['status'] == 'success']
+
+    return {
+        'original_video': filename,
+        'processed_video': processed_filename,
+        'total_frames': sum(segment['frames'] for segment, _ in completed),
+        'cancelled': cancelled,
+        'segments': len(plan),
+        'frames_skipped_static': sum(segment['frames_skipped_static'] for segment, _ in completed),
+        'ocr_calls_saved': sum(segment['ocr_calls_saved'] for segment, _ in completed),
+        'plates_detected': len(recognized_plates),
+        'transactions_processed': len(processed_transactions),
+        'successful_transactions': len(successful_transactions),
+        'total_revenue': sum(t['fee'] for t in successful_transactions),
+        'plates': recognized_plates,
+        'transactions': processed_transactions
+    }
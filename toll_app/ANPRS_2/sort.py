@@ -19,17 +19,10 @@ from __future__ import print_function
 
 import os
 import numpy as np
-import matplotlib
-
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from skimage import io
 
 import glob
 import time
 import argparse
-from filterpy.kalman import KalmanFilter
 
 np.random.seed(0)
 
@@ -102,6 +95,9 @@ class KalmanBoxTracker(object):
         """
         Initialises a tracker using initial bounding box.
         """
+        # filterpy pulls in scipy.stats, so import it only once tracking starts
+        from filterpy.kalman import KalmanFilter
+
         # define constant velocity model
         self.kf = KalmanFilter(dim_x=7, dim_z=4)
         self.kf.F = np.array(
@@ -176,29 +172,19 @@ def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
     else:
         matched_indices = np.empty(shape=(0, 2))
 
-    unmatched_detections = []
-    for d, det in enumerate(detections):
-        if (d not in matched_indices[:, 0]):
-            unmatched_detections.append(d)
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if (t not in matched_indices[:, 1]):
-            unmatched_trackers.append(t)
-
-    # filter out matched with low IOU
-    matches = []
-    for m in matched_indices:
-        if (iou_matrix[m[0], m[1]] < iou_threshold):
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-    if (len(matches) == 0):
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(matches, axis=0)
+    matched_indices = np.asarray(matched_indices, dtype=int).reshape(-1, 2)
+    detected = np.zeros(len(detections), dtype=bool)
+    detected[matched_indices[:, 0]] = True
+    tracked = np.zeros(len(trackers), dtype=bool)
+    tracked[matched_indices[:, 1]] = True
 
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+    # filter out matched with low IOU; they go after the never matched ones, as before
+    low_iou = iou_matrix[matched_indices[:, 0], matched_indices[:, 1]] < iou_threshold
+    unmatched_detections = np.concatenate([np.flatnonzero(~detected), matched_indices[low_iou, 0]])
+    unmatched_trackers = np.concatenate([np.flatnonzero(~tracked), matched_indices[low_iou, 1]])
+    matches = matched_indices[~low_iou]
+
+    return matches, unmatched_detections, unmatched_trackers
 
 
 class Sort(object):
@@ -258,6 +244,144 @@ class Sort(object):
         return np.empty((0, 5))
 
 
+KALMAN_F = np.array(
+    [[1, 0, 0, 0, 1, 0, 0], [0, 1, 0, 0, 0, 1, 0], [0, 0, 1, 0, 0, 0, 1], [0, 0, 0, 1, 0, 0, 0],
+     [0, 0, 0, 0, 1, 0, 0], [0, 0, 0, 0, 0, 1, 0], [0, 0, 0, 0, 0, 0, 1]], dtype=float)
+KALMAN_R = np.diag([1., 1., 10., 10.])
+KALMAN_Q = np.diag([1., 1., 1., 1., .01, .01, .0001])
+KALMAN_P0 = np.diag([10., 10., 10., 10., 10000., 10000., 10000.])
+
+
+def convert_bboxes_to_z(bboxes):
+    """
+    convert_bbox_to_z for an (N, 4+) array of boxes, returns (N, 4).
+    """
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    return np.stack([bboxes[:, 0] + w / 2., bboxes[:, 1] + h / 2., w * h, w / h], axis=1)
+
+
+def convert_xs_to_bboxes(xs):
+    """
+    convert_x_to_bbox for an (N, 4+) array of states, returns (N, 4).
+    """
+    with np.errstate(invalid='ignore'):
+        w = np.sqrt(xs[:, 2] * xs[:, 3])
+        h = xs[:, 2] / w
+    return np.stack([xs[:, 0] - w / 2., xs[:, 1] - h / 2., xs[:, 0] + w / 2., xs[:, 1] + h / 2.], axis=1)
+
+
+class VectorizedSort(object):
+    """
+    Drop-in replacement for Sort: the same constant velocity Kalman filter per
+    track, but every state and covariance lives in one stacked array and all
+    tracks are predicted and updated together. Output rows, their order and
+    track ids (shared with KalmanBoxTracker.count) are the same as Sort.update.
+    """
+
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+        self.frame_count = 0
+
+        self.x = np.zeros((0, 7))
+        self.P = np.zeros((0, 7, 7))
+        self.ids = np.zeros(0, dtype=int)
+        self.time_since_update = np.zeros(0, dtype=int)
+        self.hits = np.zeros(0, dtype=int)
+        self.hit_streak = np.zeros(0, dtype=int)
+        self.age = np.zeros(0, dtype=int)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def keep(self, mask):
+        self.x, self.P, self.ids = self.x[mask], self.P[mask], self.ids[mask]
+        self.time_since_update = self.time_since_update[mask]
+        self.hits, self.hit_streak, self.age = self.hits[mask], self.hit_streak[mask], self.age[mask]
+
+    def predict(self):
+        """
+        Advances every track one frame and returns the predicted boxes.
+        """
+        self.x[self.x[:, 6] + self.x[:, 2] <= 0, 6] = 0.
+        self.x = self.x @ KALMAN_F.T
+        self.P = KALMAN_F @ self.P @ KALMAN_F.T + KALMAN_Q
+        self.age += 1
+        self.hit_streak[self.time_since_update > 0] = 0
+        self.time_since_update += 1
+        return convert_xs_to_bboxes(self.x)
+
+    def correct(self, tracks, bboxes):
+        """
+        Kalman update of `tracks` with their observed boxes, in one batch.
+        """
+        x, P = self.x[tracks], self.P[tracks]
+        y = convert_bboxes_to_z(bboxes) - x[:, :4]
+        PHt = P[:, :, :4]
+        K = PHt @ np.linalg.inv(P[:, :4, :4] + KALMAN_R)
+
+        # Joseph form, as filterpy's KalmanFilter.update
+        I_KH = np.broadcast_to(np.eye(7), P.shape).copy()
+        I_KH[:, :, :4] -= K
+        self.x[tracks] = x + (K @ y[:, :, None])[:, :, 0]
+        self.P[tracks] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ KALMAN_R @ K.transpose(0, 2, 1)
+
+        self.time_since_update[tracks] = 0
+        self.hits[tracks] += 1
+        self.hit_streak[tracks] += 1
+
+    def add(self, bboxes):
+        count = len(bboxes)
+        x = np.zeros((count, 7))
+        x[:, :4] = convert_bboxes_to_z(bboxes)
+        ids = np.arange(KalmanBoxTracker.count, KalmanBoxTracker.count + count)
+        KalmanBoxTracker.count += count
+
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, np.broadcast_to(KALMAN_P0, (count, 7, 7))])
+        self.ids = np.concatenate([self.ids, ids])
+        self.time_since_update = np.concatenate([self.time_since_update, np.zeros(count, dtype=int)])
+        self.hits = np.concatenate([self.hits, np.zeros(count, dtype=int)])
+        self.hit_streak = np.concatenate([self.hit_streak, np.zeros(count, dtype=int)])
+        self.age = np.concatenate([self.age, np.zeros(count, dtype=int)])
+
+    def update(self, dets=np.empty((0, 5))):
+        """
+        Same contract as Sort.update.
+        """
+        self.frame_count += 1
+        dets = np.asarray(dets, dtype=float)
+        if dets.size == 0:
+            dets = np.empty((0, 5))
+
+        trks = self.predict()
+        valid = ~np.isnan(trks).any(axis=1)
+        if not valid.all():
+            self.keep(valid)
+            trks = trks[valid]
+        matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold)
+
+        if len(matched):
+            self.correct(matched[:, 1], dets[matched[:, 0], :4])
+        if len(unmatched_dets):
+            self.add(dets[np.asarray(unmatched_dets, dtype=int), :4])
+
+        confirmed = (self.time_since_update < 1) & (
+            (self.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+        ret = np.concatenate([convert_xs_to_bboxes(self.x), (self.ids + 1)[:, None]], axis=1)[confirmed][::-1]
+
+        # remove dead tracklets
+        alive = self.time_since_update <= self.max_age
+        if not alive.all():
+            self.keep(alive)
+
+        if len(ret) > 0:
+            return ret
+        return np.empty((0, 5))
+
+
 def parse_args():
     """Parse input arguments."""
     parser = argparse.ArgumentParser(description='SORT demo')
@@ -277,6 +401,14 @@ def parse_args():
 
 
 if __name__ == '__main__':
+    # display-only dependencies, kept out of the import path of the detection code
+    import matplotlib
+
+    matplotlib.use('TkAgg')
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    from skimage import io
+
     # all train
     args = parse_args()
     display = args.display
@@ -0,0 +1,192 @@
+"""
+Background processing of uploaded videos.
+
+An upload becomes a persisted VideoJob. Worker threads claim queued jobs, run
+process_video_file on them and write progress (frames done, plates found,
+transactions made) back to the job every few frames, so it can be polled or
+followed on the job's Channels group. Jobs can be cancelled while queued or
+running, and failed or cancelled jobs can be retried.
+
+Each progress update is also the job's heartbeat: a running job that has gone
+quiet for VIDEO_JOB_SETTINGS['stale_after'] seconds lost its worker (server
+restart, crash) and is claimed again. A job run again only charges the
+vehicles its earlier attempts did not.
+"""
+import time
+import threading
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .config import *
+from .detect import process_video_file, video_charges
+from .segments import process_video_parallel
+from ..enums import VideoJobStatus
+from ..models import VideoJob
+
+
+def job_group(job_id):
+    return f"video_job_{job_id}"
+
+
+def job_payload(job):
+    return {
+        'id': str(job.id),
+        'video': job.video_path,
+        'status': job.status,
+        'frames_done': job.frames_done,
+        'frames_total': job.frames_total,
+        'progress': job.frames_done / job.frames_total if job.frames_total else 0.0,
+        'plates_found': job.plates_found,
+        'transactions_made': job.transactions_made,
+        'attempts': job.attempts,
+        'cancel_requested': job.cancel_requested,
+        'error': job.error,
+        'results': job.results,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class VideoJobQueue(object):
+    def __init__(self, workers=VIDEO_JOB_SETTINGS['workers']):
+        self.workers = workers
+        self.threads = []
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self.run_worker, name=f"video_job_worker_{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, video_file, user=None):
+        video_path = default_storage.save(f"videos/{video_file.name}", video_file)
+        job = VideoJob.objects.create(submitted_by=user, video_path=video_path)
+        self.start()
+        self.wakeup.set()
+        return job
+
+    def cancel(self, job_id):
+        job = VideoJob.objects.get(id=job_id)
+        if job.status == VideoJobStatus.QUEUED.value:
+            VideoJob.objects.filter(id=job_id, status=VideoJobStatus.QUEUED.value).update(
+                status=VideoJobStatus.CANCELLED.value, finished_at=timezone.now()
+            )
+        elif job.status == VideoJobStatus.RUNNING.value:
+            # the worker stops at its next progress update
+            VideoJob.objects.filter(id=job_id).update(cancel_requested=True)
+
+        job.refresh_from_db()
+        self.publish(job)
+        return job
+
+    def retry(self, job_id):
+        job = VideoJob.objects.get(id=job_id)
+        if job.status not in (VideoJobStatus.FAILED.value, VideoJobStatus.CANCELLED.value):
+            raise ValueError(f"Only failed or cancelled jobs can be retried, job is {job.status}")
+
+        VideoJob.objects.filter(id=job_id).update(
+            status=VideoJobStatus.QUEUED.value, frames_done=0, plates_found=0, transactions_made=0,
+            cancel_requested=False, results=None, error='', started_at=None, heartbeat_at=None, finished_at=None,
+        )
+        self.start()
+        self.wakeup.set()
+
+        job.refresh_from_db()
+        self.publish(job)
+        return job
+
+    def claim(self):
+        # queued jobs, and running ones whose worker has stopped reporting
+        stale = timezone.now() - timedelta(seconds=VIDEO_JOB_SETTINGS['stale_after'])
+        claimable = VideoJob.objects.filter(
+            Q(status=VideoJobStatus.QUEUED.value) |
+            Q(status=VideoJobStatus.RUNNING.value, heartbeat_at__lt=stale)
+        ).order_by('created_at').values_list('id', 'status', 'heartbeat_at')
+
+        for job_id, status, heartbeat_at in claimable:
+            # only one worker wins the conditional update
+            now = timezone.now()
+            claimed = VideoJob.objects.filter(id=job_id, status=status, heartbeat_at=heartbeat_at).update(
+                status=VideoJobStatus.RUNNING.value, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+            )
+            if claimed:
+                return VideoJob.objects.get(id=job_id)
+        return None
+
+    def run_worker(self):
+        # started from TollAppConfig.ready(), the first query waits for the app registry
+        while not apps.ready:
+            time.sleep(0.1)
+
+        while True:
+            try:
+                job = self.claim()
+                if job is None:
+                    self.wakeup.wait(timeout=VIDEO_JOB_SETTINGS['poll_interval'])
+                    self.wakeup.clear()
+                    continue
+                self.process(job)
+            except Exception as e:
+                print(f"Error in video job worker: {e}")
+            finally:
+                close_old_connections()
+
+    def process(self, job):
+        self.publish(job)
+
+        def progress(counts):
+            VideoJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now(), **counts)
+            for field, value in counts.items():
+                setattr(job, field, value)
+            self.publish(job)
+            return not VideoJob.objects.filter(id=job.id, cancel_requested=True).exists()
+
+        try:
+            # vehicles charged by an earlier attempt at this job are not charged again
+            charged = video_charges(job.video_path)
+            if VIDEO_SEGMENT_SETTINGS['workers'] > 1:
+                results = process_video_parallel(job.video_path, progress, charged=charged)
+            else:
+                results = process_video_file(job.video_path, progress, charged)
+            job.status = VideoJobStatus.CANCELLED.value if results['cancelled'] else VideoJobStatus.COMPLETED.value
+            job.results = results
+            job.frames_done = results['total_frames']
+            job.plates_found = results['plates_detected']
+            job.transactions_made = results['transactions_processed']
+        except Exception as e:
+            print(f"Error processing video job {job.id}: {e}")
+            job.status = VideoJobStatus.FAILED.value
+            job.error = str(e)
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'results', 'frames_done', 'plates_found', 'transactions_made',
+                                'error', 'finished_at'])
+        self.publish(job)
+
+    def publish(self, job):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(job_group(job.id), {
+                'type': 'job.progress',
+                'job': job_payload(job),
+            })
+        except Exception as e:
+            print(f"Error publishing progress of video job {job.id}: {e}")
+
+
+video_jobs = VideoJobQueue()
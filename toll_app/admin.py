@@ -1,12 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import UserDetails, Transactions
+from .models import UserDetails, Transactions, VideoJob, Notification
 
 class UserDetailsAdmin(UserAdmin):
     model = UserDetails
     list_display = ['username', 'email', 'phone', 'vehicle_number', 'vehicle_type', 'balance']
     fieldsets = UserAdmin.fieldsets + (
-        (None, {'fields': ('phone', 'vehicle_number', 'vehicle_type', 'balance')}),
+        (None, {'fields': ('phone', 'vehicle_number', 'vehicle_type', 'balance', 'notification_digest')}),
     )
 
 class TransactionsAdmin(admin.ModelAdmin):
@@ -14,5 +14,17 @@ class TransactionsAdmin(admin.ModelAdmin):
     list_display = ['user', 'vehicle_type', 'fee', 'remaining_balance', 'timestamp']
     readonly_fields = ['id', 'timestamp']
 
+class VideoJobAdmin(admin.ModelAdmin):
+    model = VideoJob
+    list_display = ['video_path', 'status', 'frames_done', 'frames_total', 'plates_found', 'transactions_made', 'created_at']
+    readonly_fields = ['id', 'created_at', 'started_at', 'finished_at']
+
+class NotificationAdmin(admin.ModelAdmin):
+    model = Notification
+    list_display = ['recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    readonly_fields = ['id', 'created_at', 'sent_at']
+
 admin.site.register(UserDetails, UserDetailsAdmin)
 admin.site.register(Transactions, TransactionsAdmin)
+admin.site.register(VideoJob, VideoJobAdmin)
+admin.site.register(Notification, NotificationAdmin)
\ No newline at end of file
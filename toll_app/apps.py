@@ -1,6 +1,7 @@
 from django.apps import AppConfig
 from django.conf import settings
-import torch
+import threading
+import time
 import os
 
 
@@ -9,82 +10,104 @@ class TollAppConfig(AppConfig):
     name = 'toll_app'
 
     device = None
-    coco_model = None
-    plate_model = None
-    easyocr_reader = None
     models_loaded = False
 
     def ready(self):
-        if not os.environ.get('DJANGO_LOAD_MODELS'):
-            os.environ['DJANGO_LOAD_MODELS'] = '1'
-            # self.load_models()
+        # connects the UserDetails signals that keep the plate registry cache current
+        from .ANPRS_2 import registry
+
+        # Models are loaded on first use; set DJANGO_WARM_UP_MODELS=1 to load them at startup instead
+        self.loaded_models = {}
+        self.load_times = {}
+        self._model_lock = threading.Lock()
+        self.model_loaders = {
+            'coco_model': lambda: self._load_yolo_model('models/od/yolov8n.pt'),
+            'plate_model': lambda: self._load_yolo_model('models/od/best.pt'),
+            'easyocr_reader': lambda: self._load_easyocr_model(
+                ['en'],
+                model_storage_directory=os.path.join(settings.BASE_DIR, 'models/ocr'),
+                download_enabled=False
+            ),
+            'en_reader': lambda: self._load_anprs_reader(['en']),
+            'ne_reader': lambda: self._load_anprs_reader(['ne']),
+        }
+
+        if os.environ.get('DJANGO_WARM_UP_MODELS') == '1':
+            self.warm_up()
+
+        # picks up jobs and notifications queued or left claimed by a previous server process
+        from .ANPRS_2.config import VIDEO_JOB_SETTINGS, NOTIFICATION_SETTINGS
+        if VIDEO_JOB_SETTINGS['autostart']:
+            from .ANPRS_2.video_jobs import video_jobs
+            video_jobs.start()
+        if NOTIFICATION_SETTINGS['autostart']:
+            from .ANPRS_2.notifications import notification_outbox
+            notification_outbox.start()
+
+    def get_ml_model(self, name):
+        if name in self.loaded_models:
+            return self.loaded_models[name]
+
+        with self._model_lock:
+            if name not in self.loaded_models:
+                start = time.perf_counter()
+                model = self.model_loaders[name]()
+                # a failed load is not cached, the next call tries again
+                if model is None:
+                    return None
+                self.loaded_models[name] = model
+                self.load_times[name] = time.perf_counter() - start
+                print(f"Loaded {name} in {self.load_times[name]:.2f}s")
+
+        return self.loaded_models[name]
+
+    def warm_up(self, names=None):
+        print(f"Using device: {self.get_device()}")
+        for name in names or self.model_loaders:
+            self.get_ml_model(name)
+        self.models_loaded = all(name in self.loaded_models for name in self.model_loaders)
 
     def load_models(self):
         if self.models_loaded:
             return
-
-        try:
-            self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            print(f"Using device: {self.device}")
-
-            print("Loading YOLOV8n model...")
-            self.coco_model = self._load_yolo_model('models/od/yolov8n.pt')
-
-            print("Loading Custom Number Plate Recognition model...")
-            self.plate_model = self._load_yolo_model('models/od/best.pt')
-
-            print("Loading EasyOCR model...")
-            self.easyocr_reader = self._load_easyocr_model()
-
-            self.models_loaded = True
-            print("Models loaded successfully!")
-
-        except Exception as e:
-            print(f"Error loading models: {e}")
-            self.coco_model = None
-            self.plate_model = None
-            self.easyocr_reader = None
+        self.warm_up()
 
     def _load_yolo_model(self, model_path):
         try:
-            from ultralytics import YOLO
+            from .ANPRS_2.backend import load_detector
             full_path = os.path.join(settings.BASE_DIR, model_path)
-            model = YOLO(full_path)
-            model.to(self.device)
-            return model
+            return load_detector(full_path, self.get_device())
         except Exception as e:
             print(f"Error loading YOLO model {model_path}: {e}")
             return None
 
-    def _load_easyocr_model(self):
+    def _load_easyocr_model(self, languages, **reader_config):
         try:
             import easyocr
             return easyocr.Reader(
-                ['en'],
-                gpu=(self.device == 'cuda'),
-                model_storage_directory=os.path.join(settings.BASE_DIR, 'models/ocr'),
-                download_enabled=False
+                languages,
+                gpu=(self.get_device() == 'cuda'),
+                **reader_config
             )
         except Exception as e:
-            print(f"Error loading EasyOCR model: {e}")
+            print(f"Error loading EasyOCR model {languages}: {e}")
             return None
 
+    def _load_anprs_reader(self, languages):
+        from .ANPRS_2.config import reader_config
+        return self._load_easyocr_model(languages, **reader_config)
+
     def get_coco_model(self):
-        if not self.models_loaded:
-            self.load_models()
-        return self.coco_model
+        return self.get_ml_model('coco_model')
 
     def get_plate_model(self):
-        if not self.models_loaded:
-            self.load_models()
-        return self.plate_model
+        return self.get_ml_model('plate_model')
 
     def get_easyocr_reader(self):
-        if not self.models_loaded:
-            self.load_models()
-        return self.easyocr_reader
+        return self.get_ml_model('easyocr_reader')
 
     def get_device(self):
         if self.device is None:
+            import torch
             self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        return self.device
\ No newline at end of file
+        return self.device
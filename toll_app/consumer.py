@@ -6,12 +6,16 @@ import numpy as np
 from channels.generic.websocket import AsyncWebsocketConsumer
 import asyncio
 from django.apps import apps
-from .models import Transactions, UserDetails
+from channels.db import database_sync_to_async
+from .models import Transactions, UserDetails, VideoJob
 from .enums import VehicleRate
 import uuid
 from datetime import datetime, timedelta
 import os
 from django.conf import settings
+from .ANPRS_2.motion import MotionGate
+from .scheduling import FrameScheduler
+from .ANPRS_2.video_jobs import job_group, job_payload
 
 
 class LiveDetectionConsumer(AsyncWebsocketConsumer):
@@ -19,15 +23,13 @@ class LiveDetectionConsumer(AsyncWebsocketConsumer):
         await self.accept()
         self.cap = None
         self.frame_count = 0
+        self.scheduler = FrameScheduler()
+        self.motion_gate = MotionGate(0)
         self.detected_plates = {}  # Store recent detections to avoid duplicates
         self.is_processing = False
 
-        # Get models from AppConfig
-        TollAppConfig = apps.get_app_config('toll_app')
-        self.plate_model = TollAppConfig.plate_model
-        self.coco_model = TollAppConfig.coco_model
-        self.easyocr_reader = TollAppConfig.easyocr_reader
-        self.device = TollAppConfig.device
+        # Models are loaded by AppConfig on first use
+        self.app_config = apps.get_app_config('toll_app')
 
         await self.send(text_data=json.dumps({
             'type': 'status',
@@ -139,9 +141,13 @@ class LiveDetectionConsumer(AsyncWebsocketConsumer):
 
                 self.frame_count += 1
 
-                # Process every 4th frame for better performance
-                if self.frame_count % 4 == 0:
-                    processed_frame, detections = await self.process_frame(frame)
+                # Process only moving frames the scheduler has budget for
+                moving = self.motion_gate.check(frame)
+                if moving and self.scheduler.should_detect(self.frame_count, self.motion_gate.just_opened):
+                    with self.scheduler.timed('detect'):
+                        processed_frame, detections = await self.process_frame(frame)
+                    # plates in view keep the scheduler at the detection rate the budget allows
+                    self.scheduler.set_active_tracks(len(detections or []))
 
                     # Send processed frame to client
                     if processed_frame is not None:
@@ -186,7 +192,7 @@ class LiveDetectionConsumer(AsyncWebsocketConsumer):
         """Fallback frame processing if detect.py fails"""
         try:
             # Basic processing without detect.py
-            results = self.plate_model(frame)
+            results = self.app_config.get_plate_model()(frame)
             detections = []
             annotated_frame = frame.copy()
 
@@ -199,7 +205,7 @@ class LiveDetectionConsumer(AsyncWebsocketConsumer):
                             plate_region = frame[y1:y2, x1:x2]
 
                             # Basic OCR
-                            ocr_results = self.easyocr_reader.readtext(plate_region)
+                            ocr_results = self.app_config.get_easyocr_reader().readtext(plate_region)
 
                             if ocr_results:
                                 plate_text = max(ocr_results, key=lambda x: x[2])[1]
@@ -336,4 +342,30 @@ class LiveDetectionConsumer(AsyncWebsocketConsumer):
                 'image': jpg_as_text
             }))
         except Exception as e:
-            print(f"Error sending frame: {e}")
\ No newline at end of file
+            print(f"Error sending frame: {e}")
+
+
+class VideoJobConsumer(AsyncWebsocketConsumer):
+    """Streams progress of one uploaded-video job."""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_superuser:
+            await self.close()
+            return
+
+        self.job_id = self.scope['url_route']['kwargs']['job_id']
+        self.group_name = job_group(self.job_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        job = await database_sync_to_async(VideoJob.objects.filter(id=self.job_id).first)()
+        if job is not None:
+            await self.send(text_data=json.dumps({'type': 'job', 'job': job_payload(job)}))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def job_progress(self, event):
+        await self.send(text_data=json.dumps({'type': 'job', 'job': event['job']}))
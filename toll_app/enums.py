@@ -12,6 +12,29 @@ class VehicleType(Enum):
         return [(key.value, key.name) for key in cls]
 
 
+class VideoJobStatus(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    @classmethod
+    def choices(cls):
+        return [(key.value, key.name) for key in cls]
+
+
+class NotificationStatus(Enum):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    @classmethod
+    def choices(cls):
+        return [(key.value, key.name) for key in cls]
+
+
 class VehicleRate(Enum):
     BIKE = 30.00
     CAR = 50.00
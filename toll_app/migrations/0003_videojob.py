@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:28
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('toll_app', '0002_alter_transactions_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('video_path', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'QUEUED'), ('running', 'RUNNING'), ('completed', 'COMPLETED'), ('failed', 'FAILED'), ('cancelled', 'CANCELLED')], default='queued', max_length=10)),
+                ('frames_done', models.IntegerField(default=0)),
+                ('frames_total', models.IntegerField(default=0)),
+                ('plates_found', models.IntegerField(default=0)),
+                ('transactions_made', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('results', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('submitted_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+from toll_app.plates import normalize_plate
+
+
+def backfill_plate_keys(apps, schema_editor):
+    UserDetails = apps.get_model('toll_app', 'UserDetails')
+    batch = []
+    for user in UserDetails.objects.only('pk', 'vehicle_number').iterator(chunk_size=2000):
+        user.plate_key = normalize_plate(user.vehicle_number)
+        user.plate_key_reversed = user.plate_key[::-1]
+        batch.append(user)
+        if len(batch) >= 2000:
+            UserDetails.objects.bulk_update(batch, ['plate_key', 'plate_key_reversed'])
+            batch = []
+    if batch:
+        UserDetails.objects.bulk_update(batch, ['plate_key', 'plate_key_reversed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('toll_app', '0003_videojob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdetails',
+            name='plate_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='userdetails',
+            name='plate_key_reversed',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=30),
+        ),
+        migrations.RunPython(backfill_plate_keys, migrations.RunPython.noop),
+    ]
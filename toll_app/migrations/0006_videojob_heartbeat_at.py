@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('toll_app', '0005_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videojob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
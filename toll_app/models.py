@@ -2,7 +2,9 @@ import uuid
 from datetime import datetime
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from toll_app.enums import VehicleType
+from django.utils import timezone
+from toll_app.enums import VehicleType, VideoJobStatus, NotificationStatus
+from toll_app.plates import normalize_plate
 
 
 class UserDetails(AbstractUser):
@@ -11,8 +13,21 @@ class UserDetails(AbstractUser):
     vehicle_number = models.CharField(max_length=30, unique=True, blank=False, null=False)
     vehicle_type = models.CharField(max_length=10, null=False)
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    # derived from vehicle_number on save, see toll_app/plates.py
+    plate_key = models.CharField(max_length=30, db_index=True, editable=False, default='')
+    plate_key_reversed = models.CharField(max_length=30, db_index=True, editable=False, default='')
+    # one summary mail per NOTIFICATION_SETTINGS['digest_interval'] instead of one per toll
+    notification_digest = models.BooleanField(default=False)
 
 
+    def save(self, *args, **kwargs):
+        self.plate_key = normalize_plate(self.vehicle_number)
+        self.plate_key_reversed = self.plate_key[::-1]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'vehicle_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'plate_key', 'plate_key_reversed'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}".title()
 
@@ -27,4 +42,52 @@ class Transactions(models.Model):
     image_path = models.CharField(max_length=255)
 
     def __str__(self):
-        return f"{self.user.first_name.title()} {self.user.last_name.title()} paid {self.fee} on {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
\ No newline at end of file
+        return f"{self.user.first_name.title()} {self.user.last_name.title()} paid {self.fee} on {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+class VideoJob(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    submitted_by = models.ForeignKey(UserDetails, on_delete=models.SET_NULL, null=True)
+    video_path = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=VideoJobStatus.choices(), default=VideoJobStatus.QUEUED.value)
+    frames_done = models.IntegerField(default=0)
+    frames_total = models.IntegerField(default=0)
+    plates_found = models.IntegerField(default=0)
+    transactions_made = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    cancel_requested = models.BooleanField(default=False)
+    results = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # last sign of life from the worker running the job
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.video_path} ({self.status})"
+
+
+class Notification(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(UserDetails, on_delete=models.CASCADE)
+    transaction = models.ForeignKey(Transactions, on_delete=models.SET_NULL, null=True, blank=True)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    # one line of a digest mail
+    summary = models.CharField(max_length=255, blank=True, default='')
+    status = models.CharField(max_length=10, choices=NotificationStatus.choices(), default=NotificationStatus.PENDING.value)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True, default='')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient} ({self.status})"
@@ -0,0 +1,32 @@
+"""
+Normalized plate keys.
+
+`UserDetails.plate_key` holds the vehicle number without spaces or
+separators, upper case and with Devanagari digits as ASCII, so the same
+plate typed at registration and read by OCR compares equal. Vowel signs stay:
+'मे' and 'म' are different zones.
+`plate_key_reversed` holds it backwards, which turns "ends with" into a
+prefix, and so into an index range seek on any database.
+"""
+import unicodedata
+
+NEP_DIGITS = str.maketrans('०१२३४५६७८९', '0123456789')
+
+
+def normalize_plate(text):
+    # vowel signs, the virama and the anusvara are marks, not alphanumeric
+    return ''.join(c for c in (text or '').translate(NEP_DIGITS).upper()
+                   if c.isalnum() or unicodedata.category(c).startswith('M'))
+
+
+def suffix_filter(suffix):
+    """
+    Filter kwargs for plates whose normalized key ends with `suffix`.
+    """
+    prefix = normalize_plate(suffix)[::-1]
+    if not prefix:
+        return {'pk__in': []}
+    return {
+        'plate_key_reversed__gte': prefix,
+        'plate_key_reversed__lt': prefix[:-1] + chr(ord(prefix[-1]) + 1),
+    }
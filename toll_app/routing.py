@@ -1,6 +1,7 @@
 from django.urls import re_path
-from .consumer import LiveDetectionConsumer
+from .consumer import LiveDetectionConsumer, VideoJobConsumer
 
 websocket_urlpatterns = [
     re_path(r'ws/live-detection/$', LiveDetectionConsumer.as_asgi()),
+    re_path(r'ws/video-jobs/(?P<job_id>[0-9a-f-]+)/$', VideoJobConsumer.as_asgi()),
 ]
\ No newline at end of file
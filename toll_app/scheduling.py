@@ -0,0 +1,136 @@
+"""
+Latency-budget frame scheduling.
+
+Instead of fixed `frame_count % N` skipping, the scheduler keeps a moving
+average of how long each stage takes and derives, per frame, whether the
+detector should run or the previous tracks should be reused, and which tracks
+are due for another OCR read. It aims at a target frame rate and a target
+capture-to-decision latency: busy lanes get detection as often as the budget
+allows, idle lanes back off as far as the latency target permits.
+
+Offline video is not bound to its frame rate, so with `realtime` off stage
+timings are not recorded and every decision follows from frame counts, the
+video's fps and the tracks alone: the same video is always sampled the same way.
+
+Shared by the ANPRS and ANPRS_2 pipelines and the websocket consumer, so its
+settings live here rather than in either package's config.
+"""
+import math
+import time
+from contextlib import contextmanager
+
+SCHEDULER_TARGET_FPS = 15
+SCHEDULER_TARGET_LATENCY = 1.0  # seconds from capture to toll decision
+SCHEDULER_MAX_DETECT_INTERVAL = 8
+SCHEDULER_MIN_OCR_INTERVAL = 5
+SCHEDULER_MAX_OCR_INTERVAL = 60
+SCHEDULER_OCR_BUDGET = 0.5  # share of the frame budget re-reads of known plates may use
+SCHEDULER_SMOOTHING = 0.2
+
+DETECT = 'detect'
+TRACK = 'track'
+
+
+class FrameScheduler(object):
+    def __init__(self, target_fps=SCHEDULER_TARGET_FPS, target_latency=SCHEDULER_TARGET_LATENCY, realtime=True):
+        self.target_fps = target_fps
+        self.target_latency = target_latency
+        self.realtime = realtime
+        self.latency = {}
+        self.last_detect = None
+        self.last_ocr = {}
+        self.active_tracks = 0
+        self.detect_interval = 1
+        self.ocr_interval = SCHEDULER_MIN_OCR_INTERVAL
+        self.counts = {DETECT: 0, TRACK: 0, 'ocr': 0}
+
+    @property
+    def frame_budget(self):
+        return 1.0 / self.target_fps
+
+    def record(self, stage, seconds):
+        if not self.realtime:
+            return
+        previous = self.latency.get(stage)
+        if previous is None:
+            self.latency[stage] = seconds
+        else:
+            self.latency[stage] = previous + SCHEDULER_SMOOTHING * (seconds - previous)
+        self.adapt()
+
+    @contextmanager
+    def timed(self, stage, count=1):
+        # `count` spreads the elapsed time over the items handled, e.g. plates in an OCR batch
+        if not self.realtime:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if count:
+                self.record(stage, (time.perf_counter() - start) / count)
+
+    def adapt(self):
+        detect_cost = self.latency.get('detect', 0.0)
+        ocr_cost = self.latency.get('ocr', 0.0)
+        budget = self.frame_budget
+
+        # run the detector no more often than its cost fits into the frame budget...
+        budget_interval = max(1, math.ceil(detect_cost / budget))
+        # ...and, with nothing on the road, no less often than the latency target allows
+        latency_interval = max(1, int((self.target_latency - detect_cost - ocr_cost) / budget))
+
+        if self.active_tracks:
+            interval = budget_interval
+        else:
+            interval = max(budget_interval, latency_interval)
+        self.detect_interval = min(interval, SCHEDULER_MAX_DETECT_INTERVAL)
+
+        # spread re-reads of already known tracks so they use a bounded share of the budget
+        ocr_load = self.active_tracks * ocr_cost
+        ocr_interval = math.ceil(ocr_load / (budget * SCHEDULER_OCR_BUDGET)) if ocr_load else 0
+        self.ocr_interval = min(max(ocr_interval, SCHEDULER_MIN_OCR_INTERVAL), SCHEDULER_MAX_OCR_INTERVAL)
+
+    def next_action(self, frame_count, force=False):
+        if force or self.last_detect is None or frame_count - self.last_detect >= self.detect_interval:
+            self.last_detect = frame_count
+            self.counts[DETECT] += 1
+            return DETECT
+        self.counts[TRACK] += 1
+        return TRACK
+
+    def should_detect(self, frame_count, force=False):
+        return self.next_action(frame_count, force) == DETECT
+
+    def ocr_due(self, track_id, frame_count, recognized=True):
+        last = self.last_ocr.get(track_id)
+        if not recognized or last is None or frame_count - last >= self.ocr_interval:
+            self.last_ocr[track_id] = frame_count
+            self.counts['ocr'] += 1
+            return True
+        return False
+
+    def update_tracks(self, track_ids):
+        track_ids = set(track_ids)
+        for track_id in list(self.last_ocr):
+            if track_id not in track_ids:
+                del self.last_ocr[track_id]
+        self.set_active_tracks(len(track_ids))
+
+    def set_active_tracks(self, count):
+        # for callers without a tracker, which only know how many plates are in view
+        self.active_tracks = count
+        self.adapt()
+
+    def status(self):
+        return {
+            'target_fps': self.target_fps,
+            'target_latency': self.target_latency,
+            'realtime': self.realtime,
+            'latency_ms': {stage: seconds * 1000 for stage, seconds in self.latency.items()},
+            'detect_interval': self.detect_interval,
+            'ocr_interval': self.ocr_interval,
+            'active_tracks': self.active_tracks,
+            'counts': dict(self.counts),
+        }
@@ -1,3 +1,537 @@
-from django.test import TestCase
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
 
-# Create your tests here.
+import cv2
+import numpy as np
+
+from django.apps import apps
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .ANPRS_2.batching import BatchedDetector
+from .ANPRS_2.config import PLATE_LAYOUTS, NEP_ALPHA_CHAR_LIST, NEP_DIGIT_CHAR_LIST, OCR_THRESHOLD
+from .ANPRS_2.consensus import PlateConsensus
+from .ANPRS_2.detect import process_transaction, transaction_status, video_charges
+from .ANPRS_2.plate_grammar import GRAMMARS, rank_plates
+from .ANPRS_2.frames import StrideWriter
+from .ANPRS_2.fuzzy import PlateMatcher, plate_distance
+from .ANPRS_2.notifications import NotificationOutbox
+from .ANPRS_2.ocr_cache import PlateOCRCache
+from .ANPRS_2.registry import PlateRegistry, plate_registry
+from .ANPRS_2.validator import validate_english, validate_nepali
+from .ANPRS_2.video_jobs import VideoJobQueue
+from .enums import NotificationStatus, VideoJobStatus
+from .models import UserDetails, Notification, Transactions, VideoJob
+from .plates import normalize_plate, suffix_filter
+
+ENG_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+ENG_DIGITS = '0123456789'
+# with their matras and conjuncts, 'बा' and 'क्ष' are letters too
+NEP_LETTERS = [letter for letter in NEP_ALPHA_CHAR_LIST if letter != '-']
+NEP_BARE_LETTERS = ''.join(letter for letter in NEP_LETTERS if len(letter) == 1)
+NEP_MARKS = ''.join(sorted({char for letter in NEP_LETTERS for char in letter[1:] if char not in NEP_BARE_LETTERS}))
+NEP_DIGITS = NEP_DIGIT_CHAR_LIST
+ALPHABETS = {'en': (ENG_LETTERS, ENG_DIGITS), 'ne': (NEP_LETTERS, NEP_DIGITS)}
+
+
+def random_plate(rng, lang, layout):
+    letters, digits = ALPHABETS[lang]
+    return ' '.join(
+        ''.join(rng.choice(letters if cls == 'L' else digits) for _ in range(rng.randint(low, high)))
+        for cls, low, high in PLATE_LAYOUTS[lang][layout]
+    )
+
+
+def layout_pattern(lang, layout):
+    letters, digits = ALPHABETS[lang]
+    letter = f"[{NEP_BARE_LETTERS}](?:[{NEP_MARKS}]|\u094d[{NEP_BARE_LETTERS}])*" if lang == 'ne' else f"[{letters}]"
+    classes = {'L': f"(?:{letter})", 'D': f"[{''.join(digits)}]"}
+    return re.compile(' '.join(f"{classes[cls]}{{{low},{high}}}" for cls, low, high in PLATE_LAYOUTS[lang][layout]))
+
+
+def as_reading(plate, rng, confidence=0.9):
+    """
+    Splits a plate into OCR boxes at random points, the way a reader returns it.
+    """
+    text = plate.replace(' ', rng.choice(['', ' ', '  ']))
+    cuts = sorted(rng.sample(range(1, len(text)), min(2, len(text) - 1)))
+    parts = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+    return [(None, part, confidence) for part in parts if part]
+
+
+class PlateGrammarPropertyTests(SimpleTestCase):
+    iterations = 300
+
+    def setUp(self):
+        self.rng = random.Random(0)
+
+    def test_every_valid_plate_is_its_own_best_reading(self):
+        for lang, layouts in PLATE_LAYOUTS.items():
+            for layout in layouts:
+                for _ in range(self.iterations):
+                    plate = random_plate(self.rng, lang, layout)
+                    ranked = rank_plates([(lang, as_reading(plate, self.rng))])
+                    self.assertEqual(ranked[0][0], plate, ranked)
+                    self.assertAlmostEqual(ranked[0][1], 0.9)
+
+    def test_results_always_fit_a_layout(self):
+        patterns = {lang: [layout_pattern(lang, layout) for layout in layouts]
+                    for lang, layouts in PLATE_LAYOUTS.items()}
+        for lang in PLATE_LAYOUTS:
+            letters, digits = ALPHABETS[lang]
+            noise = list(letters) + list(digits) + [' ', '-', 'ा', '?']
+            for _ in range(self.iterations):
+                text = ''.join(self.rng.choice(noise) for _ in range(self.rng.randint(0, 14)))
+                for plate, score, layout in rank_plates([(lang, [(None, text, 0.9)])]):
+                    self.assertTrue(any(pattern.fullmatch(plate) for pattern in patterns[lang]), plate)
+                    self.assertLessEqual(score, 0.9)
+
+    def test_canonical_plates_are_fixed_points(self):
+        for lang, layouts in PLATE_LAYOUTS.items():
+            for layout in layouts:
+                for _ in range(self.iterations):
+                    plate = random_plate(self.rng, lang, layout)
+                    first = rank_plates([(lang, [(None, plate, 0.8)])], k=1)[0][0]
+                    self.assertEqual(rank_plates([(lang, [(None, first, 0.8)])], k=1)[0][0], first)
+
+    def test_ranking_is_sorted_and_distinct(self):
+        for _ in range(self.iterations):
+            readings = [(lang, as_reading(random_plate(self.rng, lang, self.rng.choice(list(PLATE_LAYOUTS[lang]))),
+                                          self.rng, self.rng.uniform(OCR_THRESHOLD, 1.0)))
+                        for lang in ('en', 'ne')]
+            ranked = rank_plates(readings, k=5)
+            scores = [score for _, score, _ in ranked]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+            self.assertEqual(len({plate for plate, _, _ in ranked}), len(ranked))
+
+
+class PlateGrammarTests(SimpleTestCase):
+    def reading(self, *texts, confidence=0.9):
+        return [(None, text, confidence) for text in texts]
+
+    def test_incomplete_plates_are_not_padded(self):
+        self.assertIsNone(validate_english(self.reading('AB', '12')))
+        self.assertIsNone(validate_english(self.reading('1234')))
+        self.assertIsNone(validate_nepali(self.reading('च१२३४')))
+        self.assertIsNone(validate_nepali([]))
+
+    def test_state_names_and_weak_boxes_are_ignored(self):
+        self.assertEqual(validate_english(self.reading('BAGMATI', 'ABC', '1234')), 'ABC 1234')
+        self.assertEqual(validate_nepali(self.reading('प्रदेश-३', '३०१ च', '४५६७')), '३०१ च ४५६७')
+        reading = self.reading('ABC 1234') + [(None, 'XYZ', OCR_THRESHOLD / 2)]
+        self.assertEqual(validate_english(reading), 'ABC 1234')
+
+    def test_confusions_are_substituted_at_a_cost(self):
+        ranked = rank_plates([('en', self.reading('a8c 12O4'))], k=1)
+        self.assertEqual(ranked[0][0], 'ABC 1204')
+        self.assertLess(ranked[0][1], 0.9)
+        self.assertEqual(validate_nepali(self.reading('बा O२ च', '8५')), 'बा ०२ च ४५')
+
+    def test_readings_too_far_from_any_layout_are_dropped(self):
+        self.assertIsNone(validate_english(self.reading('AB 1234')))
+        self.assertEqual(validate_english(self.reading('AB8 1234')), 'ABB 1234')
+        self.assertEqual(validate_english(self.reading('ABC-1234X')), 'ABC 1234')
+
+    def test_nepali_layouts(self):
+        self.assertEqual(GRAMMARS['ne'].match('बा२च१२३४')[0][1:], ('nepali_old', 'बा २ च १२३४'))
+        self.assertEqual(GRAMMARS['ne'].match('३०१च१२३४')[0][1:], ('nepali_new', '३०१ च १२३४'))
+
+    def test_matras_and_conjuncts_stay_with_their_letter(self):
+        self.assertEqual(validate_nepali(self.reading('मे १ च', '१२३४')), 'मे १ च १२३४')
+        self.assertEqual(validate_nepali(self.reading('को १ पा', '५६७८')), 'को १ पा ५६७८')
+        self.assertEqual(GRAMMARS['ne'].match('क्षे२च१२३४')[0][1:], ('nepali_old', 'क्षे २ च १२३४'))
+        # a matra with no letter before it is not part of the plate
+        self.assertEqual(GRAMMARS['ne'].match('ा३०१च१२३४')[0][1:], ('nepali_new', '३०१ च १२३४'))
+
+
+class PlateMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = PlateMatcher()
+        for user_id, key in enumerate(['ABC1234', 'ABC1284', 'BA2CH5678', 'ब2च1234']):
+            self.matcher.add(key, user_id)
+
+    def test_confusions_cost_less_than_other_edits(self):
+        self.assertEqual(plate_distance('ABC1234', 'ABC1234'), 0)
+        self.assertEqual(plate_distance('AOC1234', 'ADC1234'), 0.5)
+        self.assertEqual(plate_distance('ब2च1234', 'ब2च1238'), 0.5)
+        self.assertEqual(plate_distance('ABC1234', 'ABC1294', max_distance=1), 1)
+        self.assertEqual(plate_distance('ABC1234', 'ABC123', max_distance=1), 1)
+        self.assertEqual(plate_distance('ABC1234', 'XYC1234', max_distance=1), float('inf'))
+        # sequential plates are one edit apart, so by default only confusions match
+        self.assertEqual(plate_distance('ABC1234', 'ABC1294'), float('inf'))
+
+    def test_closest_plate_wins_unless_another_is_as_close(self):
+        self.assertEqual(self.matcher.match('BA2CH5G78'), [(0.5, 'BA2CH5678', 2)])
+        self.assertEqual(self.matcher.match('ब2च1238'), [(0.5, 'ब2च1234', 3)])
+        # 4 and 8 are confused, so 1234 and 1284 are as close to 12B4
+        self.assertEqual(len(self.matcher.match('ABC12B4')), 2)
+        self.assertEqual(self.matcher.match('XYZ9999'), [])
+
+    def test_removed_plates_are_not_matched(self):
+        self.matcher.add('ABD1234', 0)
+        self.assertEqual(self.matcher.match('ABD1Z34'), [(0.5, 'ABD1234', 0)])
+        self.matcher.remove(0)
+        self.assertEqual(self.matcher.match('ABD1Z34'), [])
+        self.assertEqual(len(self.matcher), 3)
+
+
+def plate_crop(text, rng, noise=3.0):
+    crop = np.full((40, 140, 3), 210, dtype=np.uint8)
+    cv2.putText(crop, text, (4, 28), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (20, 20, 20), 2)
+    return np.clip(crop + rng.normal(0, noise, crop.shape), 0, 255).astype(np.uint8)
+
+
+class PlateOCRCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.cache = PlateOCRCache()
+
+    def test_different_plates_never_share_an_entry(self):
+        self.cache.put(('1', 7), self.cache.key(plate_crop('BA 1234', self.rng)), ('BA 1234', 0.9))
+        for text in ['BA 1284', 'BA 1235', 'BA 1233']:
+            self.assertIsNone(self.cache.get(('1', 7), self.cache.key(plate_crop(text, self.rng))), text)
+
+    def test_reads_stay_with_their_track(self):
+        key = self.cache.key(plate_crop('BA 1234', self.rng))
+        self.cache.put(('1', 7), key, ('BA 1234', 0.9))
+        self.assertEqual(self.cache.get(('1', 7), key), ('BA 1234', 0.9))
+        self.assertIsNone(self.cache.get(('1', 8), key))
+        self.assertIsNone(self.cache.get(('2', 7), key))
+        self.assertIsNone(self.cache.get(None, key))
+
+    def test_cached_reads_do_not_lock_a_track(self):
+        consensus = PlateConsensus(min_reads=3)
+        consensus.vote(1, 'BA 1234', 0.9)
+        for _ in range(5):
+            self.assertEqual(consensus.vote(1, 'BA 1234', 0.9, cached=True), ('BA 1234', 0.9, False))
+        self.assertFalse(consensus.is_locked(1))
+
+
+class BatchedDetectorTests(SimpleTestCase):
+    def test_idle_lanes_do_not_hold_batches(self):
+        detector = BatchedDetector(lambda frames: [[] for _ in frames], window=1.0, max_batch=8, active_interval=0.5)
+        detector.register('1')
+        detector.register('2')
+        started = time.perf_counter()
+        for _ in range(3):
+            detector.detect(None, '1')
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(detector.status()['active_lanes'], 1)
+
+
+class StrideWriterTests(SimpleTestCase):
+    def test_skipped_strides_keep_their_time(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'out.mp4')
+        out = StrideWriter(path, 30, 2, (64, 48))
+        # two analysed strides, then an idle stretch read five strides at a time
+        for index in [0, 2, 12, 22]:
+            out.write(index, np.zeros((48, 64, 3), np.uint8))
+        out.release(30)
+        cap = cv2.VideoCapture(path)
+        self.assertEqual(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 15)
+        self.assertEqual(cap.get(cv2.CAP_PROP_FPS), 15)
+        cap.release()
+        self.assertEqual(out.held, 11)
+
+
+class PlateKeyTests(TestCase):
+    def setUp(self):
+        for i, vehicle_number in enumerate(['बा २ च १२३४', 'ABC 1234', 'को १ प ५६७८']):
+            UserDetails.objects.create(username=f'user{i}', phone=f'980000000{i}',
+                                       vehicle_number=vehicle_number, vehicle_type='Car')
+
+    def test_only_digits_spaces_and_case_are_normalized(self):
+        self.assertEqual(normalize_plate('abc-1234'), 'ABC1234')
+        self.assertEqual(UserDetails.objects.get(plate_key=normalize_plate('बा2च 1234')).vehicle_number, 'बा २ च १२३४')
+        self.assertNotEqual(normalize_plate('मे १ च १२३४'), normalize_plate('म १ च १२३४'))
+        self.assertFalse(UserDetails.objects.filter(plate_key=normalize_plate('क १ प ५६७८')).exists())
+
+    def test_key_follows_vehicle_number(self):
+        user = UserDetails.objects.get(vehicle_number='ABC 1234')
+        user.vehicle_number = 'ABD 4321'
+        user.save(update_fields=['vehicle_number'])
+        user.refresh_from_db()
+        self.assertEqual((user.plate_key, user.plate_key_reversed), ('ABD4321', '1234DBA'))
+
+    def test_suffix_filter(self):
+        self.assertEqual(UserDetails.objects.filter(**suffix_filter('१२३४')).count(), 2)
+        self.assertEqual(UserDetails.objects.get(**suffix_filter('५६७८')).vehicle_number, 'को १ प ५६७८')
+        self.assertFalse(UserDetails.objects.filter(**suffix_filter('9')).exists())
+        self.assertFalse(UserDetails.objects.filter(**suffix_filter(' ')).exists())
+
+
+class PlateRegistryTests(TestCase):
+    def setUp(self):
+        self.user = UserDetails.objects.create(username='user', phone='9800000000',
+                                               vehicle_number='बा २ च १२३४', vehicle_type='Car')
+        plate_registry.clear()
+        self.addCleanup(plate_registry.clear)
+
+    def test_repeat_lookups_skip_the_database(self):
+        self.assertEqual(plate_registry.lookup('बा २ च १२३४'), [(self.user.pk, 'Car')])
+        self.assertEqual(plate_registry.lookup('XYZ 999'), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(plate_registry.lookup('बा२च१२३४'), [(self.user.pk, 'Car')])
+            self.assertEqual(plate_registry.lookup('xyz-999'), [])
+
+    def test_saves_and_deletes_invalidate(self):
+        plate_registry.lookup('XYZ 999')
+        self.user.vehicle_number = 'XYZ 999'
+        self.user.vehicle_type = 'Bike'
+        self.user.save()
+        self.assertEqual(plate_registry.lookup('XYZ 999'), [(self.user.pk, 'Bike')])
+        self.assertEqual(plate_registry.lookup('बा २ च १२३४'), [])
+        self.user.delete()
+        self.assertEqual(plate_registry.lookup('XYZ 999'), [])
+
+    def test_suffix_lookup(self):
+        self.assertEqual(plate_registry.lookup_suffix('१२३४'), [(self.user.pk, 'Car')])
+        UserDetails.objects.create(username='other', phone='9800000001', vehicle_number='को १ प १२३४', vehicle_type='Car')
+        self.assertEqual(len(plate_registry.lookup_suffix('१२३४')), 2)
+
+    def test_tolls_keep_the_cache(self):
+        plate_registry.lookup_suffix('१२३४')
+        plate_registry.lookup_suffix('५६७८')
+        self.user.balance -= 50
+        self.user.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(plate_registry.lookup_suffix('१२३४'), [(self.user.pk, 'Car')])
+            self.assertEqual(plate_registry.lookup_suffix('५६७८'), [])
+        self.user.vehicle_type = 'Bike'
+        self.user.save()
+        self.assertEqual(plate_registry.lookup_suffix('१२३४'), [(self.user.pk, 'Bike')])
+        with self.assertNumQueries(0):
+            plate_registry.lookup_suffix('५६७८')
+
+    def test_fuzzy_match_follows_committed_saves(self):
+        self.assertEqual(plate_registry.match('बा २ च १२३८'), [(self.user.pk, 0.5)])
+        self.assertEqual(plate_registry.match('१२३८'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.vehicle_number = 'XYZ 9999'
+            self.user.save()
+        self.assertEqual(plate_registry.match('बा २ च १२३८'), [])
+        self.assertEqual(plate_registry.match('XY2 9999'), [(self.user.pk, 0.5)])
+        self.assertEqual(plate_registry.match('XYZ 999'), [])
+
+    def test_size_is_bounded(self):
+        registry = PlateRegistry(max_size=2)
+        for i, plate in enumerate(['AAA 1', 'AAA 2', 'AAA 3']):
+            UserDetails.objects.create(username=f'user{i}', phone=f'980000001{i}', vehicle_number=plate, vehicle_type='Car')
+            registry.lookup(plate)
+        self.assertEqual(registry.status()['size'], 2)
+        self.assertEqual(registry.status()['users'], 2)
+        self.assertEqual(registry.status()['evictions'], 1)
+
+
+class ProcessTransactionTests(TestCase):
+    def setUp(self):
+        self.user = UserDetails.objects.create(username='user', first_name='Ram', phone='9800000000',
+                                               vehicle_number='बा २ च १२३४', vehicle_type='Car', balance=500)
+        plate_registry.clear()
+        self.addCleanup(plate_registry.clear)
+
+    def balance(self):
+        self.user.refresh_from_db()
+        return self.user.balance
+
+    def test_exact_read_and_misread_charge_once(self):
+        detection_times = {}
+        self.assertIsNotNone(process_transaction('बा २ च १२३४', 'Car', 'test', detection_times)[0])
+        transaction, message = process_transaction('बा २ च १२३८', 'Car', 'test', detection_times, locked=True)
+        self.assertIsNone(transaction)
+        self.assertIn('debounce', message)
+        self.assertEqual(self.balance(), 450)
+
+        detection_times = {}
+        self.assertIsNotNone(process_transaction('बा २ च १२३८', 'Car', 'test', detection_times, locked=True)[0])
+        self.assertIsNone(process_transaction('बा २ च १२३४', 'Car', 'test', detection_times)[0])
+        self.assertEqual(self.balance(), 400)
+
+    def test_misreads_are_only_charged_once_locked(self):
+        transaction, message = process_transaction('बा २ च १२३८', 'Car', 'test', {})
+        self.assertIsNone(transaction)
+        self.assertEqual(transaction_status(transaction, message), 'review')
+        self.assertEqual(self.balance(), 500)
+        self.assertIsNotNone(process_transaction('बा २ च १२३८', 'Car', 'test', {}, locked=True)[0])
+        self.assertEqual(self.balance(), 450)
+
+    def test_videos_debounce_each_vehicle_on_video_time(self):
+        detection_times = {}
+        start = timezone.now()
+        self.assertIsNotNone(process_transaction('बा २ च १२३४', 'Car', 'test', detection_times, detected_at=start)[0])
+        transaction, message = process_transaction('बा २ च १२३८', 'Car', 'test', detection_times, locked=True,
+                                                    detected_at=start + timedelta(seconds=5))
+        self.assertIn('debounce', message)
+        self.assertIsNotNone(process_transaction('बा २ च १२३८', 'Car', 'test', detection_times, locked=True,
+                                                 detected_at=start + timedelta(minutes=5))[0])
+        self.assertEqual(self.balance(), 400)
+
+    def test_stale_cache_is_checked_under_the_lock(self):
+        plate_registry.lookup('बा २ च १२३४')
+        # changed by another process, so no signal reached this cache
+        UserDetails.objects.filter(pk=self.user.pk).update(vehicle_number='XYZ 999', plate_key='XYZ999',
+                                                           plate_key_reversed='999ZYX')
+        transaction, message = process_transaction('बा २ च १२३४', 'Car', 'test', {})
+        self.assertIsNone(transaction)
+        self.assertIn('not registered', message)
+        self.assertEqual(self.balance(), 500)
+
+        other = UserDetails(username='other', phone='9800000001', vehicle_number='बा २ च १२३४',
+                            vehicle_type='Car', balance=500)
+        other.save()
+        plate_registry.lookup('बा २ च १२३४')
+        UserDetails.objects.filter(pk=other.pk).update(vehicle_number='XYZ 998', plate_key='XYZ998',
+                                                       plate_key_reversed='899ZYX')
+        UserDetails.objects.filter(pk=self.user.pk).update(vehicle_number='बा २ च १२३४', plate_key='बा2च1234',
+                                                           plate_key_reversed='4321च2ाब')
+        transaction, _ = process_transaction('बा २ च १२३४', 'Car', 'test', {})
+        self.assertEqual(transaction.user_id, self.user.pk)
+
+    def test_plates_sharing_a_key_are_held_for_review(self):
+        UserDetails.objects.create(username='a', phone='9800000001', vehicle_number='AB 12', vehicle_type='Car', balance=500)
+        UserDetails.objects.create(username='b', phone='9800000002', vehicle_number='ab-12', vehicle_type='Car', balance=500)
+        transaction, message = process_transaction('AB 12', 'Car', 'test', {}, locked=True)
+        self.assertIsNone(transaction)
+        self.assertEqual(transaction_status(transaction, message), 'review')
+        self.assertFalse(Transactions.objects.exists())
+
+
+class ModelLoadingTests(SimpleTestCase):
+    def test_failed_loads_are_retried(self):
+        config = apps.get_app_config('toll_app')
+        results = ['other', 'model', None]
+        config.model_loaders['test_model'] = results.pop
+        self.addCleanup(config.model_loaders.pop, 'test_model')
+        self.addCleanup(config.loaded_models.pop, 'test_model', None)
+        self.assertIsNone(config.get_ml_model('test_model'))
+        self.assertNotIn('test_model', config.loaded_models)
+        self.assertEqual(config.get_ml_model('test_model'), 'model')
+        self.assertEqual(config.get_ml_model('test_model'), 'model')
+
+
+class LaneViewTests(TestCase):
+    def setUp(self):
+        user = UserDetails.objects.create(username='operator', phone='9800000000',
+                                          vehicle_number='ABC 1234', vehicle_type='Car')
+        self.client.force_login(user)
+
+    def test_unknown_lane_is_not_found(self):
+        response = self.client.get(reverse('video_feed'), {'lane': 'no-such-lane'})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('Unknown lane', response.json()['error'])
+        response = self.client.get(reverse('get_detected_plates'), {'lane': 'no-such-lane'})
+        self.assertEqual(response.status_code, 404)
+
+
+class VideoJobQueueTests(TestCase):
+    def setUp(self):
+        self.user = UserDetails.objects.create(username='user', first_name='Ram', phone='9800000000',
+                                               vehicle_number='ABC 1234', vehicle_type='Car', balance=500)
+        plate_registry.clear()
+        self.addCleanup(plate_registry.clear)
+
+    def test_only_stale_jobs_are_reclaimed(self):
+        job = VideoJob.objects.create(video_path='videos/a.mp4', status=VideoJobStatus.RUNNING.value,
+                                      heartbeat_at=timezone.now(), attempts=1)
+        queue = VideoJobQueue()
+        self.assertIsNone(queue.claim())
+        VideoJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        claimed = queue.claim()
+        self.assertEqual((claimed.id, claimed.attempts), (job.id, 2))
+        self.assertIsNone(queue.claim())
+
+    def test_rerun_does_not_charge_again(self):
+        first, _ = process_transaction('ABC 1234', 'Car', 'video_videos/a.mp4_frame_10', {})
+        charged = video_charges('videos/a.mp4')
+        again, message = process_transaction('ABC 1234', 'Car', 'video_videos/a.mp4_frame_10', {}, charged)
+        self.assertEqual(again.pk, first.pk)
+        self.assertIn('already deducted', message)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, 450)
+        # a second pass of the vehicle later in the video is charged as usual
+        self.assertIsNotNone(process_transaction('ABC 1234', 'Car', 'video_videos/a.mp4_frame_900', {}, charged)[0])
+        self.assertEqual(video_charges('videos/b.mp4'), {})
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('mail server unavailable')
+
+
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.user = UserDetails.objects.create(username='user', first_name='Ram', phone='9800000000',
+                                               vehicle_number='ABC 1234', vehicle_type='Car', balance=500)
+        plate_registry.clear()
+        self.addCleanup(plate_registry.clear)
+        CountingBackend.opened = 0
+        self.outbox = NotificationOutbox(backend='toll_app.tests.CountingBackend')
+
+    def pay(self, times=1):
+        for _ in range(times):
+            transaction, message = process_transaction('ABC 1234', 'Car', 'test', {})
+            self.assertIsNotNone(transaction, message)
+
+    def test_tolls_are_notified_by_the_dispatcher(self):
+        self.pay(3)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(self.outbox.dispatch(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertIn('NRP 50.0', mail.outbox[0].body)
+        self.assertFalse(Notification.objects.exclude(status=NotificationStatus.SENT.value).exists())
+        self.assertEqual(self.outbox.dispatch(), 0)
+
+    def test_only_stale_claims_are_sent_again(self):
+        self.pay(2)
+        Notification.objects.update(status=NotificationStatus.SENDING.value, claim='other', claimed_at=timezone.now())
+        self.assertEqual(self.outbox.dispatch(), 0)
+        Notification.objects.filter(pk=Notification.objects.order_by('created_at')[0].pk).update(
+            claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.outbox.dispatch(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failures_back_off_and_give_up(self):
+        self.pay()
+        outbox = NotificationOutbox(backend='toll_app.tests.FailingBackend')
+        delays = []
+        for _ in range(5):
+            outbox.dispatch()
+            notification = Notification.objects.get()
+            delays.append(notification.next_attempt_at - timezone.now())
+            Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(notification.status, NotificationStatus.FAILED.value)
+        self.assertEqual(notification.attempts, 5)
+        self.assertIn('unavailable', notification.error)
+        self.assertTrue(delays[0] < delays[1] < delays[2] < delays[3])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_digest_accounts_get_one_summary(self):
+        self.user.notification_digest = True
+        self.user.save()
+        self.pay(2)
+        self.assertEqual(self.outbox.dispatch(), 0)
+        Notification.objects.filter(pk=Notification.objects.order_by('created_at')[0].pk).update(
+            next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.outbox.dispatch(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Toll Payment Summary')
+        self.assertEqual(mail.outbox[0].body.count('- NRP 50.0'), 2)
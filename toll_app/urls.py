@@ -18,6 +18,10 @@ urlpatterns = [
     path('api/history/', views.history, name='api_history'),
     path('manual-entry/', views.manual_entry, name='manual_entry'),
     path('video-entry/', views.process_video, name='video_entry'),
+    path('api/video-jobs/', views.video_jobs_list, name='video_jobs'),
+    path('api/video-jobs/<uuid:job_id>/', views.video_job_status, name='video_job_status'),
+    path('api/video-jobs/<uuid:job_id>/cancel/', views.cancel_video_job, name='cancel_video_job'),
+    path('api/video-jobs/<uuid:job_id>/retry/', views.retry_video_job, name='retry_video_job'),
 
     # Live detection URLs
     path('live-detection/', views.live_detect, name='live_detection'),
@@ -25,5 +29,6 @@ urlpatterns = [
     path('api/detected-plates/', views.get_detected_plates, name='get_detected_plates'),
     path('api/process-frame/', views.process_single_frame, name='process_single_frame'),
     path('api/start-detection/', views.start_detection, name='start_detection'),
-    path('api/stop-detection/', views.stop_detection, name='stop_detection')
+    path('api/stop-detection/', views.stop_detection, name='stop_detection'),
+    path('api/lanes/', views.lane_status, name='lane_status')
 ]
@@ -1,11 +1,14 @@
 import uuid
-from .ANPRS_2.detect import generate_frames_sort, process_image, get_realtime_plates, clear_realtime_plates, stop_live_detection
+from .ANPRS_2.detect import process_image
+from .ANPRS_2.lanes import lane_manager
+from .ANPRS_2.video_jobs import video_jobs, job_payload
+from .ANPRS_2.config import DEFAULT_LANE
 from toll_app.forms import SignupForm, LoginForm, ManualEntryForm, forms
 from django.http import StreamingHttpResponse, JsonResponse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
-from .models import UserDetails, Transactions
+from .models import UserDetails, Transactions, VideoJob
 from .enums import VehicleRate, VehicleType
 from django.views.decorators import gzip
 from django.contrib import messages
@@ -236,13 +239,14 @@ def process_video(request):
         try:
             video_file = request.FILES['video']
 
-            # results = process_video_sort(video_file)
+            # Processed by a background worker, follow it on api/video-jobs/<id>/
+            job = video_jobs.submit(video_file, request.user)
 
             return JsonResponse({
                 'success': True,
-                'results': [],
-                'message': 'Video processing completed successfully'
-            })
+                'job': job_payload(job),
+                'message': 'Video queued for processing'
+            }, status=202)
 
         except Exception as e:
             return JsonResponse({
@@ -252,6 +256,56 @@ def process_video(request):
 
     return JsonResponse({'error': 'No video file provided'}, status=400)
 
+
+@login_required
+def video_jobs_list(request):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    jobs = VideoJob.objects.order_by('-created_at')[:50]
+    return JsonResponse({'jobs': [job_payload(job) for job in jobs], 'success': True})
+
+
+@login_required
+def video_job_status(request, job_id):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    job = VideoJob.objects.filter(id=job_id).first()
+    if job is None:
+        return JsonResponse({'error': 'Job not found', 'success': False}, status=404)
+    return JsonResponse({'job': job_payload(job), 'success': True})
+
+
+@login_required
+def cancel_video_job(request, job_id):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+    try:
+        job = video_jobs.cancel(job_id)
+        return JsonResponse({'job': job_payload(job), 'success': True})
+    except VideoJob.DoesNotExist:
+        return JsonResponse({'error': 'Job not found', 'success': False}, status=404)
+
+
+@login_required
+def retry_video_job(request, job_id):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+    try:
+        job = video_jobs.retry(job_id)
+        return JsonResponse({'job': job_payload(job), 'success': True})
+    except VideoJob.DoesNotExist:
+        return JsonResponse({'error': 'Job not found', 'success': False}, status=404)
+    except ValueError as e:
+        return JsonResponse({'error': str(e), 'success': False}, status=409)
+
 @login_required
 def live_detect(request):
     return render(request, 'toll_app/auto.html')
@@ -261,9 +315,11 @@ def live_detect(request):
 def video_feed(request):
     try:
         return StreamingHttpResponse(
-            generate_frames_sort(),
+            lane_manager.stream(request.GET.get('lane', DEFAULT_LANE)),
             content_type='multipart/x-mixed-replace; boundary=frame'
         )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=404)
     except Exception as e:
         print(f"Error in video_feed: {e}")
         return JsonResponse({'error': 'Cannot start video stream'}, status=500)
@@ -271,7 +327,8 @@ def video_feed(request):
 @login_required
 def get_detected_plates(request):
     try:
-        plates = get_realtime_plates()
+        lane = request.GET.get('lane', DEFAULT_LANE)
+        plates = lane_manager.plates(lane)
 
         # for plate in plates:
         #     if plate['text'] not in live_plate_db_flag:
@@ -281,7 +338,9 @@ def get_detected_plates(request):
         #         if (datetime.datetime.now() - live_plate_db_flag[plate['text']]).seconds > 60:
         #             if save_transactions(plate):
         #                 live_plate_db_flag[plate['text']] = datetime.datetime.now()
-        return JsonResponse({'plates': plates, 'success': True})
+        return JsonResponse({'plates': plates, 'status': lane_manager.status(lane), 'success': True})
+    except ValueError as e:
+        return JsonResponse({'error': str(e), 'success': False}, status=404)
     except Exception as e:
         return JsonResponse({'error': str(e), 'success': False}, status=500)
 
@@ -309,20 +368,28 @@ def process_single_frame(request):
 @login_required
 def start_detection(request):
     try:
-        clear_realtime_plates()
-        return JsonResponse({'success': True, 'message': 'Detection started'})
+        lane = request.GET.get('lane', DEFAULT_LANE)
+        lane_manager.start(lane)
+        return JsonResponse({'success': True, 'message': f'Detection started on lane {lane}'})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
 def stop_detection(request):
     try:
-        clear_realtime_plates()
-        stop_live_detection()
-        return JsonResponse({'success': True, 'message': 'Detection stopped'})
+        lane = request.GET.get('lane', DEFAULT_LANE)
+        lane_manager.stop(lane)
+        return JsonResponse({'success': True, 'message': f'Detection stopped on lane {lane}'})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+@login_required
+def lane_status(request):
+    try:
+        return JsonResponse({'lanes': lane_manager.status(), 'success': True})
+    except Exception as e:
+        return JsonResponse({'error': str(e), 'success': False}, status=500)
+
 
 @login_required
 def ws_live_detect(request):